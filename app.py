@@ -1,113 +1,463 @@
-from flask import Flask, request, jsonify, render_template, redirect, url_for, session
+from flask import (
+    Flask, Response, abort, request, jsonify, render_template, redirect, url_for, session, g,
+    has_app_context, stream_with_context,
+)
+import gzip
+import hashlib
+import atexit
+import click
+import csv
+import json
+import logging
+import math
+import re
 import sqlite3
-from datetime import datetime
+import sys
+from datetime import date, datetime, timedelta
 from werkzeug.security import generate_password_hash, check_password_hash
-import math
-from functools import wraps
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import lru_cache, partial, wraps
+from itertools import islice
 import os
+import threading
+import time
+import zlib
+
+from geo import CoverageSet, cell_bounds, grid_cell
+from metrics import Registry
+from ratelimit import MemoryBuckets, SQLiteBuckets
+from storage import (
+    FEED_SORTS, REQUEST_COLUMNS, REQUEST_EXPORT_COLUMNS, USER_EXPORT_COLUMNS,
+    PostgresStorage, SQLiteStorage, batched, to_float,
+)
+
+try:
+    import brotli
+except ImportError:  # optional, gzip is always available
+    brotli = None
 
 app = Flask(__name__)
 app.secret_key = os.environ.get("SECRET_KEY", "dev-fallback-secret")
 
-DB_NAME = "database.db"
+DB_NAME = os.environ.get("DB_NAME", "database.db")
+
+# postgres://... or postgresql://... switches from the SQLite file to PostgreSQL
+# (with PostGIS); each worker then keeps a pool of up to DB_POOL_SIZE connections
+DATABASE_URL = os.environ.get("DATABASE_URL", "")
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "10"))
+
+# per-connection tuning (SQLite), applied once when a connection is opened
+DB_BUSY_TIMEOUT_MS = int(os.environ.get("DB_BUSY_TIMEOUT_MS", "5000"))
+DB_CACHE_SIZE_KB = int(os.environ.get("DB_CACHE_SIZE_KB", "16384"))
+DB_MMAP_SIZE = int(os.environ.get("DB_MMAP_SIZE", str(128 * 1024 * 1024)))
+
+# process-level cache of user rows; 0 seconds disables it
+USER_CACHE_TTL = float(os.environ.get("USER_CACHE_TTL", "0"))
+USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", "1024"))
+
+# GET /api/requests paging
+LIST_PAGE_SIZE = 50
+LIST_MAX_PAGE_SIZE = 200
+
+# GET /api/provider/requests?limit= upper bound (no limit: every match)
+FEED_MAX_LIMIT = 500
+
+# GET /api/provider/requests/search: results without ?limit=, words per query
+SEARCH_DEFAULT_LIMIT = 50
+SEARCH_MAX_TERMS = 8
+
+# columns a client may ask for via ?fields=
+REQUEST_FIELDS = REQUEST_COLUMNS + ("receiver_name",)
+
+# `flask --app app archive-requests` moves requests serviced more than this many
+# days ago from requests into requests_archive, ARCHIVE_BATCH_SIZE per transaction
+ARCHIVE_AFTER_DAYS = int(os.environ.get("ARCHIVE_AFTER_DAYS", "30"))
+ARCHIVE_BATCH_SIZE = 1000
+
+# `flask --app app data import` commits this many rows per transaction
+IMPORT_BATCH_ROWS = 5000
+
+MAX_SERVICE_RADIUS_KM = 200
+
+# how long a worker trusts its provider snapshot before re-reading the version counter
+PROVIDER_SNAPSHOT_TTL = float(os.environ.get("PROVIDER_SNAPSHOT_TTL", "1.0"))
+
+# Availability checks only measure the providers that can reach the pin's
+# COVERAGE_CELL_DEG grid cell (0.01 is about 1.1 km north-south; 0 measures every
+# provider). Each worker keeps those lists for its most recently used cells, up
+# to COVERAGE_CACHE_POINTS providers across all of them.
+COVERAGE_CELL_DEG = float(os.environ.get("COVERAGE_CELL_DEG", "0.01"))
+COVERAGE_CACHE_POINTS = int(os.environ.get("COVERAGE_CACHE_POINTS", "500000"))
+# The snapshot buckets providers in PROVIDER_GRID_DEG cells (0.5 is about 55 km
+# north-south), so finding those providers only measures the ones around the
+# pin instead of every provider (0 measures every provider).
+PROVIDER_GRID_DEG = float(os.environ.get("PROVIDER_GRID_DEG", "0.5"))
+
+# Password hashing is deliberately slow, so it runs on a small per-worker pool:
+# at most HASH_WORKERS hashes at once, HASH_QUEUE_LIMIT more waiting, the rest get a 503.
+# PASSWORD_HASH_METHOD takes werkzeug's format, e.g. "scrypt" or "pbkdf2:sha256:600000".
+PASSWORD_HASH_METHOD = os.environ.get("PASSWORD_HASH_METHOD", "scrypt")
+HASH_WORKERS = int(os.environ.get("HASH_WORKERS", "2"))
+HASH_QUEUE_LIMIT = int(os.environ.get("HASH_QUEUE_LIMIT", "8"))
+
+# Location/service-area saves: "sync" commits on every save; "buffered" keeps the
+# latest pin per user in memory and writes them all in one transaction every
+# LOCATION_FLUSH_MS, or as soon as LOCATION_FLUSH_MAX users are pending.
+# Buffered saves survive a clean shutdown but not a crash.
+LOCATION_WRITE_MODE = os.environ.get("LOCATION_WRITE_MODE", "sync")
+LOCATION_FLUSH_MS = int(os.environ.get("LOCATION_FLUSH_MS", "250"))
+LOCATION_FLUSH_MAX = int(os.environ.get("LOCATION_FLUSH_MAX", "100"))
+
+# /api/receiver/location admission control:
+# - token buckets per logged-in user and per client IP: RATE checks per second,
+#   BURST at once; a rate of 0 turns that limit off. Over the limit is a 429.
+# - RATE_LIMIT_DB: empty keeps the buckets in each worker; a path to an SQLite
+#   file shares them between the workers on this host
+# - at most LOCATION_MAX_INFLIGHT checks run at once per worker, the rest get a 503
+# - the same pin again gets the last answer while providers are unchanged, for
+#   up to LOCATION_RESULT_TTL seconds, without a write or a token
+LOCATION_USER_RATE = float(os.environ.get("LOCATION_USER_RATE", "2"))
+LOCATION_USER_BURST = float(os.environ.get("LOCATION_USER_BURST", "10"))
+LOCATION_IP_RATE = float(os.environ.get("LOCATION_IP_RATE", "20"))
+LOCATION_IP_BURST = float(os.environ.get("LOCATION_IP_BURST", "100"))
+RATE_LIMIT_DB = os.environ.get("RATE_LIMIT_DB", "")
+LOCATION_MAX_INFLIGHT = int(os.environ.get("LOCATION_MAX_INFLIGHT", "8"))
+LOCATION_RESULT_TTL = float(os.environ.get("LOCATION_RESULT_TTL", "30"))
+LOCATION_RESULT_SIZE = 10000
+
+# X-Forwarded-For entries appended by proxies we trust (1 behind a single load
+# balancer); 0 uses the socket's address as the client IP
+TRUSTED_PROXY_HOPS = int(os.environ.get("TRUSTED_PROXY_HOPS", "0"))
+
+# JSON responses at least this big are compressed when the client accepts it
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", "1024"))
+
+# streamed feeds: roughly how much output per write
+STREAM_CHUNK_BYTES = 64 * 1024
+
+# provider dashboard push feed
+SSE_POLL_SECONDS = float(os.environ.get("SSE_POLL_SECONDS", "2"))
+SSE_KEEPALIVE_SECONDS = 15
+# streams end after this long and the browser reconnects, so a sync worker is never held forever
+SSE_MAX_SECONDS = float(os.environ.get("SSE_MAX_SECONDS", "300"))
+# Under WSGI every open stream parks a worker thread, so a worker serves at most
+# SSE_MAX_STREAMS at once (keep it well below --threads); the rest get a 503 and
+# the dashboard polls instead. asgi.py serves streams itself, without this cap.
+SSE_MAX_STREAMS = int(os.environ.get("SSE_MAX_STREAMS", "4"))
+
+# Opt-in instrumentation: GET /metrics (Prometheus text) and a Server-Timing header.
+# When off nothing is timed and connections are plain sqlite3 connections.
+# Per-statement SQL metrics are only collected for SQLite.
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "0") == "1"
 
 
 # =========================
 # DB helpers
 # =========================
+# All SQL lives in storage.py; `storage` is created below the instrumentation
+# section. Connections from connect_db() go back through storage.release().
+def connect_db():
+    return storage.connect()
+
+
 def get_db():
-    conn = sqlite3.connect(DB_NAME)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """One connection per app context (i.e. per request), closed on teardown."""
+    if not has_app_context():
+        return connect_db()
+    if "db" not in g:
+        g.db = connect_db()
+    return g.db
+
+
+@app.teardown_appcontext
+def close_db(exc):
+    conn = g.pop("db", None)
+    if conn is not None:
+        storage.release(conn)
+
+
+# =========================
+# Instrumentation (METRICS_ENABLED=1)
+# - per-route latency, per-statement time + rows, named stages inside a request
+# - a request's stages go out in its Server-Timing header, totals via /metrics
+# =========================
+metrics = Registry()
+request_seconds = metrics.histogram(
+    "app_request_seconds", "Time to build a response (streamed: until the body is sent)",
+    ("endpoint", "method", "status"))
+stage_seconds = metrics.histogram(
+    "app_stage_seconds", "Time spent in one stage of a request", ("endpoint", "stage"))
+sql_seconds = metrics.histogram(
+    "app_sql_seconds", "SQLite statement time, execute through the last fetch", ("query",))
+sql_rows = metrics.counter(
+    "app_sql_rows_total", "Rows fetched or changed by SQLite statements", ("query",))
+
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+
+@lru_cache(maxsize=512)
+def query_label(sql):
+    # one series per statement shape, however long its IN (...) list
+    return _IN_LIST.sub("(?, ...)", " ".join(sql.split()))
+
+
+def add_timing(stage, seconds):
+    if has_app_context() and "timings" in g:
+        g.timings[stage] = g.timings.get(stage, 0.0) + seconds
+
+
+class _Stage:
+    __slots__ = ("name", "started")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc):
+        add_timing(self.name, time.perf_counter() - self.started)
+
+
+_untimed = nullcontext()
+
+
+def timed(stage):
+    """`with timed("distance"):` adds the block's time to the current request's stages."""
+    return _Stage(stage) if METRICS_ENABLED else _untimed
+
+
+class TimedCursor(sqlite3.Cursor):
+    """
+    Reports each statement once it is finished with: fully fetched, replaced
+    by the next execute, or the cursor closed/dropped. Time spent in fetches
+    counts too, since that is where SQLite does most of the work.
+    """
+    _query = None
+
+    def _finish(self):
+        if self._query is not None:
+            sql_seconds.observe(self._elapsed, self._query)
+            sql_rows.inc(self._query, amount=self._rows)
+            self._query = None
+
+    def _track(self, started, rows):
+        elapsed = time.perf_counter() - started
+        self._elapsed += elapsed
+        self._rows += rows
+        add_timing("sql", elapsed)
+
+    def execute(self, sql, params=()):
+        self._finish()
+        self._query, self._elapsed, self._rows = query_label(sql), 0.0, 0
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, params)
+        finally:
+            self._track(started, max(self.rowcount, 0))
+
+    def executemany(self, sql, seq_of_params):
+        self._finish()
+        self._query, self._elapsed, self._rows = query_label(sql), 0.0, 0
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_params)
+        finally:
+            self._track(started, max(self.rowcount, 0))
+            self._finish()
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._track(started, row is not None)
+        if row is None:
+            self._finish()
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._track(started, len(rows))
+        if not rows:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._track(started, len(rows))
+        self._finish()
+        return rows
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        self._finish()
+
+
+class TimedConnection(sqlite3.Connection):
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    # the built-in shortcuts would bypass cursor()
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self.cursor().executemany(sql, seq_of_params)
+
+
+@app.before_request
+def start_timing():
+    if METRICS_ENABLED:
+        g.timings = {}
+        g.started = time.perf_counter()
+
+
+# registered before compress_response, so it runs after it and sees its time
+@app.after_request
+def record_timing(resp):
+    if not METRICS_ENABLED or "started" not in g:
+        return resp
+    labels = (request.endpoint or "unmatched", request.method, str(resp.status_code))
+    elapsed = time.perf_counter() - g.started
+    if resp.is_streamed:
+        # the body runs after this (under stream_with_context, so its stages still
+        # land in g.timings): record once it has been sent. The header can only
+        # carry what happened before it, up to "headers".
+        resp.call_on_close(partial(observe_timing, labels, g.started, g.timings))
+        last = ("headers", elapsed)
+    else:
+        observe_timing(labels, g.started, g.timings)
+        last = ("total", elapsed)
+    resp.headers["Server-Timing"] = ", ".join(
+        f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in [*g.timings.items(), last]
+    )
+    return resp
+
+
+def observe_timing(labels, started, timings):
+    request_seconds.observe(time.perf_counter() - started, *labels)
+    for stage, seconds in timings.items():
+        stage_seconds.observe(seconds, labels[0], stage)
+
+
+# =========================
+# Storage
+# =========================
+if DATABASE_URL.startswith(("postgres://", "postgresql://")):
+    storage = PostgresStorage(DATABASE_URL, DB_POOL_SIZE, max_radius_km=MAX_SERVICE_RADIUS_KM, timed=timed)
+else:
+    storage = SQLiteStorage(
+        DB_NAME, DB_BUSY_TIMEOUT_MS, DB_CACHE_SIZE_KB, DB_MMAP_SIZE,
+        factory=TimedConnection if METRICS_ENABLED else sqlite3.Connection,
+        max_radius_km=MAX_SERVICE_RADIUS_KM, timed=timed,
+    )
 
 
 def init_db():
-    conn = get_db()
-    cur = conn.cursor()
-
-    # ---- USERS TABLE ----
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            role TEXT NOT NULL CHECK(role IN ('receiver','provider')),
-            name TEXT NOT NULL,
-            email TEXT NOT NULL UNIQUE,
-            password_hash TEXT NOT NULL,
-            created_at TEXT NOT NULL
-        )
-    """)
-
-    cols = {row["name"] for row in cur.execute("PRAGMA table_info(users)").fetchall()}
-
-    if "location_text" not in cols:
-        cur.execute("ALTER TABLE users ADD COLUMN location_text TEXT")
-    if "lat" not in cols:
-        cur.execute("ALTER TABLE users ADD COLUMN lat REAL")
-    if "lng" not in cols:
-        cur.execute("ALTER TABLE users ADD COLUMN lng REAL")
-    if "service_radius_km" not in cols:
-        cur.execute("ALTER TABLE users ADD COLUMN service_radius_km REAL")
-
-    # ---- REQUESTS TABLE ----
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS requests (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            receiver_user_id INTEGER NOT NULL,
-            title TEXT NOT NULL,
-            category TEXT NOT NULL,
-            details TEXT,
-            status TEXT NOT NULL DEFAULT 'Open',
-            created_at TEXT NOT NULL,
-            FOREIGN KEY(receiver_user_id) REFERENCES users(id)
-        )
-    """)
-
-    req_cols = {row["name"] for row in cur.execute("PRAGMA table_info(requests)").fetchall()}
-
-    if "location_text" not in req_cols:
-        cur.execute("ALTER TABLE requests ADD COLUMN location_text TEXT")
-    if "lat" not in req_cols:
-        cur.execute("ALTER TABLE requests ADD COLUMN lat REAL")
-    if "lng" not in req_cols:
-        cur.execute("ALTER TABLE requests ADD COLUMN lng REAL")
-
-    # schedule + wage fields
-    if "scheduled_date" not in req_cols:
-        cur.execute("ALTER TABLE requests ADD COLUMN scheduled_date TEXT")
-    if "scheduled_time" not in req_cols:
-        cur.execute("ALTER TABLE requests ADD COLUMN scheduled_time TEXT")
-    if "duration_min" not in req_cols:
-        cur.execute("ALTER TABLE requests ADD COLUMN duration_min INTEGER")
-    if "hourly_wage" not in req_cols:
-        cur.execute("ALTER TABLE requests ADD COLUMN hourly_wage REAL")
-
-    # serviced tracking
-    if "serviced_at" not in req_cols:
-        cur.execute("ALTER TABLE requests ADD COLUMN serviced_at TEXT")
-    if "serviced_by_user_id" not in req_cols:
-        cur.execute("ALTER TABLE requests ADD COLUMN serviced_by_user_id INTEGER")
-
-    conn.commit()
-    conn.close()
+    """Bring the schema up to date. Cheap when there is nothing to do."""
+    storage.migrate()
+
+
+@app.cli.command("init-db")
+def init_db_command():
+    """Apply pending schema migrations."""
+    init_db()
+    print(f"Schema at version {storage.schema_version(get_db())}.")
 
 
 # =========================
 # Helpers
 # =========================
+class TTLCache:
+    """Small thread-safe LRU with per-entry expiry and hit/miss counters."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.ttl > 0 and self.maxsize > 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self._data.pop(key, None)
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "size": len(self._data),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+# Other workers only see an update once their entry expires, so keep the TTL short.
+user_cache = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+
+
+def load_user(uid, conn=None):
+    """The user row, from the cache when enabled, with any pin still in the write buffer."""
+    if user_cache.enabled:
+        cached = user_cache.get(uid)
+        if cached is not None:
+            return location_buffer.overlay(dict(cached))
+
+    row = storage.get_user(conn or get_db(), uid)
+    if not row:
+        return None
+
+    user = dict(row)
+    if user_cache.enabled:
+        user_cache.set(uid, dict(user))
+    return location_buffer.overlay(user)
+
+
 def current_user():
+    """The logged-in user, loaded at most once per request."""
     uid = session.get("user_id")
     if not uid:
         return None
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT id, role, name, email, location_text, lat, lng, service_radius_km "
-        "FROM users WHERE id=?",
-        (uid,),
-    )
-    row = cur.fetchone()
-    conn.close()
-    return dict(row) if row else None
+    user = g.get("user")
+    if user is None or user["id"] != uid:
+        user = load_user(uid)
+        g.user = user
+    return user
+
+
+def forget_user(uid):
+    """Drop cached copies of a user row after it has been updated."""
+    user_cache.pop(uid)
+    g.pop("user", None)
 
 
 def login_required(role=None):
@@ -131,43 +481,82 @@ def login_required(role=None):
 
 
 def find_user_by_email(email):
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM users WHERE email=?", (email,))
-    row = cur.fetchone()
-    conn.close()
-    return row
+    return storage.find_user_by_email(get_db(), email)
 
 
-def create_user(role, name, email, password):
-    pw_hash = generate_password_hash(password)
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO users (role, name, email, password_hash, created_at) VALUES (?, ?, ?, ?, ?)",
-        (role, name, email, pw_hash, datetime.utcnow().isoformat()),
-    )
-    conn.commit()
-    new_id = cur.lastrowid
-    conn.close()
-    return new_id
+class HashingBusy(Exception):
+    """Raised when this worker already has HASH_WORKERS + HASH_QUEUE_LIMIT hashes in flight."""
 
 
-def haversine_km(lat1, lon1, lat2, lon2):
-    R = 6371.0
-    p = math.pi / 180.0
-    dlat = (lat2 - lat1) * p
-    dlon = (lon2 - lon1) * p
-    a = (math.sin(dlat / 2) ** 2) + math.cos(lat1 * p) * math.cos(lat2 * p) * (math.sin(dlon / 2) ** 2)
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return R * c
+_hash_pool = None
+_hash_pool_lock = threading.Lock()
+_hash_slots = threading.BoundedSemaphore(HASH_WORKERS + HASH_QUEUE_LIMIT)
+_hash_prefix = None
 
 
-def to_float(x):
+def run_hashing(fn, *args):
+    global _hash_pool
+    if not _hash_slots.acquire(blocking=False):
+        raise HashingBusy()
     try:
-        return float(x)
-    except (TypeError, ValueError):
-        return None
+        # created lazily so it is never inherited across a fork
+        with _hash_pool_lock:
+            if _hash_pool is None:
+                _hash_pool = ThreadPoolExecutor(HASH_WORKERS, thread_name_prefix="pwhash")
+        return _hash_pool.submit(fn, *args).result()
+    finally:
+        _hash_slots.release()
+
+
+def hash_password(password):
+    return run_hashing(generate_password_hash, password, PASSWORD_HASH_METHOD)
+
+
+def verify_password(pw_hash, password):
+    return run_hashing(check_password_hash, pw_hash, password)
+
+
+def needs_rehash(pw_hash):
+    """True when pw_hash was made with different parameters than PASSWORD_HASH_METHOD."""
+    global _hash_prefix
+    if _hash_prefix is None:
+        # werkzeug expands defaults ("scrypt" -> "scrypt:32768:8:1"), so ask it once
+        _hash_prefix = hash_password("").split("$", 1)[0]
+    return pw_hash.split("$", 1)[0] != _hash_prefix
+
+
+def upgrade_password_hash(user_id, pw_hash, password):
+    """Re-hash with the current parameters after a successful login. Best effort."""
+    try:
+        if not needs_rehash(pw_hash):
+            return
+        new_hash = hash_password(password)
+    except HashingBusy:
+        return
+    storage.set_password_hash(get_db(), user_id, new_hash)
+
+
+@app.errorhandler(HashingBusy)
+def hashing_busy(exc):
+    error = "Server is busy, please try again in a moment."
+    if request.endpoint in ("receiver_signup", "receiver_login", "provider_signup", "provider_login"):
+        body = render_template(f"{request.endpoint}.html", error=error)
+    else:
+        body = jsonify({"error": error})
+    return body, 503, {"Retry-After": "1"}
+
+
+def create_user(role, name, email, password):
+    pw_hash = hash_password(password)
+    new_id, version = storage.create_user(get_db(), role, name, email, pw_hash, datetime.utcnow().isoformat())
+
+    if role == "provider":
+        provider_changed(version, lambda snap: snap.add_provider())
+    return new_id
+
+
+def valid_radius(radius_km):
+    return storage.usable_radius(radius_km)
 
 
 def to_int(x):
@@ -177,6 +566,814 @@ def to_int(x):
         return None
 
 
+def feed_etag(conn, *parts):
+    """
+    Strong ETag for a feed response, cheap enough to check before any rows are
+    read: every request insert/status change appends to request_events, so its
+    latest seq moves whenever a feed could change.
+    """
+    key = (request.path, sorted(request.args.items(multi=True)), parts, storage.latest_event_seq(conn))
+    return hashlib.sha1(repr(key).encode()).hexdigest()
+
+
+def not_modified(etag):
+    """304 response when the client already holds `etag` (in any encoding), else None."""
+    # If-None-Match compares weakly (RFC 9110 13.1.2): proxies may weaken the tag
+    if any(request.if_none_match.contains_weak(f"{etag}{suffix}") for suffix in ("", "-gzip", "-br")):
+        resp = Response(status=304)
+        resp.set_etag(etag)
+        resp.headers["Cache-Control"] = "private, no-cache"
+        return resp
+    return None
+
+
+def with_etag(resp, etag):
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp
+
+
+def wants_ndjson():
+    best = request.accept_mimetypes.best_match(["application/json", "application/x-ndjson"])
+    return best == "application/x-ndjson"
+
+
+def streamed_json(items, etag, ndjson=False):
+    """
+    Response that serializes `items` (any iterable of dicts) while it is being
+    sent: a JSON array, or one object per line for NDJSON, encoded like
+    jsonify(). compress_response() skips streams, so compression happens here.
+
+    `items` may read lazily from the request's connection, so the response
+    takes that connection over and releases it when the server closes the
+    response. That also happens when the body never runs (HEAD, a client that
+    went away), which a `finally` in the body would miss.
+    """
+    conn = g.pop("db", None)
+
+    def dumps(item):
+        return app.json.dumps(item, separators=(",", ":"))
+
+    def text():
+        buf, size = ["" if ndjson else "["], 0
+        sep = "\n" if ndjson else ","
+        first = True
+        for item in items:
+            with timed("serialize"):
+                part = dumps(item)
+            buf.append(part if first else sep + part)
+            first = False
+            size += len(part)
+            if size >= STREAM_CHUNK_BYTES:
+                yield "".join(buf)
+                buf, size = [], 0
+        buf.append("\n" if ndjson and not first else "" if ndjson else "]\n")
+        yield "".join(buf)
+
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        encoding = "br"
+        compressor = brotli.Compressor(quality=5)
+        step, finish = compressor.process, compressor.finish
+    elif accepted["gzip"]:
+        encoding = "gzip"
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # 31: gzip container
+        step, finish = compressor.compress, compressor.flush
+    else:
+        encoding = None
+
+    def body():
+        if encoding is None:
+            yield from (chunk.encode() for chunk in text())
+            return
+        for chunk in text():
+            with timed("compress"):
+                out = step(chunk.encode())
+            if out:
+                yield out
+        with timed("compress"):
+            out = finish()
+        yield out
+
+    # stream_with_context: the body runs in this request's context, so stages
+    # timed while it is sent count towards the request (see record_timing)
+    resp = Response(
+        stream_with_context(body()),
+        mimetype="application/x-ndjson" if ndjson else "application/json",
+    )
+    resp.vary.add("Accept")
+    resp.vary.add("Accept-Encoding")
+    if conn is not None:
+        # runs after the body generator is closed
+        resp.call_on_close(partial(storage.release, conn))
+    with_etag(resp, etag)
+    if encoding:
+        resp.headers["Content-Encoding"] = encoding
+        resp.set_etag(f"{etag}-{encoding}")
+    return resp
+
+
+@app.after_request
+def compress_response(resp):
+    if (
+        resp.status_code != 200
+        or resp.is_streamed
+        or resp.direct_passthrough
+        or resp.mimetype != "application/json"
+        or "Content-Encoding" in resp.headers
+    ):
+        return resp
+
+    resp.vary.add("Accept-Encoding")
+    if resp.content_length is not None and resp.content_length < COMPRESS_MIN_BYTES:
+        return resp
+
+    accepted = request.accept_encodings
+    with timed("compress"):
+        if brotli is not None and accepted["br"]:
+            encoding, body = "br", brotli.compress(resp.get_data(), quality=5)
+        elif accepted["gzip"]:
+            encoding, body = "gzip", gzip.compress(resp.get_data(), compresslevel=6)
+        else:
+            return resp
+
+    resp.set_data(body)
+    resp.headers["Content-Encoding"] = encoding
+    etag, weak = resp.get_etag()
+    if etag:
+        # each encoding is a different representation, so it needs its own ETag
+        resp.set_etag(f"{etag}-{encoding}", weak=weak)
+    return resp
+
+
+# =========================
+# Provider coverage snapshot
+# - every worker keeps the configured providers in memory
+# - counters.providers is bumped on each provider change; a worker re-checks it
+#   at most every PROVIDER_SNAPSHOT_TTL seconds and reloads when it moved
+# - changes made by this worker are applied to a copy without a reload; the
+#   copy then replaces the snapshot, so a published snapshot never changes and
+#   readers need no lock
+# =========================
+class ProviderSnapshot:
+    def __init__(self, version, providers_total, rows):
+        self.version = version
+        self.checked_at = time.monotonic()
+        self.providers_total = providers_total
+        # pin + radius set (radius may still be out of range)
+        self.configured = set()
+        # only providers with a usable radius live in the arrays
+        self.ids, self.names, self.index = [], [], {}
+        lats, lngs, radii = [], [], []
+        for r in rows:
+            self.configured.add(r["id"])
+            radius = to_float(r["service_radius_km"])
+            if not valid_radius(radius):
+                continue
+            self.index[r["id"]] = len(self.ids)
+            self.ids.append(r["id"])
+            self.names.append(r["name"])
+            lats.append(float(r["lat"]))
+            lngs.append(float(r["lng"]))
+            radii.append(radius)
+        self.areas = CoverageSet(lats, lngs, radii, PROVIDER_GRID_DEG)
+
+    @property
+    def providers_configured(self):
+        return len(self.configured)
+
+    @classmethod
+    def load(cls, conn):
+        return cls(*storage.load_providers(conn))
+
+    def copy(self):
+        """A private copy for add_provider()/update_provider() to patch."""
+        snap = ProviderSnapshot.__new__(ProviderSnapshot)
+        snap.__dict__.update(self.__dict__)
+        snap.configured = set(self.configured)
+        snap.ids, snap.names, snap.index = list(self.ids), list(self.names), dict(self.index)
+        snap.areas = self.areas.copy()
+        return snap
+
+    def add_provider(self):
+        self.providers_total += 1
+
+    def update_provider(self, provider_id, name, lat, lng, radius_km):
+        if lat is not None and lng is not None and radius_km is not None:
+            self.configured.add(provider_id)
+        else:
+            self.configured.discard(provider_id)
+
+        i = self.index.get(provider_id)
+        usable = provider_id in self.configured and valid_radius(radius_km)
+
+        if i is not None and usable:
+            self.areas.set(i, lat, lng, radius_km)
+        elif i is not None:
+            last = len(self.ids) - 1
+            self.areas.remove(i)
+            self.ids[i], self.names[i] = self.ids[last], self.names[last]
+            self.index[self.ids[i]] = i
+            self.ids.pop()
+            self.names.pop()
+            del self.index[provider_id]
+        elif usable:
+            self.index[provider_id] = len(self.ids)
+            self.ids.append(provider_id)
+            self.names.append(name)
+            self.areas.append(lat, lng, radius_km)
+
+    def coverage(self, lat, lng):
+        """(providers whose radius reaches the pin, nearest sorted first; nearest distance overall)"""
+        if coverage_cells.enabled:
+            areas, ids, names = coverage_cells.get(self, lat, lng)
+        elif self.areas.grid is not None:
+            idx = self.areas.candidates(lat, lat, lng, lng)
+            areas, ids, names = self.areas.subset(idx), [self.ids[i] for i in idx], [self.names[i] for i in idx]
+        else:
+            areas, ids, names = self.areas, self.ids, self.names
+        hits, nearest_km = areas.covering(lat, lng)
+        in_range = [{
+            "id": ids[i],
+            "name": names[i],
+            "distance_km": round(d, 2),
+            "radius_km": float(areas.radii[i]),
+        } for i, d in hits]
+        in_range.sort(key=lambda x: (x["distance_km"], x["id"]))
+        return in_range, nearest_km
+
+
+class CoverageCells:
+    """
+    Per grid cell, the snapshot's providers that can matter to a pin inside it
+    (CoverageSet.candidates), so a check measures a handful of providers
+    instead of all of them. LRU bounded by the providers held across cells;
+    emptied when the snapshot version moves on.
+    """
+
+    def __init__(self, cell_deg, max_points):
+        self.cell_deg = cell_deg
+        self.max_points = max_points
+        self.hits = 0
+        self.misses = 0
+        self.points = 0
+        self.version = None
+        self._cells = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.cell_deg > 0 and self.max_points > 0
+
+    def get(self, snap, lat, lng):
+        """
+        (CoverageSet, ids, names) to measure a pin in this snapshot against.
+        A miss reads snap outside the lock, which is safe because published
+        snapshots are never patched (provider_changed() swaps in a copy).
+        """
+        key = grid_cell(lat, lng, self.cell_deg)
+        version = snap.version
+        with self._lock:
+            if self.version is None or version > self.version:
+                self._cells.clear()
+                self.points = 0
+                self.version = version
+            entry = self._cells.get(key) if version == self.version else None
+            if entry is not None:
+                self._cells.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        idx = snap.areas.candidates(*cell_bounds(key, self.cell_deg))
+        entry = (snap.areas.subset(idx), [snap.ids[i] for i in idx], [snap.names[i] for i in idx])
+
+        with self._lock:
+            # a snapshot patched meanwhile may already have emptied the cache
+            if version == self.version and key not in self._cells:
+                self._cells[key] = entry
+                self.points += len(idx) + 1
+                while self.points > self.max_points:
+                    _, (_, ids, _) = self._cells.popitem(last=False)
+                    self.points -= len(ids) + 1
+        return entry
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "cells": len(self._cells),
+                "providers": self.points - len(self._cells),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+coverage_cells = CoverageCells(COVERAGE_CELL_DEG, COVERAGE_CACHE_POINTS)
+
+
+_provider_snapshot = None
+_provider_snapshot_lock = threading.Lock()
+
+
+def provider_snapshot(conn):
+    """The current snapshot; usually no SQL at all."""
+    global _provider_snapshot
+    with _provider_snapshot_lock:
+        snap = _provider_snapshot
+        now = time.monotonic()
+        if snap is not None and now - snap.checked_at < PROVIDER_SNAPSHOT_TTL:
+            return snap
+        if snap is not None and storage.read_counter(conn, "providers") == snap.version:
+            snap.checked_at = now
+            return snap
+        _provider_snapshot = ProviderSnapshot.load(conn)
+        return _provider_snapshot
+
+
+def provider_changed(version, apply):
+    """
+    Record a provider write that was committed as `version`. When the local
+    snapshot is exactly one version behind, publish a patched copy of it;
+    otherwise some other worker wrote too and the next read reloads.
+    """
+    global _provider_snapshot
+    with _provider_snapshot_lock:
+        snap = _provider_snapshot
+        if snap is None:
+            return
+        if snap.version == version - 1:
+            patched = snap.copy()
+            apply(patched)
+            patched.version = version
+            _provider_snapshot = patched
+        else:
+            _provider_snapshot = None
+
+
+# =========================
+# Request matching
+# - request_matches holds (provider, open request, distance) for every open
+#   request inside a provider's usable service radius
+# - kept current by the writes that can change it: a new request, a provider
+#   pin/radius change, and a request leaving Open
+# - the default provider feed is then a primary-key range read
+# =========================
+def matched_feed(conn, provider_id, radius, filters=None, sort="newest", limit=None):
+    """The open-requests feed straight from request_matches (a generator)."""
+    for row, d in storage.matched_feed(conn, provider_id, filters, sort, limit):
+        yield feed_item(dict(row), d, radius)
+
+
+@app.cli.command("check-matches")
+@click.option("--fix", is_flag=True, help="Rebuild the matches of providers that disagree.")
+def check_matches_command(fix):
+    """Compare request_matches with a brute-force recomputation."""
+    conn = get_db()
+    providers = storage.provider_pins(conn)
+
+    bad = 0
+    for p in providers:
+        usable = p["lat"] is not None and p["lng"] is not None and valid_radius(to_float(p["service_radius_km"]))
+        expected = {}
+        if usable:
+            expected = {
+                item["id"]: item["distance_km"]
+                for item in provider_feed(conn, p["lat"], p["lng"], p["service_radius_km"])
+            }
+        stored = {rid: round(d, 2) for rid, d in storage.stored_matches(conn, p["id"]).items()}
+        if stored == expected:
+            continue
+
+        bad += 1
+        missing = sorted(expected.keys() - stored.keys())
+        extra = sorted(stored.keys() - expected.keys())
+        moved = sorted(k for k in expected.keys() & stored.keys() if expected[k] != stored[k])
+        print(f"provider {p['id']}: missing {missing[:10]} extra {extra[:10]} distance {moved[:10]}")
+        if fix:
+            storage.rebuild_matches(conn, p["id"], p["lat"], p["lng"], p["service_radius_km"])
+
+    print(f"Checked {len(providers)} providers, {bad} inconsistent{' (fixed)' if fix and bad else ''}.")
+    if bad and not fix:
+        raise SystemExit(1)
+
+
+# =========================
+# Request archive
+# - Serviced requests older than ARCHIVE_AFTER_DAYS move to requests_archive,
+#   so the hot table and its indexes only hold what is still in play
+# - history reads (list_requests, ?history=1) merge both tables by id
+# =========================
+def archive_serviced(conn, older_than_days, batch_size=ARCHIVE_BATCH_SIZE):
+    """Move old Serviced requests to requests_archive. Returns how many moved."""
+    cutoff = (datetime.utcnow() - timedelta(days=older_than_days)).isoformat()
+    return storage.archive_serviced(conn, cutoff, batch_size)
+
+
+@app.cli.command("archive-requests")
+@click.option("--days", type=int, default=ARCHIVE_AFTER_DAYS, show_default=True,
+              help="Archive requests serviced more than this many days ago.")
+def archive_requests_command(days):
+    """Move old Serviced requests into requests_archive."""
+    started = time.perf_counter()
+    moved = archive_serviced(get_db(), days)
+    print(f"Archived {moved} requests serviced more than {days} days ago in {time.perf_counter() - started:.1f}s.")
+
+
+# =========================
+# Bulk import/export
+# - `flask --app app data import users providers.csv`, `... data export requests out.ndjson`
+# - CSV or NDJSON, picked by file extension or --format; "-" is stdin/stdout
+# - rows are checked like the signup, location and request endpoints check
+#   them; bad rows are reported and skipped
+# - with --checkpoint, every committed batch is recorded and a rerun with the
+#   same file and checkpoint starts after it
+# =========================
+@app.cli.group("data")
+def data_cli():
+    """Bulk import/export of users and requests."""
+
+
+def data_format(path, fmt):
+    if fmt:
+        return fmt
+    if path.endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    if path.endswith(".csv"):
+        return "csv"
+    raise click.UsageError("Cannot tell the format from the file name, pass --format.")
+
+
+def open_data(path, mode):
+    if path == "-":
+        return nullcontext(sys.stdin if mode == "r" else sys.stdout)
+    return open(path, mode, encoding="utf-8", newline="")  # csv does its own line endings
+
+
+def read_records(f, fmt):
+    if fmt == "csv":
+        yield from csv.DictReader(f)
+        return
+    for line in f:
+        if line.strip():
+            yield json.loads(line)
+
+
+def write_records(f, fmt, columns, rows):
+    n = 0
+    if fmt == "csv":
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow(["" if row[c] is None else row[c] for c in columns])
+            n += 1
+        return n
+    for row in rows:
+        f.write(json.dumps({c: row[c] for c in columns}, separators=(",", ":")) + "\n")
+        n += 1
+    return n
+
+
+def cell(record, key):
+    """A field as a stripped string, or None when missing/empty (CSV has no nulls)."""
+    value = record.get(key)
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def import_pin(record):
+    lat, lng = cell(record, "lat"), cell(record, "lng")
+    if lat is None and lng is None:
+        return None, None
+    lat_f, lng_f = to_float(lat), to_float(lng)
+    if lat_f is None or lng_f is None:
+        raise ValueError("lat and lng must both be numbers")
+    return lat_f, lng_f
+
+
+def import_user(record):
+    role = cell(record, "role")
+    name = cell(record, "name")
+    email = (cell(record, "email") or "").lower()
+    if role not in ("receiver", "provider"):
+        raise ValueError("role must be receiver or provider")
+    if not name or not email:
+        raise ValueError("name and email are required")
+    password, pw_hash = cell(record, "password"), cell(record, "password_hash")
+    if not password and not pw_hash:
+        raise ValueError("password or password_hash is required")
+
+    lat, lng = import_pin(record)
+    radius = None
+    if role == "provider" and cell(record, "service_radius_km") is not None:
+        radius = to_float(cell(record, "service_radius_km"))
+        if not valid_radius(radius):
+            raise ValueError(f"service_radius_km must be more than 0 and at most {MAX_SERVICE_RADIUS_KM}")
+    return {
+        "role": role,
+        "name": name,
+        "email": email,
+        "password_hash": pw_hash,
+        "password": password if not pw_hash else None,
+        "created_at": cell(record, "created_at") or datetime.utcnow().isoformat(),
+        "location_text": cell(record, "location_text") if role == "receiver" else None,
+        "lat": lat,
+        "lng": lng,
+        "service_radius_km": radius,
+    }
+
+
+def import_request(record):
+    title, category = cell(record, "title"), cell(record, "category")
+    if not title or not category:
+        raise ValueError("title and category are required")
+    receiver_email = (cell(record, "receiver_email") or "").lower()
+    if not receiver_email:
+        raise ValueError("receiver_email is required")
+    lat, lng = import_pin(record)
+    if lat is None:
+        raise ValueError("lat and lng are required")
+
+    duration_min = to_int(cell(record, "duration_min"))
+    hourly_wage = to_float(cell(record, "hourly_wage"))
+    scheduled_date, scheduled_time = cell(record, "scheduled_date"), cell(record, "scheduled_time")
+    if not scheduled_date or not scheduled_time or not duration_min or hourly_wage is None:
+        raise ValueError("scheduled_date, scheduled_time, duration_min and hourly_wage are required")
+
+    status = cell(record, "status") or "Open"
+    if status == "Resolved":
+        # exports from before the Serviced status
+        status = "Serviced"
+    if status not in ("Open", "Claimed", "Serviced"):
+        raise ValueError("status must be Open, Claimed or Serviced")
+    serviced = status == "Serviced"
+    claimed_by_email = (cell(record, "claimed_by_email") or "").lower() or None
+    if status == "Claimed" and not claimed_by_email:
+        raise ValueError("claimed_by_email is required for Claimed requests")
+    return {
+        "receiver_email": receiver_email,
+        "serviced_by_email": (cell(record, "serviced_by_email") or "").lower() or None,
+        "claimed_by_email": claimed_by_email,
+        "receiver_user_id": None,
+        "title": title,
+        "category": category,
+        "details": cell(record, "details") or "",
+        "status": status,
+        "created_at": cell(record, "created_at") or datetime.utcnow().isoformat(),
+        "location_text": cell(record, "location_text"),
+        "lat": lat,
+        "lng": lng,
+        "scheduled_date": scheduled_date,
+        "scheduled_time": scheduled_time,
+        "duration_min": duration_min,
+        "hourly_wage": hourly_wage,
+        "serviced_at": (cell(record, "serviced_at") or datetime.utcnow().isoformat()) if serviced else None,
+        "serviced_by_user_id": None,
+        "version": 0,
+        "claimed_by_user_id": None,
+        "claimed_at": (cell(record, "claimed_at") or datetime.utcnow().isoformat()) if claimed_by_email else None,
+    }
+
+
+def hash_imported_passwords(rows, pool, workers):
+    todo = [r for r in rows if r["password_hash"] is None]
+    if not todo:
+        return
+    hashes = pool.map(
+        partial(generate_password_hash, method=PASSWORD_HASH_METHOD),
+        [r["password"] for r in todo],
+        chunksize=max(1, len(todo) // (workers * 4)),
+    )
+    for r, pw_hash in zip(todo, hashes):
+        r["password_hash"] = pw_hash
+
+
+def link_request_users(conn, rows, report):
+    """Fill in user ids from the emails; returns the rows whose receiver exists."""
+    ids = storage.user_ids_by_email(
+        conn,
+        [r["receiver_email"] for n, r in rows]
+        + [r[key] for n, r in rows for key in ("serviced_by_email", "claimed_by_email") if r[key]],
+    )
+    linked = []
+    for n, r in rows:
+        r["receiver_user_id"] = ids.get(r["receiver_email"])
+        r["serviced_by_user_id"] = ids.get(r["serviced_by_email"])
+        r["claimed_by_user_id"] = ids.get(r["claimed_by_email"])
+        if r["receiver_user_id"] is None:
+            report(n, f"no user with email {r['receiver_email']}")
+        elif r["claimed_by_email"] and r["claimed_by_user_id"] is None:
+            report(n, f"no user with email {r['claimed_by_email']}")
+        else:
+            linked.append(r)
+    return linked
+
+
+def read_checkpoint(checkpoint, path):
+    if not checkpoint or not os.path.exists(checkpoint):
+        return 0
+    with open(checkpoint) as f:
+        state = json.load(f)
+    if state["path"] != path:
+        raise click.UsageError(f"{checkpoint} belongs to {state['path']}, not {path}.")
+    return state["rows"]
+
+
+def write_checkpoint(checkpoint, path, rows):
+    if checkpoint:
+        with open(f"{checkpoint}.tmp", "w") as f:
+            json.dump({"path": path, "rows": rows}, f)
+        os.replace(f"{checkpoint}.tmp", checkpoint)
+
+
+@data_cli.command("import")
+@click.argument("table", type=click.Choice(["users", "requests"]))
+@click.argument("path")
+@click.option("--format", "fmt", type=click.Choice(["csv", "ndjson"]), help="Default: from the file extension.")
+@click.option("--batch-size", type=int, default=IMPORT_BATCH_ROWS, show_default=True, help="Rows per transaction.")
+@click.option("--checkpoint", metavar="FILE", help="Record progress here and resume from it.")
+@click.option("--workers", type=int, default=os.cpu_count(), show_default=True,
+              help="Processes hashing plain-text passwords.")
+def data_import_command(table, path, fmt, batch_size, checkpoint, workers):
+    """
+    Load users or requests from CSV/NDJSON.
+
+    \b
+    users:    role, name, email, password or password_hash, [location_text, lat, lng,
+              service_radius_km, created_at]; existing emails are skipped
+    requests: receiver_email, title, category, lat, lng, scheduled_date, scheduled_time,
+              duration_min, hourly_wage, [details, location_text, status,
+              serviced_by_email, serviced_at, created_at]
+    """
+    fmt = data_format(path, fmt)
+    done = read_checkpoint(checkpoint, path)
+    conn = get_db()
+    read, inserted, invalid, existing = done, 0, 0, 0
+    started = time.perf_counter()
+
+    def report(n, error):
+        nonlocal invalid
+        invalid += 1
+        click.echo(f"record {n}: {error}", err=True)
+
+    if done:
+        click.echo(f"resuming after {done:,} records", err=True)
+    with open_data(path, "r") as f, \
+            (ProcessPoolExecutor(workers) if table == "users" else nullcontext()) as pool:
+        for batch in batched(islice(read_records(f, fmt), done, None), batch_size):
+            rows = []
+            for n, record in enumerate(batch, start=read + 1):
+                try:
+                    rows.append((n, import_user(record) if table == "users" else import_request(record)))
+                except ValueError as e:
+                    report(n, e)
+
+            if table == "users":
+                # don't pay for hashing rows that would be skipped anyway
+                known = storage.user_ids_by_email(conn, [r["email"] for n, r in rows])
+                new = [r for n, r in rows if r["email"] not in known]
+                hash_imported_passwords(new, pool, workers)
+                count, _ = storage.import_users(conn, new)
+                existing += len(rows) - count
+            else:
+                count = storage.import_requests(conn, link_request_users(conn, rows, report))
+            inserted += count
+            read += len(batch)
+            write_checkpoint(checkpoint, path, read)
+
+            elapsed = time.perf_counter() - started
+            click.echo(
+                f"{table}: {read:,} records read, {inserted:,} inserted, {invalid:,} invalid, "
+                f"{existing:,} already there, {(read - done) / elapsed:,.0f} records/s",
+                err=True,
+            )
+
+    if checkpoint and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    print(f"Imported {inserted} {table} from {read - done} records in {time.perf_counter() - started:.1f}s.")
+
+
+@data_cli.command("export")
+@click.argument("table", type=click.Choice(["users", "requests"]))
+@click.argument("path")
+@click.option("--format", "fmt", type=click.Choice(["csv", "ndjson"]), help="Default: from the file extension.")
+def data_export_command(table, path, fmt):
+    """
+    Write every user or request (archived ones too) as CSV/NDJSON.
+
+    User exports include password hashes: treat the file as a secret.
+    """
+    fmt = data_format(path, fmt)
+    conn = get_db()
+    started = time.perf_counter()
+    if table == "users":
+        columns, rows = USER_EXPORT_COLUMNS, storage.export_users(conn)
+    else:
+        columns, rows = REQUEST_EXPORT_COLUMNS, storage.export_requests(conn)
+    with open_data(path, "w") as f:
+        n = write_records(f, fmt, columns, rows)
+    elapsed = time.perf_counter() - started
+    click.echo(f"Exported {n} {table} in {elapsed:.1f}s ({n / max(elapsed, 1e-9):,.0f} rows/s).", err=True)
+
+
+# =========================
+# Location writes
+# - receiver pins and provider service areas go through save_location()
+# - in buffered mode repeated saves (dragging the map pin) collapse into one
+#   pending row per user; reads of that user see it immediately
+# =========================
+def write_locations(conn, updates):
+    """Apply {user_id: (role, name, fields)} in a single transaction."""
+    version = storage.save_locations(conn, updates)
+
+    providers = [
+        (uid, name, fields["lat"], fields["lng"], fields["service_radius_km"])
+        for uid, (role, name, fields) in updates.items()
+        if role == "provider"
+    ]
+
+    for uid in updates:
+        user_cache.pop(uid)
+    if providers:
+        provider_changed(version, lambda snap: [snap.update_provider(*p) for p in providers])
+
+
+class LocationBuffer:
+    def __init__(self, enabled, interval_s, max_pending):
+        self.enabled = enabled
+        self.interval_s = interval_s
+        self.max_pending = max_pending
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def put(self, user, fields):
+        with self._lock:
+            if user["id"] in self._pending:
+                self._pending[user["id"]][2].update(fields)
+            else:
+                self._pending[user["id"]] = (user["role"], user["name"], dict(fields))
+            full = len(self._pending) >= self.max_pending
+            if self._thread is None:
+                # started lazily so it is never inherited across a fork
+                self._thread = threading.Thread(target=self._run, name="location-flush", daemon=True)
+                self._thread.start()
+        if full:
+            self._wake.set()
+
+    def has_pending(self, uid):
+        with self._lock:
+            return uid in self._pending
+
+    def overlay(self, user):
+        with self._lock:
+            pending = self._pending.get(user["id"])
+            if pending:
+                user.update(pending[2])
+        return user
+
+    def flush(self):
+        # entries stay pending (and visible to overlay) until the write has committed
+        with self._lock:
+            updates = {uid: (role, name, dict(fields)) for uid, (role, name, fields) in self._pending.items()}
+        if not updates:
+            return
+        conn = storage.connect()
+        try:
+            write_locations(conn, updates)
+        finally:
+            storage.release(conn)
+        with self._lock:
+            for uid, (role, name, fields) in updates.items():
+                # keep anything saved again while the write was running
+                if uid in self._pending and self._pending[uid][2] == fields:
+                    del self._pending[uid]
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval_s)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logging.getLogger(__name__).exception("location flush failed, will retry")
+
+
+location_buffer = LocationBuffer(LOCATION_WRITE_MODE == "buffered", LOCATION_FLUSH_MS / 1000, LOCATION_FLUSH_MAX)
+atexit.register(location_buffer.flush)
+
+
+def save_location(user, **fields):
+    if location_buffer.enabled:
+        location_buffer.put(user, fields)
+    else:
+        write_locations(get_db(), {user["id"]: (user["role"], user["name"], fields)})
+    forget_user(user["id"])
+
+
 # =========================
 # Pages
 # =========================
@@ -238,8 +1435,9 @@ def receiver_login():
         return render_template("receiver_login.html", error="No account found. Please signup.")
     if user["role"] != "receiver":
         return render_template("receiver_login.html", error="This email belongs to a Provider. Please login as Provider.")
-    if not check_password_hash(user["password_hash"], password):
+    if not verify_password(user["password_hash"], password):
         return render_template("receiver_login.html", error="Incorrect password.")
+    upgrade_password_hash(user["id"], user["password_hash"], password)
 
     session["user_id"] = user["id"]
     return redirect(url_for("receiver_dashboard"))
@@ -259,14 +1457,7 @@ def receiver_location_save():
     lat_f = to_float(request.form.get("lat"))
     lng_f = to_float(request.form.get("lng"))
 
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute(
-        "UPDATE users SET location_text=?, lat=?, lng=? WHERE id=?",
-        (location_text if location_text else None, lat_f, lng_f, user["id"]),
-    )
-    conn.commit()
-    conn.close()
+    save_location(user, location_text=location_text if location_text else None, lat=lat_f, lng=lng_f)
 
     return redirect(url_for("receiver_dashboard"))
 
@@ -318,8 +1509,9 @@ def provider_login():
         return render_template("provider_login.html", error="No account found. Please signup.")
     if user["role"] != "provider":
         return render_template("provider_login.html", error="This email belongs to a Receiver. Please login as Receiver.")
-    if not check_password_hash(user["password_hash"], password):
+    if not verify_password(user["password_hash"], password):
         return render_template("provider_login.html", error="Incorrect password.")
+    upgrade_password_hash(user["id"], user["password_hash"], password)
 
     session["user_id"] = user["id"]
     return redirect(url_for("provider_dashboard"))
@@ -339,21 +1531,41 @@ def provider_service_save():
     lng_f = to_float(request.form.get("lng"))
     radius_f = to_float(request.form.get("service_radius_km"))
 
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute(
-        "UPDATE users SET lat=?, lng=?, service_radius_km=? WHERE id=?",
-        (lat_f, lng_f, radius_f, user["id"]),
-    )
-    conn.commit()
-    conn.close()
+    save_location(user, lat=lat_f, lng=lng_f, service_radius_km=radius_f)
 
     return redirect(url_for("provider_dashboard"))
 
 
 # =========================
 # API: receiver location save + availability check
+# - called on every pin change, so it is rate limited and capped (LOCATION_*)
 # =========================
+rate_buckets = SQLiteBuckets(RATE_LIMIT_DB) if RATE_LIMIT_DB else MemoryBuckets()
+# (user id, lat, lng, providers version) -> response
+location_results = TTLCache(LOCATION_RESULT_SIZE, LOCATION_RESULT_TTL)
+_location_slots = threading.BoundedSemaphore(LOCATION_MAX_INFLIGHT)
+location_rejected = metrics.counter(
+    "app_location_rejected_total", "Availability checks turned away (rate: 429, busy: 503)", ("reason",),
+)
+
+
+def client_ip():
+    if TRUSTED_PROXY_HOPS:
+        hops = [h.strip() for h in request.headers.get("X-Forwarded-For", "").split(",") if h.strip()]
+        if len(hops) >= TRUSTED_PROXY_HOPS:
+            return hops[-TRUSTED_PROXY_HOPS]
+    return request.remote_addr
+
+
+def location_limits(user):
+    limits = []
+    if LOCATION_USER_RATE > 0:
+        limits.append((f"user:{user['id']}", LOCATION_USER_RATE, LOCATION_USER_BURST))
+    if LOCATION_IP_RATE > 0:
+        limits.append((f"ip:{client_ip()}", LOCATION_IP_RATE, LOCATION_IP_BURST))
+    return limits
+
+
 @app.route("/api/receiver/location", methods=["POST"])
 @login_required(role="receiver")
 def api_receiver_location_save_and_check():
@@ -363,44 +1575,56 @@ def api_receiver_location_save_and_check():
     location_text = (data.get("location_text") or "").strip()
     lat_f = to_float(data.get("lat"))
     lng_f = to_float(data.get("lng"))
+    fields = {"location_text": location_text if location_text else None, "lat": lat_f, "lng": lng_f}
+
+    # the pin we already have: nothing to write, and the answer can only have
+    # changed if the providers did
+    unchanged = all(user.get(k) == v for k, v in fields.items())
+    if unchanged and lat_f is not None and lng_f is not None:
+        cached = location_results.get((user["id"], lat_f, lng_f, provider_snapshot(get_db()).version))
+        if cached is not None:
+            return jsonify(cached)
+
+    limits = location_limits(user)
+    wait = rate_buckets.take(limits) if limits else 0
+    if wait:
+        location_rejected.inc("rate")
+        return jsonify({"error": "Too many location updates, please slow down."}), 429, {"Retry-After": str(math.ceil(wait))}
+
+    # shed load instead of queueing behind the database
+    if not _location_slots.acquire(blocking=False):
+        location_rejected.inc("busy")
+        return jsonify({"error": "Server is busy, please try again in a moment."}), 503, {"Retry-After": "1"}
+    try:
+        if not unchanged:
+            save_location(user, **fields)
+
+        if lat_f is None or lng_f is None:
+            return jsonify({
+                "ok": True,
+                "can_serve": False,
+                "providers_in_range": 0,
+                "providers_configured": 0,
+                "providers_total": 0,
+                "providers_list": [],
+                "reason": "No pin set. Click the map or use current location."
+            })
 
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute(
-        "UPDATE users SET location_text=?, lat=?, lng=? WHERE id=?",
-        (location_text if location_text else None, lat_f, lng_f, user["id"]),
-    )
-    conn.commit()
-
-    if lat_f is None or lng_f is None:
-        conn.close()
-        return jsonify({
-            "ok": True,
-            "can_serve": False,
-            "providers_in_range": 0,
-            "providers_configured": 0,
-            "providers_total": 0,
-            "providers_list": [],
-            "reason": "No pin set. Click the map or use current location."
-        })
-
-    cur.execute("SELECT COUNT(*) AS c FROM users WHERE role='provider'")
-    providers_total = cur.fetchone()["c"]
+        result, version = availability(lat_f, lng_f)
+        location_results.set((user["id"], lat_f, lng_f, version), result)
+        return jsonify(result)
+    finally:
+        _location_slots.release()
 
-    cur.execute("""
-        SELECT id, name, lat, lng, service_radius_km
-        FROM users
-        WHERE role='provider'
-          AND lat IS NOT NULL AND lng IS NOT NULL
-          AND service_radius_km IS NOT NULL
-    """)
-    providers = cur.fetchall()
-    conn.close()
 
-    providers_configured = len(providers)
+def availability(lat_f, lng_f):
+    """(response for a pin, providers version it was computed from)"""
+    providers = provider_snapshot(get_db())
+    providers_total = providers.providers_total
+    providers_configured = providers.providers_configured
 
     if providers_total == 0:
-        return jsonify({
+        return {
             "ok": True,
             "can_serve": False,
             "providers_in_range": 0,
@@ -408,10 +1632,10 @@ def api_receiver_location_save_and_check():
             "providers_total": 0,
             "providers_list": [],
             "reason": "No providers exist yet. Create a Provider account and set service area."
-        })
+        }, providers.version
 
     if providers_configured == 0:
-        return jsonify({
+        return {
             "ok": True,
             "can_serve": False,
             "providers_in_range": 0,
@@ -419,35 +1643,14 @@ def api_receiver_location_save_and_check():
             "providers_total": providers_total,
             "providers_list": [],
             "reason": "Providers exist, but none have set service pin + radius yet."
-        })
-
-    in_range = []
-    nearest_any_km = None
-
-    for p in providers:
-        p_lat = float(p["lat"])
-        p_lng = float(p["lng"])
-        p_rad = to_float(p["service_radius_km"])
-        if p_rad is None or p_rad <= 0 or p_rad > 200:
-            continue
+        }, providers.version
 
-        d = haversine_km(lat_f, lng_f, p_lat, p_lng)
-        if nearest_any_km is None or d < nearest_any_km:
-            nearest_any_km = d
-
-        if d <= p_rad:
-            in_range.append({
-                "id": p["id"],
-                "name": p["name"],
-                "distance_km": round(d, 2),
-                "radius_km": p_rad
-            })
-
-    in_range.sort(key=lambda x: x["distance_km"])
+    with timed("coverage"):
+        in_range, nearest_any_km = providers.coverage(lat_f, lng_f)
     providers_in_range = len(in_range)
 
     if providers_in_range > 0:
-        return jsonify({
+        return {
             "ok": True,
             "can_serve": True,
             "providers_in_range": providers_in_range,
@@ -456,9 +1659,9 @@ def api_receiver_location_save_and_check():
             "nearest_provider_km": in_range[0]["distance_km"],
             "providers_list": in_range[:5],
             "reason": "Service is available for your location."
-        })
+        }, providers.version
 
-    return jsonify({
+    return {
         "ok": True,
         "can_serve": False,
         "providers_in_range": 0,
@@ -467,7 +1670,7 @@ def api_receiver_location_save_and_check():
         "nearest_provider_km": round(nearest_any_km, 2) if nearest_any_km is not None else None,
         "providers_list": [],
         "reason": "No providers are in range for this location."
-    })
+    }, providers.version
 
 
 # =========================
@@ -476,29 +1679,53 @@ def api_receiver_location_save_and_check():
 @app.route("/api/requests", methods=["GET"])
 @login_required()
 def list_requests():
+    """
+    Newest first, one page at a time.
+    - ?limit=N (default LIST_PAGE_SIZE)
+    - ?after_id=<X-Next-Cursor of the previous page>
+    - ?fields=id,title,... to only return those columns
+    """
     user = current_user()
-    conn = get_db()
-    cur = conn.cursor()
-
-    if user["role"] == "receiver":
-        cur.execute("""
-            SELECT r.*, u.name AS receiver_name
-            FROM requests r
-            JOIN users u ON u.id = r.receiver_user_id
-            WHERE r.receiver_user_id = ?
-            ORDER BY r.id DESC
-        """, (user["id"],))
+
+    after_id = to_int(request.args.get("after_id"))
+    limit = to_int(request.args.get("limit")) or LIST_PAGE_SIZE
+    limit = max(1, min(limit, LIST_MAX_PAGE_SIZE))
+
+    fields_arg = (request.args.get("fields") or "").strip()
+    if fields_arg:
+        fields = [f.strip() for f in fields_arg.split(",") if f.strip()]
+        unknown = [f for f in fields if f not in REQUEST_FIELDS]
+        if unknown:
+            return jsonify({"error": f"Unknown field(s): {', '.join(unknown)}"}), 400
+        if "id" not in fields:
+            fields.insert(0, "id")
     else:
-        cur.execute("""
-            SELECT r.*, u.name AS receiver_name
-            FROM requests r
-            JOIN users u ON u.id = r.receiver_user_id
-            ORDER BY r.id DESC
-        """)
+        fields = None
+
+    conn = get_db()
+
+    ndjson = wants_ndjson()
+    etag = feed_etag(conn, user["id"], user["role"], ndjson)
+    cached = not_modified(etag)
+    if cached:
+        return cached
 
-    rows = cur.fetchall()
-    conn.close()
-    return jsonify([dict(r) for r in rows])
+    receiver_id = user["id"] if user["role"] == "receiver" else None
+    rows = storage.list_requests(conn, fields, receiver_id, after_id, limit + 1)
+    next_cursor = rows[limit - 1]["id"] if len(rows) > limit else None
+
+    if ndjson:
+        # a page is at most LIST_MAX_PAGE_SIZE rows, so only NDJSON is streamed here
+        resp = streamed_json((dict(r) for r in rows[:limit]), etag, ndjson=True)
+        if next_cursor is not None:
+            resp.headers["X-Next-Cursor"] = str(next_cursor)
+        return resp
+
+    with timed("serialize"):
+        resp = jsonify([dict(r) for r in rows[:limit]])
+    if next_cursor is not None:
+        resp.headers["X-Next-Cursor"] = str(next_cursor)
+    return with_etag(resp, etag)
 
 
 # =========================
@@ -528,70 +1755,166 @@ def create_request():
     if not scheduled_date or not scheduled_time or not duration_min or hourly_wage is None:
         return jsonify({"error": "Please select date, time, duration, and hourly wage."}), 400
 
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO requests
-          (receiver_user_id, title, category, details, status, created_at,
-           location_text, lat, lng, scheduled_date, scheduled_time, duration_min, hourly_wage)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
-        user["id"], title, category, details, "Open", datetime.utcnow().isoformat(),
-        user.get("location_text"), user.get("lat"), user.get("lng"),
-        scheduled_date, scheduled_time, duration_min, hourly_wage
-    ))
-    conn.commit()
-    new_id = cur.lastrowid
-    conn.close()
+    new_id = storage.create_request(get_db(), {
+        "receiver_user_id": user["id"],
+        "title": title,
+        "category": category,
+        "details": details,
+        "status": "Open",
+        "created_at": datetime.utcnow().isoformat(),
+        "location_text": user.get("location_text"),
+        "lat": user.get("lat"),
+        "lng": user.get("lng"),
+        "scheduled_date": scheduled_date,
+        "scheduled_time": scheduled_time,
+        "duration_min": duration_min,
+        "hourly_wage": hourly_wage,
+    })
 
     return jsonify({"ok": True, "id": new_id}), 201
 
 
 # =========================
-# API: mark serviced (ONLY receiver)
+# Request lifecycle: Open -> Claimed -> Serviced
+# - a provider claims an Open request inside their service area
+# - the receiver or the claiming provider marks it Serviced; the receiver can
+#   also close a request nobody has claimed
+# - every move is one conditional UPDATE on (status, version), so of any
+#   concurrent attempts exactly one wins; the others get the current status
 # =========================
+REQUEST_TRANSITIONS = {
+    # (from, to): request_events kind
+    ("Open", "Claimed"): "claimed",
+    ("Open", "Serviced"): "serviced",
+    ("Claimed", "Serviced"): "serviced",
+}
+
+
+def transition_request(conn, req, to_status, **changes):
+    """Move `req` (the row as read) to to_status unless it changed since. True if this call moved it."""
+    event = REQUEST_TRANSITIONS.get((req["status"], to_status))
+    if event is None:
+        return False
+    return storage.transition_request(conn, req["id"], req["status"], req["version"], to_status, changes, event)
+
+
+@app.route("/api/requests/<int:req_id>/claim", methods=["POST"])
+@login_required(role="provider")
+def claim_request(req_id):
+    user = current_user()
+    p_lat, p_lng = user.get("lat"), user.get("lng")
+    radius = user.get("service_radius_km")
+
+    if p_lat is None or p_lng is None or radius is None:
+        return jsonify({"error": "Set your service pin + radius"}), 400
+
+    conn = get_db()
+    r = storage.get_request(conn, req_id)
+    if not r:
+        return jsonify({"error": "Request not found"}), 404
+
+    r = dict(r)
+
+    if r["status"] == "Open":
+        if not in_radius([r], p_lat, p_lng, radius):
+            return jsonify({"error": "This request is outside your service area."}), 403
+        if transition_request(conn, r, "Claimed", claimed_by_user_id=user["id"], claimed_at=datetime.utcnow().isoformat()):
+            return jsonify({"ok": True, "already": False, "status": "Claimed"}), 200
+        # someone got there first
+        r = dict(storage.get_request(conn, req_id))
+
+    if r["status"] == "Claimed" and r["claimed_by_user_id"] == user["id"]:
+        return jsonify({"ok": True, "already": True, "status": "Claimed"}), 200
+    return jsonify({"error": f"This request is already {r['status'].lower()}.", "status": r["status"]}), 409
+
+
 @app.route("/api/requests/<int:req_id>/resolve", methods=["POST"])
-@login_required(role="receiver")
+@login_required()
 def mark_serviced(req_id):
     user = current_user()
 
     conn = get_db()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM requests WHERE id=?", (req_id,))
-    r = cur.fetchone()
+    r = storage.get_request(conn, req_id)
     if not r:
-        conn.close()
         return jsonify({"error": "Request not found"}), 404
 
     r = dict(r)
 
-    # must be their own request
-    if r["receiver_user_id"] != user["id"]:
-        conn.close()
+    # must be their own request, or the provider who claimed it
+    if user["id"] not in (r["receiver_user_id"], r.get("claimed_by_user_id")):
         return jsonify({"error": "You can only mark your own request as serviced."}), 403
 
+    if r["status"] != "Serviced":
+        serviced_by = r.get("claimed_by_user_id") or user["id"]
+        if transition_request(conn, r, "Serviced", serviced_at=datetime.utcnow().isoformat(), serviced_by_user_id=serviced_by):
+            return jsonify({"ok": True, "already": False, "status": "Serviced"}), 200
+        r = dict(storage.get_request(conn, req_id))
+
     # already serviced?
-    if (r.get("status") or "").lower() == "serviced":
-        conn.close()
+    if r["status"] == "Serviced":
         return jsonify({"ok": True, "already": True, "status": "Serviced"}), 200
+    return jsonify({"error": "This request changed in the meantime, reload and try again.", "status": r["status"]}), 409
 
-    now = datetime.utcnow().isoformat()
-    cur.execute("""
-        UPDATE requests
-        SET status='Serviced', serviced_at=?, serviced_by_user_id=?
-        WHERE id=?
-    """, (now, user["id"], req_id))
-    conn.commit()
-    conn.close()
 
-    return jsonify({"ok": True, "already": False, "status": "Serviced"}), 200
+@app.route("/api/provider/claims", methods=["GET"])
+@login_required(role="provider")
+def provider_claims():
+    user = current_user()
+    conn = get_db()
+
+    etag = feed_etag(conn, user["id"])
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
+    rows = storage.claimed_requests(conn, user["id"])
+    with timed("serialize"):
+        resp = jsonify([dict(r) for r in rows])
+    return with_etag(resp, etag)
 
 
 # =========================
 # API: provider requests (ONLY in service area)
 # - Default: show ONLY Open requests (current)
 # - If you want history too: ?history=1
+# - Narrow it down: ?category=a,b &date_from= &date_to= (scheduled_date,
+#   YYYY-MM-DD) &min_wage= &max_km=
+# - ?sort=newest (default) | distance | wage | soonest, ?limit=N for the top N
 # =========================
+def feed_options(args):
+    """(filters, sort, limit) from the query string, or a message for a 400."""
+    filters = {}
+    categories = [c.strip() for arg in args.getlist("category") for c in arg.split(",") if c.strip()]
+    if categories:
+        filters["categories"] = categories
+
+    for key in ("date_from", "date_to"):
+        value = (args.get(key) or "").strip()
+        if value:
+            try:
+                filters[key] = date.fromisoformat(value).isoformat()
+            except ValueError:
+                return f"{key} must be a date (YYYY-MM-DD)"
+
+    for key in ("min_wage", "max_km"):
+        if args.get(key):
+            value = to_float(args.get(key))
+            if value is None or value < 0:
+                return f"{key} must be a non-negative number"
+            filters[key] = value
+
+    sort = args.get("sort") or "newest"
+    if sort not in FEED_SORTS:
+        return f"sort must be one of {', '.join(FEED_SORTS)}"
+
+    limit = None
+    if args.get("limit"):
+        limit = to_int(args.get("limit"))
+        if limit is None or not 1 <= limit <= FEED_MAX_LIMIT:
+            return f"limit must be between 1 and {FEED_MAX_LIMIT}"
+    return filters, sort, limit
+
+
 @app.route("/api/provider/requests", methods=["GET"])
 @login_required(role="provider")
 def provider_requests():
@@ -603,60 +1926,230 @@ def provider_requests():
         return jsonify({"error": "Set your service pin + radius"}), 400
 
     include_history = (request.args.get("history") == "1")
+    options = feed_options(request.args)
+    if isinstance(options, str):
+        return jsonify({"error": options}), 400
 
     conn = get_db()
-    cur = conn.cursor()
-
-    if include_history:
-        cur.execute("""
-            SELECT r.*, u.name AS receiver_name
-            FROM requests r
-            JOIN users u ON u.id = r.receiver_user_id
-            ORDER BY r.id DESC
-        """)
+
+    ndjson = wants_ndjson()
+    etag = feed_etag(conn, user["id"], p_lat, p_lng, radius, ndjson)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
+    # request_matches covers open requests for usable radii and committed pins;
+    # anything else (history, odd radius, a pin still in the write buffer) is scanned
+    if (
+        not include_history
+        and valid_radius(to_float(radius))
+        and not location_buffer.has_pending(user["id"])
+    ):
+        items = matched_feed(conn, user["id"], radius, *options)
     else:
-        # ✅ current requests ONLY
-        cur.execute("""
-            SELECT r.*, u.name AS receiver_name
-            FROM requests r
-            JOIN users u ON u.id = r.receiver_user_id
-            WHERE r.status='Open'
-            ORDER BY r.id DESC
-        """)
-
-    rows = cur.fetchall()
-    conn.close()
+        items = provider_feed(conn, p_lat, p_lng, radius, include_history, *options)
+    # history can be every request ever made, so the feed is never built in memory
+    return streamed_json(items, etag, ndjson)
 
-    out = []
-    for row in rows:
-        item = dict(row)
 
-        item["distance_km"] = None
-        item["can_serve"] = False
-        item["serve_reason"] = ""
+def provider_feed(conn, p_lat, p_lng, radius, include_history=False, filters=None, sort="newest", limit=None):
+    """Feed items in range, newest first by default. A generator, so history is never held in memory."""
+    for row, d in storage.provider_feed(conn, p_lat, p_lng, radius, include_history, filters, sort, limit):
+        yield feed_item(dict(row), d, radius)
 
-        r_lat, r_lng = item.get("lat"), item.get("lng")
-        if r_lat is None or r_lng is None:
-            item["serve_reason"] = "Request has no pin"
-            continue
 
-        d = haversine_km(float(p_lat), float(p_lng), float(r_lat), float(r_lng))
-        item["distance_km"] = round(d, 2)
+def in_radius(rows, p_lat, p_lng, radius):
+    """Feed items for the rows within radius km of the provider's pin."""
+    # out-of-range requests are hidden by default
+    return [feed_item(dict(row), d, radius) for row, d in storage.within(rows, p_lat, p_lng, radius)]
 
-        if d <= float(radius):
-            item["can_serve"] = True
-            item["serve_reason"] = f"Within {radius} km"
-            out.append(item)
-        else:
-            # out-of-range requests are hidden by default
+
+def feed_item(item, distance_km, radius):
+    item["distance_km"] = round(float(distance_km), 2)
+    item["can_serve"] = True
+    item["serve_reason"] = f"Within {radius} km"
+    return item
+
+
+# =========================
+# API: provider request search
+# - ?q= words to look for in title, category and details (all of them; the
+#   last may be the start of a word), best match first
+# - only Open requests in the service area; category/date/wage/max_km filters
+#   and ?limit= as above (default SEARCH_DEFAULT_LIMIT), ?sort= is ignored
+# =========================
+_SEARCH_WORD = re.compile(r"\w+")
+
+
+def search_terms(q):
+    return _SEARCH_WORD.findall((q or "").lower())[:SEARCH_MAX_TERMS]
+
+
+@app.route("/api/provider/requests/search", methods=["GET"])
+@login_required(role="provider")
+def provider_requests_search():
+    user = current_user()
+    p_lat, p_lng = user.get("lat"), user.get("lng")
+    radius = user.get("service_radius_km")
+
+    if p_lat is None or p_lng is None or radius is None:
+        return jsonify({"error": "Set your service pin + radius"}), 400
+
+    terms = search_terms(request.args.get("q"))
+    if not terms:
+        return jsonify({"error": "q must contain at least one word"}), 400
+    options = feed_options(request.args)
+    if isinstance(options, str):
+        return jsonify({"error": options}), 400
+    filters, _, limit = options
+
+    conn = get_db()
+
+    ndjson = wants_ndjson()
+    etag = feed_etag(conn, user["id"], p_lat, p_lng, radius, ndjson)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
+    rows = storage.search_feed(conn, p_lat, p_lng, radius, terms, filters, limit or SEARCH_DEFAULT_LIMIT)
+    return streamed_json((feed_item(dict(row), d, radius) for row, d in rows), etag, ndjson)
+
+
+# =========================
+# API: provider push feed (Server-Sent Events)
+# - "snapshot": the same list as /api/provider/requests
+# - "open": a new in-range request
+# - "claimed": {"id": ...} of an in-range request a provider took
+# - "serviced": {"id": ...} of an in-range request that was closed
+# - at most SSE_MAX_STREAMS per worker; past that a 503 and the client polls
+# =========================
+_stream_slots = threading.BoundedSemaphore(SSE_MAX_STREAMS)
+streams_rejected = metrics.counter("app_sse_rejected_total", "Push feed requests turned away with a 503")
+
+
+@app.route("/api/provider/requests/stream", methods=["GET"])
+@login_required(role="provider")
+def provider_requests_stream():
+    user = current_user()
+    p_lat, p_lng = user.get("lat"), user.get("lng")
+    radius = user.get("service_radius_km")
+
+    if p_lat is None or p_lng is None or radius is None:
+        return jsonify({"error": "Set your service pin + radius"}), 400
+
+    if not _stream_slots.acquire(blocking=False):
+        streams_rejected.inc()
+        return jsonify({"error": "Live updates are busy, please poll."}), 503, {"Retry-After": "30"}
+
+    def read(query):
+        # a connection per read, so an idle stream does not hold one from the pool
+        conn = connect_db()
+        try:
+            return query(conn)
+        finally:
+            storage.release(conn)
+
+    def events():
+        # take the watermark first so nothing committed after the snapshot is missed
+        last_seq, snapshot = read(lambda conn: (
+            storage.latest_event_seq(conn), list(provider_feed(conn, p_lat, p_lng, radius)),
+        ))
+        yield f"retry: {int(SSE_POLL_SECONDS * 1000)}\n\n"
+        yield sse_message("snapshot", snapshot)
+
+        started = quiet_since = time.monotonic()
+        while time.monotonic() - started < SSE_MAX_SECONDS:
+            time.sleep(SSE_POLL_SECONDS)
+
+            last_seq, changes = read(lambda conn: provider_feed_changes(conn, last_seq, p_lat, p_lng, radius))
+            if changes:
+                quiet_since = time.monotonic()
+                for event, data in changes:
+                    yield sse_message(event, data)
+            elif time.monotonic() - quiet_since >= SSE_KEEPALIVE_SECONDS:
+                quiet_since = time.monotonic()
+                yield ": keep-alive\n\n"
+
+    resp = Response(stream_with_context(events()), mimetype="text/event-stream")
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"
+    # the server closes the response however it ends, even if the body never ran
+    resp.call_on_close(_stream_slots.release)
+    return resp
+
+
+def sse_message(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def provider_feed_changes(conn, last_seq, p_lat, p_lng, radius):
+    """
+    Events after last_seq that concern this provider's area.
+    Returns (new last_seq, [(event name, data), ...]).
+    """
+    changes = storage.events_after(conn, last_seq)
+    if not changes:
+        return last_seq, []
+
+    ids = sorted({c["request_id"] for c in changes})
+    nearby = {item["id"]: item for item in in_radius(storage.requests_by_ids(conn, ids), p_lat, p_lng, radius)}
+
+    out = []
+    for c in changes:
+        item = nearby.get(c["request_id"])
+        if item is None:
             continue
+        if c["kind"] == "open" and item["status"] == "Open":
+            out.append(("open", item))
+        elif c["kind"] in ("claimed", "serviced"):
+            out.append((c["kind"], {"id": item["id"]}))
+    return changes[-1]["seq"], out
+
+
+# =========================
+# API: cache stats
+# =========================
+@app.route("/api/cache/stats", methods=["GET"])
+@login_required()
+def cache_stats():
+    return jsonify({"user_cache": user_cache.stats(), "coverage_cells": coverage_cells.stats()})
 
-    return jsonify(out)
+
+# =========================
+# Metrics (Prometheus text format, this worker only)
+# =========================
+metrics.callback("app_user_cache_hits_total", "User cache hits", "counter", lambda: user_cache.hits)
+metrics.callback("app_user_cache_misses_total", "User cache misses", "counter", lambda: user_cache.misses)
+metrics.callback("app_user_cache_size", "Users currently cached", "gauge", lambda: user_cache.stats()["size"])
+metrics.callback(
+    "app_provider_snapshot_providers", "Providers in this worker's coverage snapshot", "gauge",
+    lambda: len(_provider_snapshot.ids) if _provider_snapshot is not None else 0,
+)
+metrics.callback("app_coverage_cell_hits_total", "Availability checks served from a cached grid cell", "counter", lambda: coverage_cells.hits)
+metrics.callback("app_coverage_cell_misses_total", "Availability checks that had to scan every provider", "counter", lambda: coverage_cells.misses)
+metrics.callback("app_coverage_cells", "Grid cells in the coverage cache", "gauge", lambda: coverage_cells.stats()["cells"])
+metrics.callback("app_location_result_hits_total", "Availability answers reused for an unchanged pin", "counter", lambda: location_results.hits)
+metrics.callback(
+    "app_location_buffer_pending", "Location saves waiting to be flushed", "gauge",
+    lambda: len(location_buffer._pending),
+)
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    if not METRICS_ENABLED:
+        abort(404)
+    return Response(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 # =========================
 # Run
 # =========================
+# Migrate on import so gunicorn workers start against an up-to-date schema.
+# Set AUTO_MIGRATE=0 to run `flask --app app init-db` as a release step instead.
+if os.environ.get("AUTO_MIGRATE", "1") == "1":
+    with app.app_context():
+        init_db()
+
 if __name__ == "__main__":
-    init_db()
     app.run(debug=True)
\ No newline at end of file
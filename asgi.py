@@ -0,0 +1,253 @@
+"""
+Optional ASGI entry point:
+
+    pip install uvicorn
+    uvicorn asgi:app --workers 2
+
+Every route is still the Flask view from app.py, with the same JSON
+contracts. The views run on a bounded thread pool (ASGI_WSGI_THREADS).
+The provider push feed (/api/provider/requests/stream) is served natively
+instead: an idle stream is a sleeping coroutine rather than a parked
+thread, so one process can hold thousands of open dashboards. Its
+periodic database reads go through a separate small executor
+(ASGI_DB_THREADS) with one connection per executor thread.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+from http.cookies import CookieError, SimpleCookie
+import io
+import json
+import os
+import sys
+import threading
+import time
+
+from itsdangerous import BadSignature
+
+import app as web
+from app import app as flask_app
+
+WSGI_THREADS = int(os.environ.get("ASGI_WSGI_THREADS", "16"))
+DB_THREADS = int(os.environ.get("ASGI_DB_THREADS", "4"))
+
+STREAM_PATH = "/api/provider/requests/stream"
+
+wsgi_executor = ThreadPoolExecutor(WSGI_THREADS, thread_name_prefix="wsgi")
+db_executor = ThreadPoolExecutor(DB_THREADS, thread_name_prefix="db")
+_local = threading.local()
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+    if scope["type"] != "http":
+        return
+    if scope["path"] == STREAM_PATH and scope["method"] == "GET":
+        return await provider_stream(scope, receive, send)
+    return await call_wsgi(scope, receive, send)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            wsgi_executor.shutdown(wait=True)
+            db_executor.shutdown(wait=True)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+# =========================
+# Flask views on a thread pool
+# =========================
+async def call_wsgi(scope, receive, send):
+    body = bytearray()
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            break
+
+    loop = asyncio.get_running_loop()
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started["status"] = int(status.split(" ", 1)[0])
+        started["headers"] = [(k.lower().encode("latin1"), v.encode("latin1")) for k, v in headers]
+
+    def begin():
+        result = flask_app(wsgi_environ(scope, bytes(body)), start_response)
+        return result, iter(result)
+
+    # one context for the whole response, whichever pool thread runs each step:
+    # a streamed body (stream_with_context) pushes Flask's request context in
+    # one next() and pops it in a later one
+    context = contextvars.copy_context()
+    result, chunks = await loop.run_in_executor(wsgi_executor, context.run, begin)
+    try:
+        await send({"type": "http.response.start", "status": started["status"], "headers": started["headers"]})
+        # pull chunks one at a time so streamed responses stay streamed
+        while True:
+            chunk = await loop.run_in_executor(wsgi_executor, context.run, next, chunks, None)
+            if chunk is None:
+                break
+            if chunk:
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+    finally:
+        if hasattr(result, "close"):
+            await loop.run_in_executor(wsgi_executor, context.run, result.close)
+
+
+def wsgi_environ(scope, body):
+    server_name, server_port = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf8").decode("latin1"),
+        "PATH_INFO": scope["path"].encode("utf8").decode("latin1"),
+        "QUERY_STRING": scope["query_string"].decode("latin1"),
+        "SERVER_NAME": server_name,
+        "SERVER_PORT": str(server_port),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "REMOTE_ADDR": (scope.get("client") or ("", 0))[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        name = name.decode("latin1")
+        value = value.decode("latin1")
+        if name == "content-type":
+            key = "CONTENT_TYPE"
+        elif name == "content-length":
+            key = "CONTENT_LENGTH"
+        else:
+            key = "HTTP_" + name.upper().replace("-", "_")
+        if key in environ:
+            # HTTP/2 clients send each cookie as its own header; cookies join with "; "
+            value = f"{environ[key]}{'; ' if key == 'HTTP_COOKIE' else ','}{value}"
+        environ[key] = value
+    return environ
+
+
+# =========================
+# Native provider push feed
+# =========================
+def _connection():
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _local.conn = web.storage.connect()
+    return conn
+
+
+async def run_db(fn, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(db_executor, lambda: fn(_connection(), *args))
+
+
+def session_user_id(scope):
+    cookie = SimpleCookie()
+    try:
+        for name, value in scope["headers"]:
+            if name == b"cookie":
+                cookie.load(value.decode("latin1"))
+    except CookieError:
+        return None
+
+    morsel = cookie.get(flask_app.config["SESSION_COOKIE_NAME"])
+    if morsel is None:
+        return None
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    try:
+        data = serializer.loads(morsel.value, max_age=int(flask_app.permanent_session_lifetime.total_seconds()))
+    except BadSignature:
+        return None
+    return data.get("user_id")
+
+
+def load_provider(conn, uid):
+    # like current_user(): a pin saved moments ago may still be in the write buffer
+    return web.load_user(uid, conn)
+
+
+def open_feed(conn, p_lat, p_lng, radius):
+    # watermark first so nothing committed after the snapshot is missed
+    return web.storage.latest_event_seq(conn), list(web.provider_feed(conn, p_lat, p_lng, radius))
+
+
+async def send_json(send, status, payload):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json")],
+    })
+    await send({"type": "http.response.body", "body": json.dumps(payload).encode()})
+
+
+async def provider_stream(scope, receive, send):
+    # same checks and messages as login_required(role="provider") + the Flask view
+    uid = session_user_id(scope)
+    user = await run_db(load_provider, uid) if uid else None
+    if not user:
+        return await send_json(send, 401, {"error": "Login required"})
+    if user["role"] != "provider":
+        return await send_json(send, 403, {"error": "Forbidden for this role"})
+
+    p_lat, p_lng, radius = user["lat"], user["lng"], user["service_radius_km"]
+    if p_lat is None or p_lng is None or radius is None:
+        return await send_json(send, 400, {"error": "Set your service pin + radius"})
+
+    disconnected = asyncio.Event()
+
+    async def watch_disconnect():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+        disconnected.set()
+
+    async def emit(text):
+        await send({"type": "http.response.body", "body": text.encode(), "more_body": True})
+
+    watcher = asyncio.create_task(watch_disconnect())
+    try:
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/event-stream; charset=utf-8"),
+                (b"cache-control", b"no-cache"),
+                (b"x-accel-buffering", b"no"),
+            ],
+        })
+        last_seq, snapshot = await run_db(open_feed, p_lat, p_lng, radius)
+        await emit(f"retry: {int(web.SSE_POLL_SECONDS * 1000)}\n\n")
+        await emit(web.sse_message("snapshot", snapshot))
+
+        started = quiet_since = time.monotonic()
+        while time.monotonic() - started < web.SSE_MAX_SECONDS:
+            try:
+                await asyncio.wait_for(disconnected.wait(), web.SSE_POLL_SECONDS)
+                return
+            except asyncio.TimeoutError:
+                pass
+
+            last_seq, changes = await run_db(web.provider_feed_changes, last_seq, p_lat, p_lng, radius)
+            if changes:
+                quiet_since = time.monotonic()
+                for event, data in changes:
+                    await emit(web.sse_message(event, data))
+            elif time.monotonic() - quiet_since >= web.SSE_KEEPALIVE_SECONDS:
+                quiet_since = time.monotonic()
+                await emit(": keep-alive\n\n")
+
+        await send({"type": "http.response.body", "body": b""})
+    finally:
+        watcher.cancel()
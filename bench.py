@@ -0,0 +1,604 @@
+"""
+Benchmark for the matching endpoints.
+
+Generates a throwaway SQLite database with city-like clusters of providers,
+receivers and requests, then drives the Flask test client against:
+
+    POST /api/receiver/location      (availability check)
+    GET  /api/provider/requests      (open requests in range)
+    GET  /api/provider/requests?history=1
+    GET  /api/provider/requests?sort=...&limit=20   (ranked / filtered)
+    GET  /api/provider/requests/search?q=...        (full-text, in range)
+    GET  /api/requests               (receiver history / provider list)
+
+and prints p50/p95/p99 latency per scenario, rows returned and SQLite VM
+operations per call. VM operations stand in for "rows scanned": they grow
+with every row SQLite has to visit, whether or not it is returned.
+
+    python bench.py                                  # defaults, temp db
+    python bench.py --requests 2000000 --keep bench.db
+    python bench.py --save base.json                 # record a baseline
+    python bench.py --compare base.json              # exit 1 if p95 regressed
+
+Search only indexes Open requests, so its latency should stay flat while
+history grows, e.g. --requests 200000 vs --requests 2000000 --open-share 0.02.
+
+coverage_<n> times one availability check against an in-memory snapshot of
+n providers (--coverage-sizes), with the coverage cell cache empty so every
+check looks its candidates up. The providers are spread over more cities as
+n grows, so about as many are near each pin; with the snapshot's grid
+(PROVIDER_GRID_DEG) the cost should stay about flat instead of growing with n.
+
+--location-clients N serves the database with gunicorn, several workers on
+the one SQLite file, and has N clients post new pins to
+/api/receiver/location at once. It reports calls per second, calls that
+did not get a 200 (e.g. "database is locked") and latency, saved and
+compared as location_load.
+
+--streams N also serves the database with gunicorn (gthread, as in the
+Procfile) and with uvicorn (asgi.py), one worker each, opens N provider
+dashboard streams on both at once and reports how many were served, the
+time to their snapshot event, and /api/provider/requests latency while they
+are held open (saved and compared as streams_gunicorn / streams_uvicorn).
+
+--logins N times /api/provider/requests again while N clients log in back
+to back, so password hashing (HASH_WORKERS, HASH_QUEUE_LIMIT) competes with
+reads for the CPU. It reports logins per second, logins turned away with a
+503, and the read latency next to the same reads with no logins running
+(saved and compared as logins_read).
+
+The app's own environment settings (LOCATION_WRITE_MODE, USER_CACHE_TTL, ...)
+apply as usual, except DATABASE_URL: the benchmark always runs on SQLite.
+Location rate limits default to off (LOCATION_USER_RATE/LOCATION_IP_RATE=0):
+every simulated client shares one IP and would otherwise be measured at 429.
+"""
+import argparse
+import asyncio
+from collections import Counter
+from datetime import date, datetime, timedelta
+import json
+import os
+import random
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+# request titles per category, and sentences the details are made of
+TASKS = {
+    "Cleaning": ["Deep clean kitchen", "Bathroom scrub", "Window cleaning", "Move-out clean", "Carpet vacuuming"],
+    "Laundry": ["Wash and fold", "Ironing shirts", "Bedsheet wash", "Dry cleaning drop-off"],
+    "Cooking": ["Weekly meal prep", "Dinner for four", "Baking for a party", "Vegetarian lunches"],
+    "Tutoring": ["Maths homework help", "English essay review", "Piano lesson", "Science exam prep"],
+    "Elder care": ["Companion visit", "Medication reminders", "Walk in the park", "Doctor appointment escort"],
+    "Shopping": ["Grocery run", "Pharmacy pickup", "Gift shopping", "Market errands"],
+    "Pet care": ["Dog walking", "Cat sitting", "Feed the fish", "Puppy training"],
+}
+CATEGORIES = list(TASKS)
+DETAILS = [
+    "Weekday morning preferred.", "Please bring your own supplies.", "Ground floor flat.",
+    "Quiet household.", "Flexible on timing.", "Near the bus stop.", "Two children at home.",
+    "Allergic to strong scents.", "Parking available outside.", "Happy to pay for materials.",
+]
+SEARCHES = ["clean", "dog walk", "meal prep", "homework", "pharmacy", "iron", "kitchen supplies", "piano"]
+PROGRESS_EVERY = 10  # VM instructions per progress-handler callback (counted per statement)
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--providers", type=int, default=5000)
+    p.add_argument("--receivers", type=int, default=20000)
+    p.add_argument("--requests", type=int, default=200000)
+    p.add_argument("--cities", type=int, default=25)
+    p.add_argument("--open-share", type=float, default=0.2, help="fraction of requests still Open")
+    p.add_argument("--archive-days", type=int, help="archive requests serviced more than this many days ago first")
+    p.add_argument("--iterations", type=int, default=200, help="calls per scenario")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--keep", metavar="PATH", help="write the database here instead of a temp file")
+    p.add_argument("--save", metavar="JSON", help="write results to this file")
+    p.add_argument("--compare", metavar="JSON", help="fail if p95 is worse than this baseline")
+    p.add_argument("--tolerance", type=float, default=0.25, help="allowed p95 slowdown for --compare")
+    p.add_argument("--streams", type=int, metavar="N", help="hold N provider streams on gunicorn and on uvicorn")
+    p.add_argument("--coverage-sizes", type=lambda v: [int(n) for n in v.split(",") if n], default="1000,10000,100000",
+                   metavar="N,N,...", help="providers per cold coverage scenario (empty to skip)")
+    p.add_argument("--location-clients", type=int, metavar="N", help="post pins from N clients to a multi-worker gunicorn")
+    p.add_argument("--logins", type=int, metavar="N", help="time provider feeds while N clients log in")
+    return p.parse_args(argv)
+
+
+# =========================
+# Synthetic data
+# =========================
+def around(rng, city, spread_km):
+    lat, lng = city
+    return (
+        lat + rng.gauss(0, spread_km) / 111.0,
+        lng + rng.gauss(0, spread_km) / 111.0,
+    )
+
+
+def generate(db_path, args, rng, web):
+    cities = [(rng.uniform(-40, 50), rng.uniform(-120, 150)) for _ in range(args.cities)]
+    weights = [rng.paretovariate(1.2) for _ in cities]  # a few big cities, many small ones
+    now = time.strftime("%Y-%m-%dT%H:%M:%S")
+    today = datetime.utcnow()
+    pw_hash = "bench$not-a-real-hash"
+
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    cur = conn.cursor()
+
+    providers = []
+    for i in range(args.providers):
+        lat, lng = around(rng, rng.choices(cities, weights)[0], 12)
+        radius = rng.choice([2, 5, 10, 15, 25, 50])
+        providers.append(("provider", f"Provider {i}", f"p{i}@bench", pw_hash, now, None, lat, lng, radius))
+    receivers = []
+    for i in range(args.receivers):
+        lat, lng = around(rng, rng.choices(cities, weights)[0], 15)
+        receivers.append(("receiver", f"Receiver {i}", f"r{i}@bench", pw_hash, now, "Somewhere", lat, lng, None))
+
+    cur.executemany("""
+        INSERT INTO users (role, name, email, password_hash, created_at, location_text, lat, lng, service_radius_km)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, providers + receivers)
+
+    receiver_rows = cur.execute("SELECT id, lat, lng FROM users WHERE role='receiver'").fetchall()
+    provider_ids = [r["id"] for r in cur.execute("SELECT id FROM users WHERE role='provider'")]
+
+    start = date(2025, 1, 1)
+    batch = []
+    for i in range(args.requests):
+        r = rng.choice(receiver_rows)
+        is_open = rng.random() < args.open_share
+        category = rng.choice(CATEGORIES)
+        batch.append((
+            r["id"], rng.choice(TASKS[category]), category, " ".join(rng.sample(DETAILS, 2)),
+            "Open" if is_open else "Serviced", now, "Somewhere", r["lat"], r["lng"],
+            (start + timedelta(days=rng.randrange(365))).isoformat(),
+            f"{rng.randrange(7, 20):02d}:00", rng.choice([30, 60, 90, 120]), rng.choice([10, 15, 20, 25, 40]),
+            None if is_open else (today - timedelta(days=rng.randrange(365))).isoformat(),
+            None if is_open else rng.choice(provider_ids),
+        ))
+        if len(batch) == 50000:
+            insert_requests(cur, batch)
+            batch = []
+    insert_requests(cur, batch)
+
+    web.storage.rebuild_provider_indexes(cur)
+    conn.commit()
+    cur.execute("ANALYZE")
+    conn.close()
+
+
+def insert_requests(cur, rows):
+    cur.executemany("""
+        INSERT INTO requests
+          (receiver_user_id, title, category, details, status, created_at, location_text, lat, lng,
+           scheduled_date, scheduled_time, duration_min, hourly_wage, serviced_at, serviced_by_user_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+
+
+# =========================
+# Driving the app
+# =========================
+def instrument(web, counter):
+    """Count SQLite VM instructions on every connection the app opens."""
+    connect = web.storage.connect
+
+    def counting_connect():
+        conn = connect()
+        conn.set_progress_handler(lambda: counter.__setitem__(0, counter[0] + PROGRESS_EVERY), PROGRESS_EVERY)
+        return conn
+
+    web.storage.connect = counting_connect
+
+
+def client_as(web, uid):
+    client = web.app.test_client()
+    with client.session_transaction() as s:
+        s["user_id"] = uid
+    return client
+
+
+def scenarios(web, db_path, rng):
+    conn = sqlite3.connect(db_path)
+    receivers = conn.execute("SELECT id, lat, lng FROM users WHERE role='receiver'").fetchall()
+    providers = conn.execute("SELECT id FROM users WHERE role='provider'").fetchall()
+    conn.close()
+
+    def location():
+        uid, lat, lng = rng.choice(receivers)
+        client = client_as(web, uid)
+        return lambda: client.post("/api/receiver/location", json={
+            "location_text": "Bench", "lat": lat + rng.gauss(0, 0.01), "lng": lng + rng.gauss(0, 0.01),
+        })
+
+    def get(path, pool):
+        def make():
+            client = client_as(web, rng.choice(pool)[0])
+            return lambda: client.get(path)
+        return make
+
+    def search():
+        client = client_as(web, rng.choice(providers)[0])
+        return lambda: client.get("/api/provider/requests/search", query_string={"q": rng.choice(SEARCHES)})
+
+    return {
+        "receiver_location": location,
+        "provider_requests": get("/api/provider/requests", providers),
+        "provider_history": get("/api/provider/requests?history=1", providers),
+        "provider_nearest": get("/api/provider/requests?sort=distance&limit=20", providers),
+        "provider_filtered": get("/api/provider/requests?category=Cooking,Tutoring&min_wage=20&sort=wage&limit=20", providers),
+        "provider_search": search,
+        "list_receiver": get("/api/requests", receivers),
+        "list_provider": get("/api/requests", providers),
+    }
+
+
+def percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def run(web, make_call, iterations, counter):
+    timings, rows, ops = [], 0, 0
+    for i in range(iterations + 5):
+        call = make_call()
+        counter[0] = 0
+        t = time.perf_counter()
+        # streamed feeds do most of their work while the body is read
+        with call() as resp:
+            body = resp.get_json(silent=True)
+        elapsed = time.perf_counter() - t
+        if i < 5:  # warm-up: snapshots, caches, page cache
+            continue
+        timings.append(elapsed)
+        ops += counter[0]
+        if isinstance(body, list):
+            rows += len(body)
+        elif isinstance(body, dict):
+            rows += len(body.get("providers_list", []))
+    return summarize(timings, rows, ops)
+
+
+def summarize(timings, rows=0, ops=0):
+    timings = sorted(timings)
+    return {
+        "p50_ms": percentile(timings, 0.50) * 1e3,
+        "p95_ms": percentile(timings, 0.95) * 1e3,
+        "p99_ms": percentile(timings, 0.99) * 1e3,
+        "rows_per_call": rows / len(timings),
+        "vm_ops_per_call": ops / len(timings),
+    }
+
+
+def print_row(name, r):
+    print(
+        f"{name:<20}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}{r['p99_ms']:>9.2f}"
+        f"{r['rows_per_call']:>9.1f}{r['vm_ops_per_call']:>11,.0f}"
+    )
+
+
+# =========================
+# Cold coverage checks as providers grow
+# =========================
+PROVIDERS_PER_CITY = 200
+
+
+def run_coverage(web, rng, size, iterations):
+    # a city per PROVIDERS_PER_CITY, so the providers near a pin stay about the same at any size
+    cities = [(rng.uniform(-40, 50), rng.uniform(-120, 150)) for _ in range(max(1, size // PROVIDERS_PER_CITY))]
+    rows = []
+    for i in range(size):
+        lat, lng = around(rng, rng.choice(cities), 12)
+        rows.append({"id": i + 1, "name": f"Provider {i}", "lat": lat, "lng": lng,
+                     "service_radius_km": rng.choice([2, 5, 10, 15, 25, 50])})
+    snap = web.ProviderSnapshot(1, size, rows)
+
+    cells = web.coverage_cells
+    timings, found = [], 0
+    try:
+        for i in range(iterations + 5):
+            lat, lng = around(rng, rng.choice(cities), 15)
+            web.coverage_cells = web.CoverageCells(cells.cell_deg, cells.max_points)
+            t = time.perf_counter()
+            in_range, _ = snap.coverage(lat, lng)
+            elapsed = time.perf_counter() - t
+            if i >= 5:
+                timings.append(elapsed)
+                found += len(in_range)
+    finally:
+        web.coverage_cells = cells
+    return summarize(timings, found)
+
+
+# =========================
+# Concurrent provider streams: gunicorn (a thread per stream) vs uvicorn (asgi.py)
+# =========================
+STREAM_SERVERS = {
+    "gunicorn": ["-m", "gunicorn", "--worker-class", "gthread", "--threads", "16", "--bind", "127.0.0.1:{port}", "app:app"],
+    "uvicorn": ["-m", "uvicorn", "asgi:app", "--host", "127.0.0.1", "--port", "{port}", "--log-level", "warning"],
+}
+STREAM_TIMEOUT = 60
+
+
+def start_server(name, command, db_path):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    # the same SECRET_KEY as this process, so the session cookies signed here work
+    proc = subprocess.Popen(
+        [sys.executable, *(part.format(port=port) for part in command)],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=dict(os.environ, DB_NAME=db_path),
+        stdout=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + STREAM_TIMEOUT
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return proc, port
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    sys.exit(f"{name} did not start listening on port {port}")
+
+
+def session_cookie(web, uid):
+    value = web.app.session_interface.get_signing_serializer(web.app).dumps({"user_id": uid})
+    return f"{web.app.config['SESSION_COOKIE_NAME']}={value}"
+
+
+async def http_call(port, cookie, path, payload=None, keep_open=False):
+    """
+    (status, seconds to the whole body or, for a stream, to its snapshot event, open writer or None)
+    for a GET, or a POST of payload as JSON.
+    """
+    started = time.perf_counter()
+    # a snapshot event can be far past asyncio's default 64 KiB line limit
+    reader, writer = await asyncio.open_connection("127.0.0.1", port, limit=2**26)
+    head = "" if keep_open else "Connection: close\r\n"
+    body = b""
+    if payload is not None:
+        body = json.dumps(payload).encode()
+        head += f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+    method = "GET" if payload is None else "POST"
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: bench\r\nCookie: {cookie}\r\n{head}\r\n".encode() + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    if keep_open and status == 200:
+        await reader.readuntil(b"event: snapshot")
+        await reader.readuntil(b"\n\n")
+        return status, time.perf_counter() - started, writer
+    await reader.read()
+    writer.close()
+    return status, time.perf_counter() - started, None
+
+
+async def hold_streams(port, cookies, probe_cookie, probes):
+    opened = await asyncio.gather(*(
+        asyncio.wait_for(http_call(port, cookie, "/api/provider/requests/stream", keep_open=True), STREAM_TIMEOUT)
+        for cookie in cookies
+    ), return_exceptions=True)
+    try:
+        feed = [(await http_call(port, probe_cookie, "/api/provider/requests"))[1] for _ in range(probes)]
+    finally:
+        for result in opened:
+            if isinstance(result, tuple) and result[2] is not None:
+                result[2].close()
+    return opened, feed
+
+
+def run_streams(web, db_path, rng, count, probes):
+    conn = sqlite3.connect(db_path)
+    providers = [r[0] for r in conn.execute("SELECT id FROM users WHERE role='provider'")]
+    conn.close()
+    cookies = [session_cookie(web, rng.choice(providers)) for _ in range(count)]
+    probe_cookie = session_cookie(web, rng.choice(providers))
+
+    results = {}
+    print(f"\n{count:,} streams per server{'served':>9}{'503':>7}{'failed':>8}{'snap p95':>10}{'feed p50':>10}{'feed p95':>10}")
+    for name in STREAM_SERVERS:
+        proc, port = start_server(name, STREAM_SERVERS[name], db_path)
+        try:
+            opened, feed = asyncio.run(hold_streams(port, cookies, probe_cookie, probes))
+        finally:
+            proc.terminate()
+            proc.wait()
+        served = sorted(r[1] for r in opened if isinstance(r, tuple) and r[0] == 200)
+        rejected = sum(1 for r in opened if isinstance(r, tuple) and r[0] == 503)
+        feed.sort()
+        r = results[f"streams_{name}"] = {
+            "p50_ms": percentile(feed, 0.50) * 1e3,
+            "p95_ms": percentile(feed, 0.95) * 1e3,
+            "p99_ms": percentile(feed, 0.99) * 1e3,
+            "streams_served": len(served),
+            "streams_rejected": rejected,
+            "snapshot_p95_ms": percentile(served, 0.95) * 1e3 if served else None,
+        }
+        snapshot = f"{r['snapshot_p95_ms']:>10.1f}" if served else f"{'-':>10}"
+        print(
+            f"{name:<24}{len(served):>9,}{rejected:>7,}{count - len(served) - rejected:>8,}"
+            f"{snapshot}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}"
+        )
+    return results
+
+
+# =========================
+# Location updates from many clients, several gunicorn workers on one file
+# =========================
+LOAD_SERVER = [
+    "-m", "gunicorn", "--workers", "4", "--worker-class", "gthread", "--threads", "4",
+    "--bind", "127.0.0.1:{port}", "app:app",
+]
+
+
+async def post_pins(port, clients, calls, rng):
+    async def client(cookie, lat, lng):
+        done = []
+        for _ in range(calls):
+            pin = {"location_text": "Bench", "lat": lat + rng.gauss(0, 0.01), "lng": lng + rng.gauss(0, 0.01)}
+            status, seconds, _ = await http_call(port, cookie, "/api/receiver/location", pin)
+            done.append((status, seconds))
+        return done
+
+    started = time.perf_counter()
+    done = await asyncio.gather(*(client(*c) for c in clients))
+    return [call for calls in done for call in calls], time.perf_counter() - started
+
+
+def run_location_load(web, db_path, rng, count, calls):
+    conn = sqlite3.connect(db_path)
+    receivers = conn.execute("SELECT id, lat, lng FROM users WHERE role='receiver' LIMIT ?", (count,)).fetchall()
+    conn.close()
+    clients = [(session_cookie(web, uid), lat, lng) for uid, lat, lng in receivers]
+
+    proc, port = start_server("gunicorn", LOAD_SERVER, db_path)
+    try:
+        done, elapsed = asyncio.run(post_pins(port, clients, calls, rng))
+    finally:
+        proc.terminate()
+        proc.wait()
+    r = summarize([seconds for _, seconds in done])
+    r["calls_per_s"] = len(done) / elapsed
+    r["errors"] = sum(1 for status, _ in done if status != 200)
+
+    print(f"\n{len(clients):,} location clients{'calls/s':>9}{'errors':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    print(
+        f"{'location_load':<27}{r['calls_per_s']:>9.1f}{r['errors']:>8,}"
+        f"{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}{r['p99_ms']:>9.2f}"
+    )
+    return {"location_load": r}
+
+
+# =========================
+# Logins through the hash pool vs read latency
+# =========================
+LOGIN_PASSWORD = "bench-password"
+
+
+def run_logins(web, db_path, rng, clients, iterations, counter):
+    conn = sqlite3.connect(db_path)
+    receivers = conn.execute("SELECT id, email FROM users WHERE role='receiver' LIMIT ?", (clients,)).fetchall()
+    providers = [r[0] for r in conn.execute("SELECT id FROM users WHERE role='provider'")]
+    # a real hash with the app's parameters, so no login re-hashes
+    pw_hash = web.generate_password_hash(LOGIN_PASSWORD, web.PASSWORD_HASH_METHOD)
+    conn.executemany("UPDATE users SET password_hash=? WHERE id=?", [(pw_hash, uid) for uid, _ in receivers])
+    conn.commit()
+    conn.close()
+
+    def read():
+        client = client_as(web, rng.choice(providers))
+        return lambda: client.get("/api/provider/requests")
+
+    stop, statuses = threading.Event(), []
+
+    def log_in(email):
+        client, seen = web.app.test_client(), Counter()
+        while not stop.is_set():
+            resp = client.post("/receiver/login", data={"email": email, "password": LOGIN_PASSWORD})
+            seen[resp.status_code] += 1
+            if resp.status_code == 503:  # back off as asked, like a browser retrying
+                stop.wait(float(resp.headers["Retry-After"]))
+        statuses.append(seen)
+
+    idle = run(web, read, iterations, counter)
+    threads = [threading.Thread(target=log_in, args=(email,)) for _, email in receivers]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    try:
+        loaded = run(web, read, iterations, counter)
+    finally:
+        stop.set()
+        for t in threads:
+            t.join()
+    elapsed = time.perf_counter() - started
+    seen = sum(statuses, Counter())
+
+    r = {
+        "p50_ms": loaded["p50_ms"],
+        "p95_ms": loaded["p95_ms"],
+        "p99_ms": loaded["p99_ms"],
+        "idle_p95_ms": idle["p95_ms"],
+        "logins_per_s": seen[302] / elapsed,
+        "logins_busy": seen[503],
+    }
+    print(f"\n{len(receivers):,} login clients{'logins/s':>11}{'503':>7}{'read p50':>10}{'read p95':>10}{'idle p95':>10}")
+    print(
+        f"{'logins_read':<24}{r['logins_per_s']:>11.1f}{r['logins_busy']:>7,}"
+        f"{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['idle_p95_ms']:>10.2f}"
+    )
+    return {"logins_read": r}
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    rng = random.Random(args.seed)
+
+    db_path = args.keep or os.path.join(tempfile.mkdtemp(prefix="bench-"), "bench.db")
+    if os.path.exists(db_path):
+        sys.exit(f"{db_path} already exists")
+    os.environ["DB_NAME"] = db_path
+    os.environ.pop("DATABASE_URL", None)
+    os.environ.setdefault("LOCATION_USER_RATE", "0")
+    os.environ.setdefault("LOCATION_IP_RATE", "0")
+    import app as web  # migrates the empty database on import
+
+    t = time.perf_counter()
+    generate(db_path, args, rng, web)
+    print(
+        f"generated {args.providers:,} providers, {args.receivers:,} receivers, "
+        f"{args.requests:,} requests in {time.perf_counter() - t:.1f}s -> {db_path}"
+    )
+
+    if args.archive_days is not None:
+        t = time.perf_counter()
+        conn = web.storage.connect()
+        moved = web.archive_serviced(conn, args.archive_days)
+        web.storage.release(conn)
+        print(f"archived {moved:,} requests serviced over {args.archive_days} days ago in {time.perf_counter() - t:.1f}s")
+
+    counter = [0]
+    instrument(web, counter)
+
+    results = {}
+    print(f"\n{'scenario':<20}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'rows':>9}{'vm ops':>11}")
+    for name, make_call in scenarios(web, db_path, rng).items():
+        results[name] = run(web, make_call, args.iterations, counter)
+        print_row(name, results[name])
+    for size in args.coverage_sizes:
+        results[f"coverage_{size}"] = run_coverage(web, rng, size, args.iterations)
+        print_row(f"coverage_{size}", results[f"coverage_{size}"])
+
+    if args.location_clients:
+        results.update(run_location_load(web, db_path, rng, args.location_clients, args.iterations))
+
+    if args.logins:
+        results.update(run_logins(web, db_path, rng, args.logins, args.iterations, counter))
+
+    if args.streams:
+        results.update(run_streams(web, db_path, rng, args.streams, args.iterations))
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        regressed = [
+            name for name, r in results.items()
+            if name in baseline and r["p95_ms"] > baseline[name]["p95_ms"] * (1 + args.tolerance)
+        ]
+        for name in regressed:
+            print(f"REGRESSION {name}: p95 {baseline[name]['p95_ms']:.2f} -> {results[name]['p95_ms']:.2f} ms")
+        if regressed:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
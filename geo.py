@@ -0,0 +1,452 @@
+"""
+Distance helpers for radius matching.
+
+haversine_km() is the scalar reference. PointSet keeps many points in flat
+arrays (with cos(lat) precomputed) and measures one point against all of
+them per call. It uses NumPy when that is installed and otherwise falls back
+to a plain loop over array('d') buffers.
+
+Run `python geo.py` for a microbenchmark against the scalar version.
+"""
+from array import array
+import math
+
+try:
+    import numpy as np
+except ImportError:  # optional speed-up
+    np = None
+
+EARTH_RADIUS_KM = 6371.0
+DEG = math.pi / 180.0
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    R = EARTH_RADIUS_KM
+    p = DEG
+    dlat = (lat2 - lat1) * p
+    dlon = (lon2 - lon1) * p
+    a = (math.sin(dlat / 2) ** 2) + math.cos(lat1 * p) * math.cos(lat2 * p) * (math.sin(dlon / 2) ** 2)
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    return R * c
+
+
+def grid_cell(lat, lng, cell_deg):
+    """(row, col) of the cell_deg x cell_deg grid cell holding lat/lng."""
+    return math.floor(lat / cell_deg), math.floor(lng / cell_deg)
+
+
+def cell_bounds(cell, cell_deg):
+    """(min_lat, max_lat, min_lng, max_lng) of a grid_cell()."""
+    row, col = cell
+    return max(row * cell_deg, -90.0), min((row + 1) * cell_deg, 90.0), col * cell_deg, (col + 1) * cell_deg
+
+
+def bounding_box(lat, lng, radius_km):
+    """(min_lat, max_lat, min_lng, max_lng) enclosing the radius_km circle around lat/lng."""
+    d = radius_km / EARTH_RADIUS_KM
+    dlat = math.degrees(d)
+    min_lat, max_lat = lat - dlat, lat + dlat
+    if min_lat <= -90 or max_lat >= 90:
+        # circle covers a pole
+        return max(min_lat, -90.0), min(max_lat, 90.0), -180.0, 180.0
+
+    s = math.sin(d) / math.cos(math.radians(lat))
+    if s >= 1:
+        return min_lat, max_lat, -180.0, 180.0
+    dlng = math.degrees(math.asin(s))
+    min_lng, max_lng = lng - dlng, lng + dlng
+    if min_lng < -180 or max_lng > 180:
+        # crosses the antimeridian; keep it simple and span every longitude
+        return min_lat, max_lat, -180.0, 180.0
+    return min_lat, max_lat, min_lng, max_lng
+
+
+def _copy_column(column):
+    return column.copy() if np is not None and isinstance(column, np.ndarray) else array("d", column)
+
+
+class PointSet:
+    """
+    Lat/lng points (degrees) stored column-wise for batch distance queries.
+    Distances use the same formula as haversine_km(), so results match it.
+    """
+    columns = ("lats", "lngs", "cos_lats")
+
+    def __init__(self, lats, lngs):
+        if np is not None:
+            self.lats = np.asarray(lats, dtype=np.float64)
+            self.lngs = np.asarray(lngs, dtype=np.float64)
+            self.cos_lats = np.cos(self.lats * DEG)
+        else:
+            self.lats = array("d", lats)
+            self.lngs = array("d", lngs)
+            self.cos_lats = array("d", (math.cos(x * DEG) for x in self.lats))
+
+    def __len__(self):
+        return len(self.lats)
+
+    def copy(self):
+        """A copy that set()/append()/remove() can change without affecting this one."""
+        new = self.__class__.__new__(self.__class__)
+        new.__dict__.update(self.__dict__)
+        new.__dict__.update({name: _copy_column(getattr(self, name)) for name in self.columns})
+        return new
+
+    def set(self, i, lat, lng):
+        self.lats[i] = lat
+        self.lngs[i] = lng
+        self.cos_lats[i] = math.cos(lat * DEG)
+
+    def append(self, lat, lng):
+        if np is not None:
+            self.lats = np.append(self.lats, lat)
+            self.lngs = np.append(self.lngs, lng)
+            self.cos_lats = np.append(self.cos_lats, math.cos(lat * DEG))
+        else:
+            self.lats.append(lat)
+            self.lngs.append(lng)
+            self.cos_lats.append(math.cos(lat * DEG))
+
+    def remove(self, i):
+        """Swap-remove point i: the last point takes its index."""
+        last = len(self) - 1
+        # just the coordinates: a subclass' set() would move a half-copied point
+        PointSet.set(self, i, self.lats[last], self.lngs[last])
+        self.lats = self.lats[:last]
+        self.lngs = self.lngs[:last]
+        self.cos_lats = self.cos_lats[:last]
+
+    def distances_km(self, lat, lng):
+        """Distance from (lat, lng) to every point, in insertion order."""
+        cos_lat = math.cos(lat * DEG)
+
+        if np is not None:
+            sin_dlat = np.sin((self.lats - lat) * DEG / 2)
+            sin_dlon = np.sin((self.lngs - lng) * DEG / 2)
+            a = sin_dlat ** 2 + cos_lat * self.cos_lats * sin_dlon ** 2
+            return EARTH_RADIUS_KM * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+        sin, sqrt, atan2 = math.sin, math.sqrt, math.atan2
+        out = array("d", bytes(8 * len(self.lats)))
+        for i, (p_lat, p_lng, p_cos) in enumerate(zip(self.lats, self.lngs, self.cos_lats)):
+            a = sin((p_lat - lat) * DEG / 2) ** 2 + cos_lat * p_cos * sin((p_lng - lng) * DEG / 2) ** 2
+            out[i] = EARTH_RADIUS_KM * 2 * atan2(sqrt(a), sqrt(1 - a))
+        return out
+
+
+class CoverageGrid:
+    """
+    The points of a CoverageSet bucketed by grid_cell(): `reach` holds, per
+    cell, the points whose coverage box touches it, `at` the points inside it.
+    Kept in step with the set through the same set()/append()/remove(), by
+    index. Buckets are tuples that get replaced, never changed, so copy()
+    only copies the dicts.
+    """
+
+    def __init__(self, cell_deg, lats, lngs, radii):
+        self.cell_deg = cell_deg
+        self.reach, self.at = {}, {}
+        # per point (row, col, min_row, max_row, min_col, max_col), so removing
+        # it never depends on recomputing its box the same way; an (n, 6) int
+        # array with NumPy, else a list of tuples
+        self.spans = []
+        self._fill(lats, lngs, radii)
+
+    def copy(self):
+        new = CoverageGrid.__new__(CoverageGrid)
+        new.cell_deg = self.cell_deg
+        new.reach, new.at = dict(self.reach), dict(self.at)
+        new.spans = self.spans.copy()
+        return new
+
+    def span(self, lat, lng, radius_km):
+        c = self.cell_deg
+        min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, radius_km)
+        return (
+            math.floor(lat / c), math.floor(lng / c),
+            math.floor(min_lat / c), math.floor(max_lat / c), math.floor(min_lng / c), math.floor(max_lng / c),
+        )
+
+    def _fill(self, lats, lngs, radii):
+        """All points at once; append() one at a time would be quadratic in the bucket sizes."""
+        if np is not None:
+            self.spans = np.empty((0, 6), dtype=np.int64)
+            if len(lats):
+                self._fill_numpy(lats, lngs, radii)
+            return
+        self.spans = [self.span(*area) for area in zip(lats, lngs, radii)]
+        reach, at = {}, {}
+        for i, (row, col, min_row, max_row, min_col, max_col) in enumerate(self.spans):
+            at.setdefault((row, col), []).append(i)
+            for r in range(min_row, max_row + 1):
+                for x in range(min_col, max_col + 1):
+                    reach.setdefault((r, x), []).append(i)
+        self.reach = {cell: tuple(indices) for cell, indices in reach.items()}
+        self.at = {cell: tuple(indices) for cell, indices in at.items()}
+
+    def _fill_numpy(self, lats, lngs, radii):
+        spans = rows, cols, min_rows, max_rows, min_cols, max_cols = self._spans(lats, lngs, radii)
+        self.spans = np.stack(spans, axis=1)
+        points = np.arange(len(rows))
+        self.at = self._group(rows, cols, points)
+        # one (cell, point) pair per cell of each point's box
+        widths = max_cols - min_cols + 1
+        counts = (max_rows - min_rows + 1) * widths
+        owner = np.repeat(points, counts)
+        offset = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        self.reach = self._group(min_rows[owner] + offset // widths[owner], min_cols[owner] + offset % widths[owner], owner)
+
+    @staticmethod
+    def _group(rows, cols, points):
+        """{(row, col): (point, ...)} from parallel NumPy arrays with points ascending."""
+        # one int per cell; a stable sort keeps the points ascending within it
+        key = (rows - rows.min()) * (cols.max() - cols.min() + 1) + (cols - cols.min())
+        order = np.argsort(key, kind="stable")
+        key, rows, cols, points = key[order], rows[order], cols[order], points[order].tolist()
+        starts = np.flatnonzero(np.r_[True, key[1:] != key[:-1]])
+        ends = np.r_[starts[1:], len(points)]
+        return {
+            (row, col): tuple(points[a:b])
+            for row, col, a, b in zip(rows[starts].tolist(), cols[starts].tolist(), starts.tolist(), ends.tolist())
+        }
+
+    def _spans(self, lats, lngs, radii):
+        """span() for NumPy columns: bounding_box() worked out for every point at once."""
+        c = self.cell_deg
+        d = np.asarray(radii) / EARTH_RADIUS_KM
+        dlat = np.degrees(d)
+        min_lat, max_lat = lats - dlat, lats + dlat
+        with np.errstate(divide="ignore", invalid="ignore"):
+            s = np.sin(d) / np.cos(np.radians(lats))
+        dlng = np.degrees(np.arcsin(np.clip(s, 0.0, 1.0)))
+        min_lng, max_lng = lngs - dlng, lngs + dlng
+        # a pole, the antimeridian, or a circle wider than the parallel: every longitude
+        every = (min_lat <= -90) | (max_lat >= 90) | ~(s < 1) | (min_lng < -180) | (max_lng > 180)
+        min_lng[every], max_lng[every] = -180.0, 180.0
+        min_lat, max_lat = np.maximum(min_lat, -90.0), np.minimum(max_lat, 90.0)
+        return tuple(np.floor(x / c).astype(np.int64) for x in (lats, lngs, min_lat, max_lat, min_lng, max_lng))
+
+    def _insert(self, i, span):
+        row, col, min_row, max_row, min_col, max_col = (int(x) for x in span)
+        self.at[row, col] = self.at.get((row, col), ()) + (i,)
+        for cell in self.cells(min_row, max_row, min_col, max_col):
+            self.reach[cell] = self.reach.get(cell, ()) + (i,)
+
+    def _delete(self, i, span):
+        row, col, min_row, max_row, min_col, max_col = (int(x) for x in span)
+        for buckets, cells in ((self.at, [(row, col)]), (self.reach, self.cells(min_row, max_row, min_col, max_col))):
+            for cell in cells:
+                rest = tuple(j for j in buckets.get(cell, ()) if j != i)
+                if rest:
+                    buckets[cell] = rest
+                else:
+                    buckets.pop(cell, None)
+
+    @staticmethod
+    def cells(min_row, max_row, min_col, max_col):
+        return [(r, x) for r in range(min_row, max_row + 1) for x in range(min_col, max_col + 1)]
+
+    def set(self, i, lat, lng, radius_km):
+        self._delete(i, self.spans[i])
+        self.spans[i] = self.span(lat, lng, radius_km)
+        self._insert(i, self.spans[i])
+
+    def append(self, lat, lng, radius_km):
+        span = self.span(lat, lng, radius_km)
+        if isinstance(self.spans, list):
+            self.spans.append(span)
+        else:
+            self.spans = np.append(self.spans, [span], axis=0)
+        self._insert(len(self.spans) - 1, span)
+
+    def remove(self, i):
+        """Swap-remove point i, like PointSet.remove()."""
+        last = len(self.spans) - 1
+        self._delete(i, self.spans[i])
+        if i != last:
+            self._delete(last, self.spans[last])
+            self.spans[i] = self.spans[last]
+            self._insert(i, self.spans[i])
+        self.spans = self.spans[:last]
+
+    def reaching(self, min_lat, max_lat, min_lng, max_lng):
+        """Every point that may reach some location in the box (its coverage box touches it)."""
+        min_row, min_col = grid_cell(min_lat, min_lng, self.cell_deg)
+        max_row, max_col = grid_cell(max_lat, max_lng, self.cell_deg)
+        return {i for cell in self.cells(min_row, max_row, min_col, max_col) for i in self.reach.get(cell, ())}
+
+    def rings(self, lat, lng, max_cells):
+        """
+        (points in ring k of cells around lat/lng's cell, a lower bound in km on
+        the distance to any point outside rings 0..k) for k = 0, 1, ... Stops
+        before the rings would wrap around the antimeridian or cover more than
+        max_cells cells.
+        """
+        c = self.cell_deg
+        row, col = grid_cell(lat, lng, c)
+        cos_lat = math.cos(lat * DEG)
+        k = 0
+        while (col - k) * c >= -180 and (col + k + 1) * c <= 180 and (2 * k + 1) ** 2 <= max_cells:
+            if k == 0:
+                ring = [(row, col)]
+            else:
+                ring = [(r, x) for r in (row - k, row + k) for x in range(col - k, col + k + 1)]
+                ring += [(r, x) for r in range(row - k + 1, row + k) for x in (col - k, col + k)]
+            # outside the rings a point is that far north/south, or that far
+            # east/west, which is at least the distance to that meridian
+            gap_lat = min(lat - (row - k) * c, (row + k + 1) * c - lat)
+            gap_lng = min(lng - (col - k) * c, (col + k + 1) * c - lng, 90.0)
+            bound = EARTH_RADIUS_KM * min(gap_lat * DEG, math.asin(cos_lat * math.sin(gap_lng * DEG)))
+            yield [i for cell in ring for i in self.at.get(cell, ())], bound
+            k += 1
+
+
+class CoverageSet(PointSet):
+    """
+    PointSet where every point also has a coverage radius (km). With cell_deg
+    the points are also kept in a CoverageGrid, so candidates() only measures
+    the points around the box instead of all of them.
+    """
+    columns = PointSet.columns + ("radii",)
+
+    def __init__(self, lats, lngs, radii, cell_deg=0):
+        super().__init__(lats, lngs)
+        self.radii = np.asarray(radii, dtype=np.float64) if np is not None else array("d", radii)
+        self.grid = CoverageGrid(cell_deg, self.lats, self.lngs, self.radii) if cell_deg > 0 else None
+
+    def copy(self):
+        new = super().copy()
+        if self.grid is not None:
+            new.grid = self.grid.copy()
+        return new
+
+    def set(self, i, lat, lng, radius_km=None):
+        super().set(i, lat, lng)
+        if radius_km is not None:
+            self.radii[i] = radius_km
+        if self.grid is not None:
+            self.grid.set(i, lat, lng, float(self.radii[i]))
+
+    def append(self, lat, lng, radius_km):
+        super().append(lat, lng)
+        if np is not None:
+            self.radii = np.append(self.radii, radius_km)
+        else:
+            self.radii.append(radius_km)
+        if self.grid is not None:
+            self.grid.append(lat, lng, radius_km)
+
+    def remove(self, i):
+        last = len(self) - 1
+        self.radii[i] = self.radii[last]
+        super().remove(i)
+        self.radii = self.radii[:last]
+        if self.grid is not None:
+            self.grid.remove(i)
+
+    def covering(self, lat, lng):
+        """
+        ([(index, distance_km), ...] for points whose radius reaches (lat, lng),
+         distance_km to the nearest point overall or None when empty)
+        """
+        if len(self) == 0:
+            return [], None
+        d = self.distances_km(lat, lng)
+
+        if np is not None:
+            hits = np.flatnonzero(d <= self.radii)
+            return [(int(i), float(d[i])) for i in hits], float(d.min())
+
+        hits = [(i, x) for i, (x, r) in enumerate(zip(d, self.radii)) if x <= r]
+        return hits, min(d)
+
+    def candidates(self, min_lat, max_lat, min_lng, max_lng):
+        """
+        Indices of the points that can reach, or be the nearest point to, some
+        location in the box. For any location in it, covering() on
+        subset(candidates) finds the same points as on the whole set.
+        """
+        if len(self) == 0:
+            return []
+        lat, lng = (min_lat + max_lat) / 2, (min_lng + max_lng) / 2
+        # no location in the box is further than `half` from its centre
+        half = max(haversine_km(lat, lng, a, b) for a in (min_lat, max_lat) for b in (min_lng, max_lng)) + 1e-6
+        if self.grid is not None:
+            near = self._near_grid(lat, lng, 2 * half)
+            if near is not None:
+                # the grid's cells are coarse; measure what it found like below
+                reach = sorted(self.grid.reaching(min_lat, max_lat, min_lng, max_lng))
+                sub = self.subset(reach)
+                d = sub.distances_km(lat, lng)
+                if np is not None:
+                    reach = np.asarray(reach, dtype=np.intp)[d - half <= sub.radii]
+                else:
+                    reach = [i for i, x, r in zip(reach, d, sub.radii) if x - half <= r]
+                return sorted(set(near).union(int(i) for i in reach))
+        d = self.distances_km(lat, lng)
+
+        if np is not None:
+            return np.flatnonzero((d - half <= self.radii) | (d <= d.min() + 2 * half))
+
+        nearest = min(d)
+        return [i for i, (x, r) in enumerate(zip(d, self.radii)) if x - half <= r or x <= nearest + 2 * half]
+
+    def _near_grid(self, lat, lng, slack_km):
+        """
+        Indices of the points at most slack_km further from lat/lng than the
+        nearest one, from the grid; None where the grid search gives up and
+        every point has to be measured.
+        """
+        found, dists, best = [], [], math.inf
+        for idx, bound in self.grid.rings(lat, lng, max(len(self), 64)):
+            if idx:
+                found += idx
+                dists += [float(x) for x in self.subset(idx).distances_km(lat, lng)]
+                best = min(dists)
+            if bound > best + slack_km:
+                return [i for i, x in zip(found, dists) if x <= best + slack_km]
+        return None
+
+    def subset(self, indices):
+        """A new CoverageSet holding just these points, in this order (without a grid)."""
+        sub = CoverageSet.__new__(CoverageSet)
+        sub.grid = None
+        columns = (self.lats, self.lngs, self.cos_lats, self.radii)
+        if np is not None:
+            indices = np.asarray(indices, dtype=np.intp)
+            sub.lats, sub.lngs, sub.cos_lats, sub.radii = (c[indices] for c in columns)
+        else:
+            sub.lats, sub.lngs, sub.cos_lats, sub.radii = (array("d", (c[i] for i in indices)) for c in columns)
+        return sub
+
+
+def _benchmark():
+    import random
+    import time
+
+    random.seed(7)
+    lat, lng = -31.9523, 115.8613
+    print(f"backend: {'numpy' if np is not None else 'array'}")
+
+    for n in (1_000, 100_000, 1_000_000):
+        lats = [random.uniform(-60, 60) for _ in range(n)]
+        lngs = [random.uniform(-180, 180) for _ in range(n)]
+
+        t = time.perf_counter()
+        scalar = [haversine_km(lat, lng, a, b) for a, b in zip(lats, lngs)]
+        t_scalar = time.perf_counter() - t
+
+        points = PointSet(lats, lngs)
+        t = time.perf_counter()
+        batch = points.distances_km(lat, lng)
+        t_batch = time.perf_counter() - t
+
+        max_err = max(abs(x - y) for x, y in zip(scalar, batch))
+        print(
+            f"n={n:>9,}  scalar {t_scalar * 1e3:9.1f} ms  batch {t_batch * 1e3:8.1f} ms  "
+            f"x{t_scalar / t_batch:5.1f}  max |diff| {max_err:.2e} km"
+        )
+
+
+if __name__ == "__main__":
+    _benchmark()
@@ -0,0 +1,119 @@
+"""
+Minimal in-process metrics rendered in the Prometheus text format.
+
+Every process keeps its own numbers, so under gunicorn each worker answers
+/metrics for itself; scrape the workers individually or sum them in
+Prometheus.
+
+app.py always imports this module and registers its metrics, and some
+counters (rejected requests) are incremented on every run: a dict update
+under a lock. METRICS_ENABLED only switches on the per-request timing
+(latency histograms, Server-Timing, timed SQLite connections) and GET /metrics.
+"""
+import bisect
+import threading
+
+# seconds; roughly Prometheus' defaults with more resolution below 10 ms
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=""):
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(x):
+    return repr(float(x)) if isinstance(x, float) else str(x)
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for labelvalues, value in items:
+            yield f"{self.name}{_labels(self.labelnames, labelvalues)} {_number(value)}"
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labelvalues -> [per-bucket counts (+Inf last), sum]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    def samples(self):
+        with self._lock:
+            items = [(k, list(counts), total) for k, (counts, total) in self._series.items()]
+        for labelvalues, counts, total in items:
+            running = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                running += count
+                le = 'le="+Inf"' if bound == "+Inf" else f'le="{bound}"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, labelvalues, le)} {running}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labelvalues)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.labelnames, labelvalues)} {running}"
+
+
+class Callback:
+    """A value read at scrape time, e.g. cache statistics kept elsewhere."""
+
+    def __init__(self, name, help, type, fn):
+        self.name, self.help, self.type, self.fn = name, help, type, fn
+
+    def samples(self):
+        yield f"{self.name} {_number(self.fn())}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self.add(Counter(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.add(Histogram(name, help, labelnames, buckets))
+
+    def callback(self, name, help, type, fn):
+        return self.add(Callback(name, help, type, fn))
+
+    def render(self):
+        lines = []
+        for m in self._metrics:
+            lines.append(f"# HELP {m.name} {m.help}")
+            lines.append(f"# TYPE {m.name} {m.type}")
+            lines.extend(m.samples())
+        return "\n".join(lines) + "\n"
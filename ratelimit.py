@@ -0,0 +1,113 @@
+"""
+Token-bucket rate limiting.
+
+Every key (a user, a client IP, ...) has a bucket of up to `burst` tokens
+that refills at `rate` tokens per second. take() names one or more
+(key, rate, burst) limits and takes a token from each of them, or from none
+when any bucket is empty.
+
+MemoryBuckets live in this process, so under gunicorn every worker limits
+on its own. SQLiteBuckets keep the same state in a small SQLite file that
+all workers on a host share.
+"""
+from collections import OrderedDict
+import logging
+import sqlite3
+import threading
+import time
+
+# a bucket this long untouched is full again, as good as never seen
+IDLE_SECONDS = 3600
+
+
+def _take(state, limits, now):
+    """
+    ({key: (tokens, updated)} to store, seconds to wait) for one take() against
+    `state`, {key: (tokens, updated)} of the buckets seen so far.
+    """
+    levels = {}
+    wait = 0.0
+    for key, rate, burst in limits:
+        tokens, updated = state.get(key, (burst, now))
+        tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+        levels[key] = tokens
+        if tokens < 1:
+            wait = max(wait, (1 - tokens) / rate)
+    taken = 0 if wait else 1
+    return {key: (tokens - taken, now) for key, tokens in levels.items()}, wait
+
+
+class MemoryBuckets:
+    def __init__(self, max_keys=100_000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, limits):
+        """0 when a token was taken from every (key, rate, burst), else seconds until one can be."""
+        now = time.time()
+        with self._lock:
+            updates, wait = _take(self._buckets, limits, now)
+            for key, bucket in updates.items():
+                self._buckets[key] = bucket
+                self._buckets.move_to_end(key)
+            # the least recently used buckets have had the longest to refill
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+class SQLiteBuckets:
+    def __init__(self, path, timeout=1.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._takes = 0
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # losing the last few updates in a crash only refills some buckets early
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS buckets (
+                    key TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    updated REAL NOT NULL
+                ) WITHOUT ROWID
+            """)
+            self._local.conn = conn
+        return conn
+
+    def take(self, limits):
+        """As MemoryBuckets.take(). A store that stays locked lets the call through."""
+        try:
+            conn = self._connect()
+            now = time.time()
+            keys = [key for key, rate, burst in limits]
+            # the read and the write in one write transaction, so workers never
+            # both spend the same token
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = conn.execute(
+                    f"SELECT key, tokens, updated FROM buckets WHERE key IN ({','.join('?' * len(keys))})", keys
+                ).fetchall()
+                updates, wait = _take({key: (tokens, updated) for key, tokens, updated in rows}, limits, now)
+                conn.executemany(
+                    "INSERT INTO buckets (key, tokens, updated) VALUES (?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET tokens=excluded.tokens, updated=excluded.updated",
+                    [(key, tokens, updated) for key, (tokens, updated) in updates.items()],
+                )
+                self._takes += 1
+                if self._takes % 1000 == 0:
+                    conn.execute("DELETE FROM buckets WHERE updated < ?", (now - IDLE_SECONDS,))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.OperationalError:
+            logging.getLogger(__name__).warning("rate limit store %s unavailable, not limiting", self.path, exc_info=True)
+            return 0.0
+        return wait
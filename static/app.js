@@ -72,6 +72,8 @@ function renderItem(r) {
 
 function wireServiceButtons(fetchFeedFn) {
   document.querySelectorAll("[data-service]").forEach(btn => {
+    if (btn.dataset.wired) return;
+    btn.dataset.wired = "1";
     btn.addEventListener("click", async () => {
       const id = btn.getAttribute("data-service");
       btn.disabled = true;
@@ -107,13 +109,50 @@ function wireServiceButtons(fetchFeedFn) {
   });
 }
 
+// only the columns renderItem() uses
+const FEED_FIELDS = "id,title,category,details,status,created_at";
+
+async function fetchFeedPage(afterId) {
+  const params = new URLSearchParams({ fields: FEED_FIELDS });
+  if (afterId) params.set("after_id", afterId);
+
+  const res = await fetch(`/api/requests?${params}`, { credentials: "same-origin" });
+  const data = await res.json().catch(() => null);
+  return { res, data, nextCursor: res.headers.get("X-Next-Cursor") };
+}
+
+function renderLoadMore(nextCursor) {
+  document.getElementById("feedMore")?.remove();
+  if (!nextCursor) return;
+
+  feedList.insertAdjacentHTML(
+    "beforeend",
+    `<div id="feedMore" style="margin-top:10px;"><button class="btn" type="button">Load more</button></div>`
+  );
+  const btn = document.querySelector("#feedMore button");
+  btn.addEventListener("click", async () => {
+    btn.disabled = true;
+    btn.textContent = "Loading…";
+    try {
+      const { res, data, nextCursor: next } = await fetchFeedPage(nextCursor);
+      if (!res.ok || !Array.isArray(data)) throw new Error();
+      document.getElementById("feedMore")?.remove();
+      feedList.insertAdjacentHTML("beforeend", data.map(renderItem).join(""));
+      wireServiceButtons(fetchFeed);
+      renderLoadMore(next);
+    } catch (e) {
+      btn.disabled = false;
+      btn.textContent = "Load more";
+    }
+  });
+}
+
 async function fetchFeed() {
   if (!feedList) return;
 
   feedList.innerHTML = `<div class="meta">Loading…</div>`;
   try {
-    const res = await fetch("/api/requests", { credentials: "same-origin" });
-    const data = await res.json().catch(() => null);
+    const { res, data, nextCursor } = await fetchFeedPage(null);
 
     if (!res.ok) {
       const err = (data && data.error) ? data.error : `Failed to load (${res.status})`;
@@ -128,6 +167,7 @@ async function fetchFeed() {
 
     feedList.innerHTML = data.map(renderItem).join("");
     wireServiceButtons(fetchFeed);
+    renderLoadMore(nextCursor);
   } catch (e) {
     feedList.innerHTML = `<div class="meta">Failed to load feed.</div>`;
   }
@@ -155,6 +195,12 @@ if (form && msg) {
       return;
     }
 
+    // requests are placed at the stored pin, not the one on the map
+    if (window.locationUnsaved && window.locationUnsaved()) {
+      msg.textContent = "Your location changes are not saved yet. Save your location first (Edit location).";
+      return;
+    }
+
     msg.textContent = "Submitting…";
 
     const hourlyWageVisible = document.getElementById("hourlyWage")?.value;
@@ -0,0 +1,1716 @@
+"""
+Database access for app.py.
+
+Storage lists everything the app asks of its database. SQLiteStorage is the
+original single-file setup. PostgresStorage (DATABASE_URL=postgresql://...)
+lets several app hosts share one database; it needs PostGIS and
+
+    pip install "psycopg[binary]" psycopg-pool
+
+Methods take a connection from connect() (give it back with release()) and
+commit their own writes. Rows come back as mappings: row["col"] and dict(row)
+work for both backends.
+"""
+from abc import ABC, abstractmethod
+from contextlib import nullcontext
+from datetime import datetime
+import heapq
+from itertools import islice
+import sqlite3
+
+from geo import EARTH_RADIUS_KM, PointSet, bounding_box
+
+try:
+    import psycopg
+    from psycopg.rows import dict_row
+    from psycopg_pool import ConnectionPool
+except ImportError:  # only needed for PostgresStorage
+    psycopg = None
+
+# stored columns of requests (and requests_archive), in table order
+REQUEST_COLUMNS = (
+    "id", "receiver_user_id", "title", "category", "details", "status", "created_at",
+    "location_text", "lat", "lng", "scheduled_date", "scheduled_time", "duration_min",
+    "hourly_wage", "serviced_at", "serviced_by_user_id", "version", "claimed_by_user_id",
+    "claimed_at",
+)
+
+USER_COLUMNS = "id, role, name, email, location_text, lat, lng, service_radius_km"
+
+# bulk import/export (`flask --app app data ...`); ids are never imported,
+# requests name their receiver/servicer by email so files move between databases
+USER_EXPORT_COLUMNS = (
+    "id", "role", "name", "email", "password_hash", "created_at",
+    "location_text", "lat", "lng", "service_radius_km",
+)
+USER_IMPORT_COLUMNS = USER_EXPORT_COLUMNS[1:]
+REQUEST_EXPORT_COLUMNS = REQUEST_COLUMNS + ("receiver_email", "serviced_by_email", "claimed_by_email")
+REQUEST_IMPORT_COLUMNS = REQUEST_COLUMNS[1:]
+
+# rows per fetch while streaming a feed
+FEED_BATCH_ROWS = 500
+
+# provider feed orderings evaluated in SQL ({p}: column prefix); "distance"
+# is ranked on the computed distances instead
+FEED_ORDER = {
+    "newest": "{p}id DESC",
+    "wage": "{p}hourly_wage DESC NULLS LAST, {p}id DESC",
+    "soonest": "{p}scheduled_date NULLS LAST, {p}scheduled_time NULLS LAST, {p}id DESC",
+}
+FEED_SORTS = (*FEED_ORDER, "distance")
+
+# request search: bm25 weight of title, category and details
+SEARCH_WEIGHTS = (10.0, 5.0, 1.0)
+
+
+class Storage(ABC):
+    """
+    What app.py needs from a database. Feeds are generators of
+    (row, distance_km) pairs, newest request first, so they can be streamed.
+    """
+
+    # what columns=None selects in list_requests()
+    ALL_REQUEST_COLUMNS = "r.*, u.name AS receiver_name"
+
+    def __init__(self, max_radius_km, timed=lambda stage: nullcontext()):
+        self.max_radius_km = max_radius_km
+        # timed(stage) is a context manager that attributes time to a request stage
+        self.timed = timed
+
+    def usable_radius(self, radius_km):
+        return radius_km is not None and 0 < radius_km <= self.max_radius_km
+
+    def within(self, rows, lat, lng, radius_km):
+        """(row, distance_km) for the rows within radius_km of lat/lng, in order."""
+        with self.timed("distance"):
+            rows = [r for r in rows if r["lat"] is not None and r["lng"] is not None]
+            points = PointSet([float(r["lat"]) for r in rows], [float(r["lng"]) for r in rows])
+            distances = points.distances_km(float(lat), float(lng))
+        return [(row, float(d)) for row, d in zip(rows, distances) if d <= float(radius_km)]
+
+    # ---- connections + schema ----
+    @abstractmethod
+    def connect(self):
+        ...
+
+    @abstractmethod
+    def release(self, conn):
+        ...
+
+    @abstractmethod
+    def schema_version(self, conn):
+        ...
+
+    @abstractmethod
+    def migrate(self):
+        """Bring the schema up to date. Cheap when there is nothing to do."""
+
+    # ---- users ----
+    @abstractmethod
+    def get_user(self, conn, uid):
+        ...
+
+    @abstractmethod
+    def find_user_by_email(self, conn, email):
+        ...
+
+    @abstractmethod
+    def create_user(self, conn, role, name, email, pw_hash, created_at):
+        """Returns (new id, providers version if a provider was added else None)."""
+
+    @abstractmethod
+    def set_password_hash(self, conn, uid, pw_hash):
+        ...
+
+    @abstractmethod
+    def save_locations(self, conn, updates):
+        """
+        Apply {user_id: (role, name, fields)} in one transaction, including the
+        provider areas and matches. Returns the new providers version, or None
+        when no provider changed.
+        """
+
+    @abstractmethod
+    def read_counter(self, conn, name):
+        ...
+
+    @abstractmethod
+    def load_providers(self, conn):
+        """(providers version, provider count, rows with a pin + radius set)"""
+
+    @abstractmethod
+    def provider_pins(self, conn):
+        """id, lat, lng, service_radius_km of every provider."""
+
+    # ---- requests ----
+    @abstractmethod
+    def create_request(self, conn, values):
+        """Insert an Open request from {column: value}, match it, log it. Returns its id."""
+
+    @abstractmethod
+    def get_request(self, conn, req_id):
+        """The request row, looked up in the archive too; None if unknown."""
+
+    @abstractmethod
+    def transition_request(self, conn, req_id, from_status, version, to_status, changes, event):
+        """
+        Move a request from from_status to to_status with one conditional UPDATE
+        that checks and bumps its version, also setting {column: value} changes,
+        and log `event`. A request leaving Open loses its matches. Returns False,
+        changing nothing, when the request is no longer at that status + version.
+        """
+
+    @abstractmethod
+    def claimed_requests(self, conn, provider_id):
+        """The provider's Claimed requests, newest claim first."""
+
+    @abstractmethod
+    def list_requests(self, conn, fields, receiver_id, after_id, limit):
+        """
+        Up to `limit` rows, newest first, from requests + requests_archive.
+        fields: column names (REQUEST_COLUMNS or "receiver_name"), None for all.
+        """
+
+    @abstractmethod
+    def provider_feed(self, conn, lat, lng, radius_km, include_history=False, filters=None, sort="newest", limit=None):
+        """
+        Requests within radius_km of lat/lng: Open ones, or all of them for history.
+        filters: {"categories": [...], "date_from", "date_to", "min_wage", "max_km"},
+        any of them; sort: one of FEED_SORTS; limit: stop after that many.
+        """
+
+    @abstractmethod
+    def matched_feed(self, conn, provider_id, filters=None, sort="newest", limit=None):
+        """The provider's Open requests from request_matches; arguments as provider_feed()."""
+
+    @abstractmethod
+    def search_feed(self, conn, lat, lng, radius_km, terms, filters=None, limit=None):
+        """
+        Open requests within radius_km of lat/lng whose title, category or details
+        contain every word in `terms` (the last one as a prefix), best match first.
+        filters and limit as provider_feed().
+        """
+
+    @abstractmethod
+    def requests_by_ids(self, conn, ids):
+        ...
+
+    # ---- change log ----
+    @abstractmethod
+    def latest_event_seq(self, conn):
+        ...
+
+    @abstractmethod
+    def events_after(self, conn, seq):
+        """(seq, request_id, kind) rows after seq, oldest first."""
+
+    # ---- maintenance ----
+    @abstractmethod
+    def stored_matches(self, conn, provider_id):
+        """{request_id: distance_km} as stored in request_matches."""
+
+    @abstractmethod
+    def rebuild_matches(self, conn, provider_id, lat, lng, radius_km):
+        """Recompute and commit one provider's matches."""
+
+    @abstractmethod
+    def archive_serviced(self, conn, cutoff, batch_size):
+        """Move requests serviced before `cutoff` to requests_archive. Returns how many moved."""
+
+    # ---- bulk import/export ----
+    @abstractmethod
+    def import_users(self, conn, rows):
+        """
+        Insert {USER_IMPORT_COLUMNS: value} rows in one transaction, skipping
+        emails that already exist, and index the new providers' service areas.
+        Returns (rows inserted, providers version or None).
+        """
+
+    @abstractmethod
+    def import_requests(self, conn, rows):
+        """
+        Insert {REQUEST_IMPORT_COLUMNS: value} rows in one transaction; Open ones
+        are matched and logged like create_request(), the others logged as
+        "imported". Returns rows inserted.
+        """
+
+    @abstractmethod
+    def user_ids_by_email(self, conn, emails):
+        ...
+
+    @abstractmethod
+    def export_users(self, conn):
+        """Every user with USER_EXPORT_COLUMNS, by id."""
+
+    @abstractmethod
+    def export_requests(self, conn):
+        """Every request (archived too) with REQUEST_EXPORT_COLUMNS, by id."""
+
+    @abstractmethod
+    def param(self, name):
+        ...
+
+    def filter_sql(self, filters):
+        """WHERE terms (on requests r) and named parameters for the feed filters."""
+        where, params = [], {}
+        categories = filters.get("categories")
+        if categories:
+            marks = []
+            for i, c in enumerate(categories):
+                params[f"category{i}"] = c
+                marks.append(self.param(f"category{i}"))
+            where.append(f"r.category IN ({', '.join(marks)})")
+        for key, term in (
+            ("date_from", "r.scheduled_date >= {}"),
+            ("date_to", "r.scheduled_date <= {}"),
+            ("min_wage", "r.hourly_wage >= {}"),
+        ):
+            if filters.get(key) is not None:
+                params[key] = filters[key]
+                where.append(term.format(self.param(key)))
+        return where, params
+
+    def columns_sql(self, fields):
+        if fields is None:
+            return self.ALL_REQUEST_COLUMNS
+        return ", ".join("u.name AS receiver_name" if f == "receiver_name" else f"r.{f}" for f in fields)
+
+
+def to_float(x):
+    try:
+        return float(x)
+    except (TypeError, ValueError):
+        return None
+
+
+def batched(iterable, size):
+    it = iter(iterable)
+    while batch := list(islice(it, size)):
+        yield batch
+
+
+# legacy 'Resolved' rows; created_at is the nearest known time, and lets
+# archive_serviced() move them
+_RESOLVED_TO_SERVICED = """
+    UPDATE {table}
+    SET status = 'Serviced', serviced_at = COALESCE(serviced_at, created_at)
+    WHERE status = 'Resolved'
+"""
+
+
+# feed filters (filter_sql) and the wage/soonest orders, per status like the feeds
+_FEED_FILTER_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_requests_status_category ON requests(status, category)",
+    "CREATE INDEX IF NOT EXISTS idx_requests_status_scheduled ON requests(status, scheduled_date, scheduled_time)",
+    "CREATE INDEX IF NOT EXISTS idx_requests_status_wage ON requests(status, hourly_wage)",
+)
+
+
+def _import_event(status):
+    return "open" if status == "Open" else "imported"
+
+
+def _rank(hits, sort, limit):
+    """(row, distance_km) pairs, already in SQL order, in their final order and length."""
+    if sort == "distance":
+        key = lambda hit: (hit[1], hit[0]["id"])
+        # top-K: a heap of `limit` entries instead of sorting every hit
+        return iter(heapq.nsmallest(limit, hits, key=key) if limit else sorted(hits, key=key))
+    return islice(hits, limit)
+
+
+def _iter_rows(cur, size=FEED_BATCH_ROWS):
+    while True:
+        rows = cur.fetchmany(size)
+        if not rows:
+            return
+        yield from rows
+
+
+# =========================
+# SQLite
+# - one file, WAL mode, one writer at a time
+# - schema migrations are numbered by PRAGMA user_version
+# =========================
+class SQLiteStorage(Storage):
+    def __init__(self, path, busy_timeout_ms, cache_size_kb, mmap_size,
+                 factory=sqlite3.Connection, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cache_size_kb = cache_size_kb
+        self.mmap_size = mmap_size
+        self.factory = factory
+        self.migrations = [
+            self.migrate_base_schema,
+            self.migrate_feed_indexes,
+            self.migrate_provider_areas,
+            self.migrate_counters,
+            self.migrate_request_events,
+            self.migrate_request_matches,
+            self.migrate_requests_archive,
+            self.migrate_match_distance_index,
+            self.migrate_request_search,
+            self.migrate_request_claims,
+            self.migrate_resolved_status,
+            self.migrate_feed_filter_indexes,
+        ]
+
+    def connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout_ms / 1000,
+            factory=self.factory,
+            # a streamed response can be iterated on another thread than the view
+            # ran on (asgi.py); a connection is still only used by one at a time
+            check_same_thread=False,
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={self.busy_timeout_ms}")
+        conn.execute(f"PRAGMA cache_size=-{self.cache_size_kb}")
+        conn.execute(f"PRAGMA mmap_size={self.mmap_size}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    def release(self, conn):
+        conn.close()
+
+    # ---- schema migrations ----
+    # applied in order, each in its own transaction; PRAGMA user_version
+    # records how many have run
+    def migrate_base_schema(self, cur):
+        # Databases created before migrations existed are at user_version 0 but
+        # may already have some of these columns, so this one stays defensive.
+
+        # ---- USERS TABLE ----
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                role TEXT NOT NULL CHECK(role IN ('receiver','provider')),
+                name TEXT NOT NULL,
+                email TEXT NOT NULL UNIQUE,
+                password_hash TEXT NOT NULL,
+                created_at TEXT NOT NULL
+            )
+        """)
+
+        cols = {row["name"] for row in cur.execute("PRAGMA table_info(users)").fetchall()}
+
+        if "location_text" not in cols:
+            cur.execute("ALTER TABLE users ADD COLUMN location_text TEXT")
+        if "lat" not in cols:
+            cur.execute("ALTER TABLE users ADD COLUMN lat REAL")
+        if "lng" not in cols:
+            cur.execute("ALTER TABLE users ADD COLUMN lng REAL")
+        if "service_radius_km" not in cols:
+            cur.execute("ALTER TABLE users ADD COLUMN service_radius_km REAL")
+
+        # ---- REQUESTS TABLE ----
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS requests (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                receiver_user_id INTEGER NOT NULL,
+                title TEXT NOT NULL,
+                category TEXT NOT NULL,
+                details TEXT,
+                status TEXT NOT NULL DEFAULT 'Open',
+                created_at TEXT NOT NULL,
+                FOREIGN KEY(receiver_user_id) REFERENCES users(id)
+            )
+        """)
+
+        req_cols = {row["name"] for row in cur.execute("PRAGMA table_info(requests)").fetchall()}
+
+        if "location_text" not in req_cols:
+            cur.execute("ALTER TABLE requests ADD COLUMN location_text TEXT")
+        if "lat" not in req_cols:
+            cur.execute("ALTER TABLE requests ADD COLUMN lat REAL")
+        if "lng" not in req_cols:
+            cur.execute("ALTER TABLE requests ADD COLUMN lng REAL")
+
+        # schedule + wage fields
+        if "scheduled_date" not in req_cols:
+            cur.execute("ALTER TABLE requests ADD COLUMN scheduled_date TEXT")
+        if "scheduled_time" not in req_cols:
+            cur.execute("ALTER TABLE requests ADD COLUMN scheduled_time TEXT")
+        if "duration_min" not in req_cols:
+            cur.execute("ALTER TABLE requests ADD COLUMN duration_min INTEGER")
+        if "hourly_wage" not in req_cols:
+            cur.execute("ALTER TABLE requests ADD COLUMN hourly_wage REAL")
+
+        # serviced tracking
+        if "serviced_at" not in req_cols:
+            cur.execute("ALTER TABLE requests ADD COLUMN serviced_at TEXT")
+        if "serviced_by_user_id" not in req_cols:
+            cur.execute("ALTER TABLE requests ADD COLUMN serviced_by_user_id INTEGER")
+
+    def migrate_feed_indexes(self, cur):
+        # receiver history: WHERE receiver_user_id=? ORDER BY id DESC
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_requests_receiver_id ON requests(receiver_user_id, id)")
+        # provider list: WHERE status=? ORDER BY id DESC
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_requests_status_id ON requests(status, id)")
+        # provider feed: status filter + radius bounding box
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_requests_status_lat_lng ON requests(status, lat, lng)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_users_role ON users(role)")
+
+    def migrate_provider_areas(self, cur):
+        # one bounding box per provider, expanded by service_radius_km
+        cur.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS provider_areas USING rtree(
+                id, min_lat, max_lat, min_lng, max_lng
+            )
+        """)
+        cur.execute("DELETE FROM provider_areas")
+        for p in self.provider_pins(cur):
+            self.sync_provider_area(cur, p["id"], p["lat"], p["lng"], p["service_radius_km"])
+
+    def migrate_counters(self, cur):
+        # bumped on every write other workers need to notice
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS counters (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            )
+        """)
+        cur.execute("INSERT OR IGNORE INTO counters (name, value) VALUES ('providers', 0)")
+
+    def migrate_request_events(self, cur):
+        # append-only change log; the provider push feed tails it
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS request_events (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                request_id INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                created_at TEXT NOT NULL
+            )
+        """)
+
+    def migrate_request_matches(self, cur):
+        # open request -> every provider whose service area contains it
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS request_matches (
+                provider_id INTEGER NOT NULL,
+                request_id INTEGER NOT NULL,
+                distance_km REAL NOT NULL,
+                PRIMARY KEY (provider_id, request_id)
+            ) WITHOUT ROWID
+        """)
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_request_matches_request ON request_matches(request_id)")
+        cur.execute("DELETE FROM request_matches")
+        for p in self.provider_pins(cur):
+            self.sync_provider_matches(cur, p["id"], p["lat"], p["lng"], p["service_radius_km"])
+
+    def migrate_requests_archive(self, cur):
+        # same columns as requests; ids are kept (requests ids are never reused)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS requests_archive (
+                id INTEGER PRIMARY KEY,
+                receiver_user_id INTEGER NOT NULL,
+                title TEXT NOT NULL,
+                category TEXT NOT NULL,
+                details TEXT,
+                status TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                location_text TEXT,
+                lat REAL,
+                lng REAL,
+                scheduled_date TEXT,
+                scheduled_time TEXT,
+                duration_min INTEGER,
+                hourly_wage REAL,
+                serviced_at TEXT,
+                serviced_by_user_id INTEGER
+            )
+        """)
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_requests_archive_receiver_id ON requests_archive(receiver_user_id, id)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_requests_archive_lat_lng ON requests_archive(lat, lng)")
+        # archive-requests looks for old serviced rows
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_requests_status_serviced_at ON requests(status, serviced_at)")
+
+    def migrate_match_distance_index(self, cur):
+        # provider feed sorted by distance: ORDER BY distance_km LIMIT k per provider
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_request_matches_distance ON request_matches(provider_id, distance_km)")
+
+    def migrate_request_search(self, cur):
+        # full-text index over Open requests only: search never wants the rest,
+        # so it stays the size of the open backlog however long history gets
+        # (and must never get FTS5's 'rebuild', which would index every row)
+        cur.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS requests_fts USING fts5(
+                title, category, details,
+                content='requests', content_rowid='id',
+                tokenize='porter unicode61'
+            )
+        """)
+        cur.execute("""
+            CREATE TRIGGER IF NOT EXISTS requests_fts_insert AFTER INSERT ON requests
+            WHEN new.status = 'Open'
+            BEGIN
+                INSERT INTO requests_fts (rowid, title, category, details)
+                VALUES (new.id, new.title, new.category, new.details);
+            END
+        """)
+        cur.execute("""
+            CREATE TRIGGER IF NOT EXISTS requests_fts_delete AFTER DELETE ON requests
+            WHEN old.status = 'Open'
+            BEGIN
+                INSERT INTO requests_fts (requests_fts, rowid, title, category, details)
+                VALUES ('delete', old.id, old.title, old.category, old.details);
+            END
+        """)
+        cur.execute("""
+            CREATE TRIGGER IF NOT EXISTS requests_fts_update
+            AFTER UPDATE OF title, category, details, status ON requests
+            BEGIN
+                INSERT INTO requests_fts (requests_fts, rowid, title, category, details)
+                SELECT 'delete', old.id, old.title, old.category, old.details WHERE old.status = 'Open';
+                INSERT INTO requests_fts (rowid, title, category, details)
+                SELECT new.id, new.title, new.category, new.details WHERE new.status = 'Open';
+            END
+        """)
+        cur.execute("INSERT INTO requests_fts (requests_fts) VALUES ('delete-all')")
+        cur.execute("""
+            INSERT INTO requests_fts (rowid, title, category, details)
+            SELECT id, title, category, details FROM requests WHERE status = 'Open'
+        """)
+
+    def migrate_request_claims(self, cur):
+        # version: bumped by every status change, which is conditional on it
+        for table in ("requests", "requests_archive"):
+            cur.execute(f"ALTER TABLE {table} ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+            cur.execute(f"ALTER TABLE {table} ADD COLUMN claimed_by_user_id INTEGER")
+            cur.execute(f"ALTER TABLE {table} ADD COLUMN claimed_at TEXT")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_requests_claimed_by ON requests(claimed_by_user_id, status)")
+
+    def migrate_resolved_status(self, cur):
+        # before the Serviced status, /resolve set 'Resolved' and no serviced_at
+        for table in ("requests", "requests_archive"):
+            cur.execute(_RESOLVED_TO_SERVICED.format(table=table))
+
+    def migrate_feed_filter_indexes(self, cur):
+        for sql in _FEED_FILTER_INDEXES:
+            cur.execute(sql)
+
+    def rebuild_provider_indexes(self, cur):
+        """Recompute provider_areas and request_matches, e.g. after a bulk load."""
+        self.migrate_provider_areas(cur)
+        self.migrate_request_matches(cur)
+
+    def schema_version(self, conn):
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+
+    def migrate(self):
+        conn = self.connect()
+        try:
+            self.apply_migrations(conn)
+            # planner stats on every start: without them (or with stats for only
+            # some indexes) the feed filter indexes win over the lat/lng box even
+            # where the box is far more selective. Sampled, so it stays cheap.
+            conn.execute("PRAGMA analysis_limit=1000")
+            conn.execute("ANALYZE")
+        finally:
+            conn.close()
+
+    def apply_migrations(self, conn):
+        if self.schema_version(conn) >= len(self.migrations):
+            return
+
+        cur = conn.cursor()
+        for version, migrate in enumerate(self.migrations, start=1):
+            # BEGIN IMMEDIATE takes the write lock, so concurrent workers queue
+            # here and re-check the version instead of applying it twice.
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                if self.schema_version(conn) >= version:
+                    conn.rollback()
+                    continue
+                migrate(cur)
+                cur.execute(f"PRAGMA user_version={version}")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    # ---- users ----
+    def get_user(self, conn, uid):
+        return conn.execute(f"SELECT {USER_COLUMNS} FROM users WHERE id=?", (uid,)).fetchone()
+
+    def find_user_by_email(self, conn, email):
+        return conn.execute("SELECT * FROM users WHERE email=?", (email,)).fetchone()
+
+    def create_user(self, conn, role, name, email, pw_hash, created_at):
+        cur = conn.cursor()
+        cur.execute(
+            "INSERT INTO users (role, name, email, password_hash, created_at) VALUES (?, ?, ?, ?, ?)",
+            (role, name, email, pw_hash, created_at),
+        )
+        new_id = cur.lastrowid
+        version = self.bump_counter(cur, "providers") if role == "provider" else None
+        conn.commit()
+        return new_id, version
+
+    def set_password_hash(self, conn, uid, pw_hash):
+        conn.execute("UPDATE users SET password_hash=? WHERE id=?", (pw_hash, uid))
+        conn.commit()
+
+    def save_locations(self, conn, updates):
+        cur = conn.cursor()
+
+        by_columns = {}
+        for uid, (role, name, fields) in updates.items():
+            by_columns.setdefault(tuple(fields), []).append((*fields.values(), uid))
+        for columns, rows in by_columns.items():
+            assignments = ", ".join(f"{c}=?" for c in columns)
+            cur.executemany(f"UPDATE users SET {assignments} WHERE id=?", rows)
+
+        providers = [(uid, fields) for uid, (role, name, fields) in updates.items() if role == "provider"]
+        for uid, fields in providers:
+            lat, lng, radius = fields["lat"], fields["lng"], fields["service_radius_km"]
+            self.sync_provider_area(cur, uid, lat, lng, radius)
+            self.sync_provider_matches(cur, uid, lat, lng, radius)
+        version = self.bump_counter(cur, "providers") if providers else None
+        conn.commit()
+        return version
+
+    def bump_counter(self, cur, name):
+        cur.execute("UPDATE counters SET value = value + 1 WHERE name=?", (name,))
+        return self.read_counter(cur, name)
+
+    def read_counter(self, conn, name):
+        row = conn.execute("SELECT value FROM counters WHERE name=?", (name,)).fetchone()
+        return row["value"] if row else 0
+
+    def load_providers(self, conn):
+        # read the version first so the rows are at least that new
+        version = self.read_counter(conn, "providers")
+        providers_total = conn.execute(
+            "SELECT COUNT(*) AS c FROM users WHERE role='provider'"
+        ).fetchone()["c"]
+        rows = conn.execute("""
+            SELECT id, name, lat, lng, service_radius_km
+            FROM users
+            WHERE role='provider'
+              AND lat IS NOT NULL AND lng IS NOT NULL
+              AND service_radius_km IS NOT NULL
+            ORDER BY id
+        """).fetchall()
+        return version, providers_total, rows
+
+    def provider_pins(self, conn):
+        return conn.execute("""
+            SELECT id, lat, lng, service_radius_km
+            FROM users
+            WHERE role='provider'
+            ORDER BY id
+        """).fetchall()
+
+    # ---- provider areas + matches ----
+    def sync_provider_area(self, cur, provider_id, lat, lng, radius_km):
+        cur.execute("DELETE FROM provider_areas WHERE id=?", (provider_id,))
+        radius_km = to_float(radius_km)
+        if lat is None or lng is None or not self.usable_radius(radius_km):
+            return
+        min_lat, max_lat, min_lng, max_lng = bounding_box(float(lat), float(lng), float(radius_km))
+        cur.execute(
+            "INSERT INTO provider_areas (id, min_lat, max_lat, min_lng, max_lng) VALUES (?, ?, ?, ?, ?)",
+            (provider_id, min_lat, max_lat, min_lng, max_lng),
+        )
+
+    def sync_provider_matches(self, cur, provider_id, lat, lng, radius_km):
+        """Recompute one provider's matches after its pin or radius changed."""
+        cur.execute("DELETE FROM request_matches WHERE provider_id=?", (provider_id,))
+        radius_km = to_float(radius_km)
+        if lat is None or lng is None or not self.usable_radius(radius_km):
+            return
+        cur.execute("""
+            SELECT id, lat, lng
+            FROM requests
+            WHERE status='Open'
+              AND lat BETWEEN ? AND ?
+              AND lng BETWEEN ? AND ?
+        """, bounding_box(float(lat), float(lng), radius_km))
+        rows = cur.fetchall()
+        # same computation as the feed scan, so both agree at the boundary
+        cur.executemany(
+            "INSERT INTO request_matches (provider_id, request_id, distance_km) VALUES (?, ?, ?)",
+            [(provider_id, r["id"], d) for r, d in self.within(rows, lat, lng, radius_km)],
+        )
+
+    def match_new_request(self, cur, request_id, lat, lng):
+        """Add matches for a request that was just inserted as Open."""
+        cur.execute("""
+            SELECT u.id, u.lat, u.lng, u.service_radius_km
+            FROM provider_areas a
+            JOIN users u ON u.id = a.id
+            WHERE a.min_lat <= ? AND a.max_lat >= ?
+              AND a.min_lng <= ? AND a.max_lng >= ?
+        """, (lat, lat, lng, lng))
+        candidates = cur.fetchall()
+        if not candidates:
+            return
+        # haversine is symmetric, so one pass from the request to every candidate
+        points = PointSet([float(p["lat"]) for p in candidates], [float(p["lng"]) for p in candidates])
+        matches = [
+            (p["id"], request_id, float(d))
+            for p, d in zip(candidates, points.distances_km(lat, lng))
+            if d <= float(p["service_radius_km"])
+        ]
+        cur.executemany(
+            "INSERT INTO request_matches (provider_id, request_id, distance_km) VALUES (?, ?, ?)",
+            matches,
+        )
+
+    # ---- requests ----
+    def create_request(self, conn, values):
+        cur = conn.cursor()
+        columns = ", ".join(values)
+        cur.execute(
+            f"INSERT INTO requests ({columns}) VALUES ({', '.join('?' * len(values))})",
+            tuple(values.values()),
+        )
+        new_id = cur.lastrowid
+        self.match_new_request(cur, new_id, float(values["lat"]), float(values["lng"]))
+        self.log_request_event(cur, new_id, "open")
+        conn.commit()
+        return new_id
+
+    def get_request(self, conn, req_id):
+        row = conn.execute("SELECT * FROM requests WHERE id=?", (req_id,)).fetchone()
+        if row is None:
+            # archived requests are serviced by definition
+            row = conn.execute("SELECT * FROM requests_archive WHERE id=?", (req_id,)).fetchone()
+        return row
+
+    def transition_request(self, conn, req_id, from_status, version, to_status, changes, event):
+        cur = conn.cursor()
+        # the write lock first, so the WHERE is checked against the latest commit
+        cur.execute("BEGIN IMMEDIATE")
+        try:
+            cur.execute(f"""
+                UPDATE requests
+                SET status=:to_status, version=version + 1{"".join(f", {c}=:{c}" for c in changes)}
+                WHERE id=:id AND status=:from_status AND version=:version
+            """, {**changes, "id": req_id, "from_status": from_status, "to_status": to_status, "version": version})
+            if cur.rowcount != 1:
+                conn.rollback()
+                return False
+            if from_status == "Open":
+                cur.execute("DELETE FROM request_matches WHERE request_id=?", (req_id,))
+            self.log_request_event(cur, req_id, event)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return True
+
+    def claimed_requests(self, conn, provider_id):
+        return conn.execute("""
+            SELECT r.*, u.name AS receiver_name
+            FROM requests r
+            JOIN users u ON u.id = r.receiver_user_id
+            WHERE r.claimed_by_user_id=? AND r.status='Claimed'
+            ORDER BY r.claimed_at DESC, r.id DESC
+        """, (provider_id,)).fetchall()
+
+    def list_requests(self, conn, fields, receiver_id, after_id, limit):
+        where, params = [], []
+        if receiver_id is not None:
+            where.append("r.receiver_user_id = ?")
+            params.append(receiver_id)
+        if after_id is not None:
+            where.append("r.id < ?")
+            params.append(after_id)
+        where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+        columns = self.columns_sql(fields)
+
+        # each table is read in id order through its own index, then merged
+        parts = []
+        for table in ("requests", "requests_archive"):
+            # CROSS JOIN pins r as the outer loop; with few archived rows the planner
+            # would otherwise walk users and probe the archive per user
+            parts.append(conn.execute(f"""
+                SELECT {columns}
+                FROM {table} r
+                CROSS JOIN users u ON u.id = r.receiver_user_id
+                {where_sql}
+                ORDER BY r.id DESC
+                LIMIT ?
+            """, (*params, limit)).fetchall())
+        return list(heapq.merge(*parts, key=lambda r: r["id"], reverse=True))[:limit]
+
+    def param(self, name):
+        return f":{name}"
+
+    def provider_feed(self, conn, lat, lng, radius_km, include_history=False, filters=None, sort="newest", limit=None):
+        filters = filters or {}
+        if filters.get("max_km") is not None:
+            radius_km = min(float(radius_km), filters["max_km"])
+        where, params = self.filter_sql(filters)
+        # only rows inside the radius' bounding box can be in range
+        params.update(zip(("min_lat", "max_lat", "min_lng", "max_lng"), bounding_box(float(lat), float(lng), float(radius_km))))
+        where = ["r.lat BETWEEN :min_lat AND :max_lat", "r.lng BETWEEN :min_lng AND :max_lng", *where]
+        order = sort if sort in FEED_ORDER else "newest"
+
+        def select(table):
+            return f"""
+                SELECT r.*, u.name AS receiver_name
+                FROM {table} r
+                JOIN users u ON u.id = r.receiver_user_id
+                WHERE {" AND ".join(where)}
+            """
+
+        if not include_history:
+            # ✅ current requests ONLY
+            where.insert(0, "r.status='Open'")
+            cur = conn.cursor()
+            cur.execute(f"{select('requests')} ORDER BY {FEED_ORDER[order].format(p='r.')}", params)
+            rows = _iter_rows(cur)
+        elif order == "newest":
+            # archived requests are all Serviced, so only history needs them;
+            # both tables are read newest first and merged as they stream
+            streams = []
+            for table in ("requests", "requests_archive"):
+                cur = conn.cursor()
+                cur.execute(f"{select(table)} ORDER BY r.id DESC", params)
+                streams.append(_iter_rows(cur))
+            rows = heapq.merge(*streams, key=lambda r: r["id"], reverse=True)
+        else:
+            cur = conn.cursor()
+            cur.execute(f"""
+                {select("requests")}
+                UNION ALL
+                {select("requests_archive")}
+                ORDER BY {FEED_ORDER[order].format(p="")}
+            """, params)
+            rows = _iter_rows(cur)
+
+        hits = (hit for batch in batched(rows, FEED_BATCH_ROWS) for hit in self.within(batch, lat, lng, radius_km))
+        yield from _rank(hits, sort, limit)
+
+    def matched_feed(self, conn, provider_id, filters=None, sort="newest", limit=None):
+        filters = filters or {}
+        where, params = self.filter_sql(filters)
+        params["provider_id"] = provider_id
+        if filters.get("max_km") is not None:
+            where.append("m.distance_km <= :max_km")
+            params["max_km"] = filters["max_km"]
+        if sort == "distance":
+            # walks idx_request_matches_distance and stops after `limit`
+            order = "m.distance_km, m.request_id"
+        elif sort == "newest":
+            order = "m.request_id DESC"
+        else:
+            order = FEED_ORDER[sort].format(p="r.")
+        if limit:
+            params["limit"] = limit
+
+        cur = conn.cursor()
+        cur.execute(f"""
+            SELECT r.*, u.name AS receiver_name, m.distance_km AS match_distance_km
+            FROM request_matches m
+            JOIN requests r ON r.id = m.request_id
+            JOIN users u ON u.id = r.receiver_user_id
+            WHERE m.provider_id = :provider_id
+              AND r.status='Open'
+              {"".join(f" AND {w}" for w in where)}
+            ORDER BY {order}
+            {"LIMIT :limit" if limit else ""}
+        """, params)
+        for row in _iter_rows(cur):
+            row = dict(row)
+            yield row, row.pop("match_distance_km")
+
+    def search_feed(self, conn, lat, lng, radius_km, terms, filters=None, limit=None):
+        filters = filters or {}
+        if filters.get("max_km") is not None:
+            radius_km = min(float(radius_km), filters["max_km"])
+        where, params = self.filter_sql(filters)
+        params.update(zip(("min_lat", "max_lat", "min_lng", "max_lng"), bounding_box(float(lat), float(lng), float(radius_km))))
+        # each word as a quoted phrase so user input is never FTS5 syntax
+        params["query"] = " ".join(f'"{t}"' for t in terms) + "*"
+
+        cur = conn.cursor()
+        cur.execute(f"""
+            SELECT r.*, u.name AS receiver_name
+            FROM requests_fts f
+            JOIN requests r ON r.id = f.rowid
+            JOIN users u ON u.id = r.receiver_user_id
+            WHERE requests_fts MATCH :query
+              AND r.status='Open'
+              AND r.lat BETWEEN :min_lat AND :max_lat
+              AND r.lng BETWEEN :min_lng AND :max_lng
+              {"".join(f" AND {w}" for w in where)}
+            ORDER BY bm25(requests_fts, {", ".join(map(str, SEARCH_WEIGHTS))}), r.id DESC
+        """, params)
+        hits = (hit for batch in batched(_iter_rows(cur), FEED_BATCH_ROWS) for hit in self.within(batch, lat, lng, radius_km))
+        yield from islice(hits, limit)
+
+    def requests_by_ids(self, conn, ids):
+        return conn.execute(f"""
+            SELECT r.*, u.name AS receiver_name
+            FROM requests r
+            JOIN users u ON u.id = r.receiver_user_id
+            WHERE r.id IN ({",".join("?" * len(ids))})
+        """, ids).fetchall()
+
+    # ---- change log ----
+    def log_request_event(self, cur, request_id, kind):
+        cur.execute(
+            "INSERT INTO request_events (request_id, kind, created_at) VALUES (?, ?, ?)",
+            (request_id, kind, datetime.utcnow().isoformat()),
+        )
+
+    def latest_event_seq(self, conn):
+        return conn.execute("SELECT COALESCE(MAX(seq), 0) AS s FROM request_events").fetchone()["s"]
+
+    def events_after(self, conn, seq):
+        return conn.execute(
+            "SELECT seq, request_id, kind FROM request_events WHERE seq > ? ORDER BY seq",
+            (seq,),
+        ).fetchall()
+
+    # ---- maintenance ----
+    def stored_matches(self, conn, provider_id):
+        rows = conn.execute(
+            "SELECT request_id, distance_km FROM request_matches WHERE provider_id=?",
+            (provider_id,),
+        ).fetchall()
+        return {r["request_id"]: r["distance_km"] for r in rows}
+
+    def rebuild_matches(self, conn, provider_id, lat, lng, radius_km):
+        self.sync_provider_matches(conn.cursor(), provider_id, lat, lng, radius_km)
+        conn.commit()
+
+    def archive_serviced(self, conn, cutoff, batch_size):
+        columns = ", ".join(REQUEST_COLUMNS)
+        cur = conn.cursor()
+        moved = 0
+        while True:
+            # short transactions so request writes are never held up for long
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                cur.execute(
+                    "SELECT id FROM requests WHERE status='Serviced' AND serviced_at < ? LIMIT ?",
+                    (cutoff, batch_size),
+                )
+                ids = [r["id"] for r in cur.fetchall()]
+                if ids:
+                    marks = ",".join("?" * len(ids))
+                    cur.execute(
+                        f"INSERT INTO requests_archive ({columns}) SELECT {columns} FROM requests WHERE id IN ({marks})",
+                        ids,
+                    )
+                    cur.execute(f"DELETE FROM requests WHERE id IN ({marks})", ids)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            moved += len(ids)
+            if len(ids) < batch_size:
+                return moved
+
+    # ---- bulk import/export ----
+    def import_users(self, conn, rows):
+        columns = ", ".join(USER_IMPORT_COLUMNS)
+        cur = conn.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        try:
+            before = conn.total_changes
+            cur.executemany(
+                f"INSERT OR IGNORE INTO users ({columns}) VALUES ({', '.join('?' * len(USER_IMPORT_COLUMNS))})",
+                [tuple(r[c] for c in USER_IMPORT_COLUMNS) for r in rows],
+            )
+            inserted = conn.total_changes - before
+
+            version = None
+            emails = [r["email"] for r in rows if r["role"] == "provider" and r["lat"] is not None]
+            if inserted and emails:
+                for chunk in batched(emails, 500):
+                    cur.execute(f"""
+                        SELECT id, lat, lng, service_radius_km
+                        FROM users
+                        WHERE role='provider' AND email IN ({",".join("?" * len(chunk))})
+                    """, chunk)
+                    for p in cur.fetchall():
+                        self.sync_provider_area(cur, p["id"], p["lat"], p["lng"], p["service_radius_km"])
+                        self.sync_provider_matches(cur, p["id"], p["lat"], p["lng"], p["service_radius_km"])
+            if inserted and any(r["role"] == "provider" for r in rows):
+                version = self.bump_counter(cur, "providers")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return inserted, version
+
+    def import_requests(self, conn, rows):
+        columns = ", ".join(REQUEST_IMPORT_COLUMNS)
+        cur = conn.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        try:
+            # the write lock is held, so everything above this id is ours
+            last_id = cur.execute("SELECT COALESCE(MAX(id), 0) AS m FROM requests").fetchone()["m"]
+            cur.executemany(
+                f"INSERT INTO requests ({columns}) VALUES ({', '.join('?' * len(REQUEST_IMPORT_COLUMNS))})",
+                [tuple(r[c] for c in REQUEST_IMPORT_COLUMNS) for r in rows],
+            )
+            imported = cur.execute(
+                "SELECT id, lat, lng, status FROM requests WHERE id > ?", (last_id,)
+            ).fetchall()
+            for r in imported:
+                if r["status"] == "Open":
+                    self.match_new_request(cur, r["id"], float(r["lat"]), float(r["lng"]))
+            # every row gets an event, so feed ETags move for history too
+            now = datetime.utcnow().isoformat()
+            cur.executemany(
+                "INSERT INTO request_events (request_id, kind, created_at) VALUES (?, ?, ?)",
+                [(r["id"], _import_event(r["status"]), now) for r in imported],
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return len(rows)
+
+    def user_ids_by_email(self, conn, emails):
+        found = {}
+        for chunk in batched(sorted(set(emails)), 500):
+            rows = conn.execute(
+                f"SELECT id, email FROM users WHERE email IN ({','.join('?' * len(chunk))})", chunk
+            ).fetchall()
+            found.update((r["email"], r["id"]) for r in rows)
+        return found
+
+    def export_users(self, conn):
+        cur = conn.cursor()
+        cur.execute(f"SELECT {', '.join(USER_EXPORT_COLUMNS)} FROM users ORDER BY id")
+        yield from _iter_rows(cur)
+
+    def export_requests(self, conn):
+        streams = []
+        for table in ("requests", "requests_archive"):
+            cur = conn.cursor()
+            cur.execute(f"""
+                SELECT r.*, ru.email AS receiver_email, su.email AS serviced_by_email,
+                       cu.email AS claimed_by_email
+                FROM {table} r
+                LEFT JOIN users ru ON ru.id = r.receiver_user_id
+                LEFT JOIN users su ON su.id = r.serviced_by_user_id
+                LEFT JOIN users cu ON cu.id = r.claimed_by_user_id
+                ORDER BY r.id
+            """)
+            streams.append(_iter_rows(cur))
+        yield from heapq.merge(*streams, key=lambda r: r["id"])
+
+
+# =========================
+# PostgreSQL + PostGIS
+# - pooled psycopg 3 connections, shared by every worker on every host
+# - users/requests carry a generated geography(Point) column with GiST
+#   indexes; ST_DWithin only prunes with them, and the haversine_km() SQL
+#   function (geo.haversine_km on the same 6371 km sphere) decides
+# =========================
+_PG_REQUEST_TABLE = """
+    CREATE TABLE IF NOT EXISTS {name} (
+        id BIGINT PRIMARY KEY {id_default},
+        receiver_user_id BIGINT NOT NULL REFERENCES users(id),
+        title TEXT NOT NULL,
+        category TEXT NOT NULL,
+        details TEXT,
+        status TEXT NOT NULL DEFAULT 'Open',
+        created_at TEXT NOT NULL,
+        location_text TEXT,
+        lat DOUBLE PRECISION,
+        lng DOUBLE PRECISION,
+        scheduled_date TEXT,
+        scheduled_time TEXT,
+        duration_min INTEGER,
+        hourly_wage DOUBLE PRECISION,
+        serviced_at TEXT,
+        serviced_by_user_id BIGINT,
+        geog geography(Point, 4326) GENERATED ALWAYS AS (
+            CASE WHEN lat IS NOT NULL AND lng IS NOT NULL
+                 THEN ST_SetSRID(ST_MakePoint(lng, lat), 4326)::geography END
+        ) STORED
+    )
+"""
+
+PG_MIGRATIONS = [
+    # 1: the whole schema as of SQLite migration 7
+    [
+        "CREATE EXTENSION IF NOT EXISTS postgis",
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            role TEXT NOT NULL CHECK(role IN ('receiver','provider')),
+            name TEXT NOT NULL,
+            email TEXT NOT NULL UNIQUE,
+            password_hash TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            location_text TEXT,
+            lat DOUBLE PRECISION,
+            lng DOUBLE PRECISION,
+            service_radius_km DOUBLE PRECISION,
+            geog geography(Point, 4326) GENERATED ALWAYS AS (
+                CASE WHEN lat IS NOT NULL AND lng IS NOT NULL
+                     THEN ST_SetSRID(ST_MakePoint(lng, lat), 4326)::geography END
+            ) STORED
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_users_role ON users(role)",
+        "CREATE INDEX IF NOT EXISTS idx_users_provider_geog ON users USING GIST (geog) WHERE role = 'provider'",
+        _PG_REQUEST_TABLE.format(name="requests", id_default="GENERATED BY DEFAULT AS IDENTITY"),
+        "CREATE INDEX IF NOT EXISTS idx_requests_receiver_id ON requests(receiver_user_id, id)",
+        "CREATE INDEX IF NOT EXISTS idx_requests_status_serviced_at ON requests(status, serviced_at)",
+        "CREATE INDEX IF NOT EXISTS idx_requests_open_geog ON requests USING GIST (geog) WHERE status = 'Open'",
+        "CREATE INDEX IF NOT EXISTS idx_requests_geog ON requests USING GIST (geog)",
+        _PG_REQUEST_TABLE.format(name="requests_archive", id_default=""),
+        "CREATE INDEX IF NOT EXISTS idx_requests_archive_receiver_id ON requests_archive(receiver_user_id, id)",
+        "CREATE INDEX IF NOT EXISTS idx_requests_archive_geog ON requests_archive USING GIST (geog)",
+        """
+        CREATE TABLE IF NOT EXISTS counters (
+            name TEXT PRIMARY KEY,
+            value BIGINT NOT NULL
+        )
+        """,
+        "INSERT INTO counters (name, value) VALUES ('providers', 0) ON CONFLICT DO NOTHING",
+        """
+        CREATE TABLE IF NOT EXISTS request_events (
+            seq BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+            request_id BIGINT NOT NULL,
+            kind TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS request_matches (
+            provider_id BIGINT NOT NULL,
+            request_id BIGINT NOT NULL,
+            distance_km DOUBLE PRECISION NOT NULL,
+            PRIMARY KEY (provider_id, request_id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_request_matches_request ON request_matches(request_id)",
+        "CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)",
+    ],
+    # 2: provider feed sorted by distance
+    [
+        "CREATE INDEX IF NOT EXISTS idx_request_matches_distance ON request_matches(provider_id, distance_km)",
+    ],
+    # 3: request search; title/category/details get weights A/B/D, which
+    # search_feed() ranks 1.0/0.5/0.1 like SEARCH_WEIGHTS; Open requests only
+    [
+        """
+        ALTER TABLE requests ADD COLUMN IF NOT EXISTS search tsvector GENERATED ALWAYS AS (
+            setweight(to_tsvector('english', title), 'A') ||
+            setweight(to_tsvector('english', category), 'B') ||
+            setweight(to_tsvector('english', coalesce(details, '')), 'D')
+        ) STORED
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_requests_open_search ON requests USING GIN (search) WHERE status = 'Open'",
+    ],
+    # 4: claims; version is bumped by every status change, which is conditional on it
+    [
+        *(
+            f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column}"
+            for table in ("requests", "requests_archive")
+            for column in ("version INTEGER NOT NULL DEFAULT 0", "claimed_by_user_id BIGINT", "claimed_at TEXT")
+        ),
+        "CREATE INDEX IF NOT EXISTS idx_requests_claimed_by ON requests(claimed_by_user_id, status)",
+    ],
+    # 5: distances as geo.haversine_km() computes them; PostGIS' sphere is
+    # 6371.0088 km, so its distances disagreed with SQLite's near the radius
+    [
+        f"""
+        CREATE OR REPLACE FUNCTION haversine_km(lat1 double precision, lng1 double precision,
+                                                lat2 double precision, lng2 double precision)
+        RETURNS double precision
+        LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE
+        AS $$
+            SELECT {EARTH_RADIUS_KM} * 2 * atan2(sqrt(a), sqrt(1 - a))
+            FROM (SELECT sin(radians(lat2 - lat1) / 2) ^ 2
+                         + cos(radians(lat1)) * cos(radians(lat2)) * sin(radians(lng2 - lng1) / 2) ^ 2 AS a) t
+        $$
+        """,
+        # matches stored with the old distances
+        """
+        DELETE FROM request_matches m
+        USING users u, requests r
+        WHERE u.id = m.provider_id AND r.id = m.request_id
+          AND haversine_km(u.lat, u.lng, r.lat, r.lng) > u.service_radius_km
+        """,
+        """
+        UPDATE request_matches m
+        SET distance_km = haversine_km(u.lat, u.lng, r.lat, r.lng)
+        FROM users u, requests r
+        WHERE u.id = m.provider_id AND r.id = m.request_id
+        """,
+    ],
+    # 6: legacy 'Resolved' rows (SQLite migration 11)
+    [_RESOLVED_TO_SERVICED.format(table=table) for table in ("requests", "requests_archive")],
+    # 7: feed filters and sorts (SQLite migration 12)
+    list(_FEED_FILTER_INDEXES),
+]
+
+# arbitrary keys for pg_advisory_xact_lock
+_PG_MIGRATE_LOCK = 72_001
+_PG_EVENTS_LOCK = 72_002
+
+_PG_POINT = "ST_SetSRID(ST_MakePoint(%(lng)s, %(lat)s), 4326)::geography"
+# ST_DWithin radii are widened by this much so the index never drops a pin
+# haversine_km() would keep
+_PG_SLACK = 1.001
+
+
+class PostgresStorage(Storage):
+    # r.* would include the geog column
+    ALL_REQUEST_COLUMNS = ", ".join(f"r.{c}" for c in REQUEST_COLUMNS) + ", u.name AS receiver_name"
+
+    def __init__(self, url, pool_size, **kwargs):
+        if psycopg is None:
+            raise RuntimeError('DATABASE_URL points at PostgreSQL: pip install "psycopg[binary]" psycopg-pool')
+        super().__init__(**kwargs)
+        self.url = url
+        self.pool_size = pool_size
+        self._pool = None
+
+    @property
+    def pool(self):
+        # created lazily so it is never inherited across a fork
+        if self._pool is None:
+            self._pool = ConnectionPool(
+                self.url,
+                min_size=1,
+                max_size=self.pool_size,
+                # reads run on their own; writes open conn.transaction()
+                kwargs={"row_factory": dict_row, "autocommit": True},
+                open=True,
+            )
+        return self._pool
+
+    def connect(self):
+        return self.pool.getconn()
+
+    def release(self, conn):
+        if conn.info.transaction_status != psycopg.pq.TransactionStatus.IDLE:
+            conn.rollback()
+        self.pool.putconn(conn)
+
+    def schema_version(self, conn):
+        exists = conn.execute("SELECT to_regclass('schema_version') IS NOT NULL AS e").fetchone()["e"]
+        if not exists:
+            return 0
+        row = conn.execute("SELECT MAX(version) AS v FROM schema_version").fetchone()
+        return row["v"] or 0
+
+    def migrate(self):
+        conn = self.connect()
+        try:
+            for version, statements in enumerate(PG_MIGRATIONS, start=1):
+                with conn.transaction():
+                    # concurrent workers queue on the lock, then see the new version
+                    conn.execute("SELECT pg_advisory_xact_lock(%s)", (_PG_MIGRATE_LOCK,))
+                    if self.schema_version(conn) >= version:
+                        continue
+                    for sql in statements:
+                        conn.execute(sql)
+                    conn.execute("INSERT INTO schema_version (version) VALUES (%s)", (version,))
+        finally:
+            self.release(conn)
+
+    # ---- users ----
+    def get_user(self, conn, uid):
+        return conn.execute(f"SELECT {USER_COLUMNS} FROM users WHERE id=%s", (uid,)).fetchone()
+
+    def find_user_by_email(self, conn, email):
+        return conn.execute("SELECT * FROM users WHERE email=%s", (email,)).fetchone()
+
+    def create_user(self, conn, role, name, email, pw_hash, created_at):
+        with conn.transaction():
+            new_id = conn.execute(
+                "INSERT INTO users (role, name, email, password_hash, created_at) "
+                "VALUES (%s, %s, %s, %s, %s) RETURNING id",
+                (role, name, email, pw_hash, created_at),
+            ).fetchone()["id"]
+            version = self.bump_counter(conn, "providers") if role == "provider" else None
+        return new_id, version
+
+    def set_password_hash(self, conn, uid, pw_hash):
+        conn.execute("UPDATE users SET password_hash=%s WHERE id=%s", (pw_hash, uid))
+
+    def save_locations(self, conn, updates):
+        by_columns = {}
+        for uid, (role, name, fields) in updates.items():
+            by_columns.setdefault(tuple(fields), []).append((*fields.values(), uid))
+        providers = [uid for uid, (role, name, fields) in updates.items() if role == "provider"]
+        with conn.transaction(), conn.cursor() as cur:
+            for columns, rows in by_columns.items():
+                assignments = ", ".join(f"{c}=%s" for c in columns)
+                cur.executemany(f"UPDATE users SET {assignments} WHERE id=%s", rows)
+            for uid in providers:
+                self.sync_provider_matches(conn, uid)
+            return self.bump_counter(conn, "providers") if providers else None
+
+    def bump_counter(self, conn, name):
+        return conn.execute(
+            "UPDATE counters SET value = value + 1 WHERE name=%s RETURNING value", (name,)
+        ).fetchone()["value"]
+
+    def read_counter(self, conn, name):
+        row = conn.execute("SELECT value FROM counters WHERE name=%s", (name,)).fetchone()
+        return row["value"] if row else 0
+
+    def load_providers(self, conn):
+        # read the version first so the rows are at least that new
+        version = self.read_counter(conn, "providers")
+        providers_total = conn.execute(
+            "SELECT COUNT(*) AS c FROM users WHERE role='provider'"
+        ).fetchone()["c"]
+        rows = conn.execute("""
+            SELECT id, name, lat, lng, service_radius_km
+            FROM users
+            WHERE role='provider'
+              AND lat IS NOT NULL AND lng IS NOT NULL
+              AND service_radius_km IS NOT NULL
+            ORDER BY id
+        """).fetchall()
+        return version, providers_total, rows
+
+    def provider_pins(self, conn):
+        return conn.execute("""
+            SELECT id, lat, lng, service_radius_km
+            FROM users
+            WHERE role='provider'
+            ORDER BY id
+        """).fetchall()
+
+    # ---- matches ----
+    def sync_provider_matches(self, conn, provider_id):
+        """Recompute one provider's matches from its stored pin and radius."""
+        conn.execute("DELETE FROM request_matches WHERE provider_id=%s", (provider_id,))
+        conn.execute("""
+            INSERT INTO request_matches (provider_id, request_id, distance_km)
+            SELECT u.id, r.id, haversine_km(u.lat, u.lng, r.lat, r.lng)
+            FROM users u
+            JOIN requests r
+              ON r.status = 'Open'
+             AND ST_DWithin(r.geog, u.geog, u.service_radius_km * %(slack_m)s, false)
+             AND haversine_km(u.lat, u.lng, r.lat, r.lng) <= u.service_radius_km
+            WHERE u.id = %(id)s
+              AND u.service_radius_km > 0 AND u.service_radius_km <= %(max_km)s
+        """, {"id": provider_id, "max_km": self.max_radius_km, "slack_m": 1000 * _PG_SLACK})
+
+    def match_new_requests(self, conn, request_ids):
+        # the constant MAX radius lets the provider GiST index prune; the
+        # per-provider radius then decides
+        conn.execute("""
+            INSERT INTO request_matches (provider_id, request_id, distance_km)
+            SELECT u.id, r.id, haversine_km(u.lat, u.lng, r.lat, r.lng)
+            FROM requests r
+            JOIN users u
+              ON u.role = 'provider'
+             AND ST_DWithin(u.geog, r.geog, %(max_m)s, false)
+             AND u.service_radius_km > 0 AND u.service_radius_km <= %(max_km)s
+             AND haversine_km(u.lat, u.lng, r.lat, r.lng) <= u.service_radius_km
+            WHERE r.id = ANY(%(ids)s) AND r.status = 'Open'
+        """, {"ids": list(request_ids), "max_km": self.max_radius_km, "max_m": self.max_radius_km * 1000 * _PG_SLACK})
+
+    # ---- requests ----
+    def create_request(self, conn, values):
+        columns = ", ".join(values)
+        with conn.transaction():
+            new_id = conn.execute(
+                f"INSERT INTO requests ({columns}) VALUES ({', '.join(['%s'] * len(values))}) RETURNING id",
+                tuple(values.values()),
+            ).fetchone()["id"]
+            self.match_new_requests(conn, [new_id])
+            self.log_request_event(conn, new_id, "open")
+        return new_id
+
+    def get_request(self, conn, req_id):
+        columns = ", ".join(REQUEST_COLUMNS)
+        row = conn.execute(f"SELECT {columns} FROM requests WHERE id=%s", (req_id,)).fetchone()
+        if row is None:
+            # archived requests are serviced by definition
+            row = conn.execute(f"SELECT {columns} FROM requests_archive WHERE id=%s", (req_id,)).fetchone()
+        return row
+
+    def transition_request(self, conn, req_id, from_status, version, to_status, changes, event):
+        with conn.transaction():
+            # a concurrent UPDATE of the row makes this one wait, then re-check
+            # the WHERE against the committed row: only one of them matches
+            moved = conn.execute(f"""
+                UPDATE requests
+                SET status=%(to_status)s, version=version + 1{"".join(f", {c}=%({c})s" for c in changes)}
+                WHERE id=%(id)s AND status=%(from_status)s AND version=%(version)s
+            """, {**changes, "id": req_id, "from_status": from_status, "to_status": to_status, "version": version}).rowcount
+            if moved != 1:
+                return False
+            if from_status == "Open":
+                conn.execute("DELETE FROM request_matches WHERE request_id=%s", (req_id,))
+            self.log_request_event(conn, req_id, event)
+        return True
+
+    def claimed_requests(self, conn, provider_id):
+        return conn.execute(f"""
+            SELECT {self.ALL_REQUEST_COLUMNS}
+            FROM requests r
+            JOIN users u ON u.id = r.receiver_user_id
+            WHERE r.claimed_by_user_id=%s AND r.status='Claimed'
+            ORDER BY r.claimed_at DESC, r.id DESC
+        """, (provider_id,)).fetchall()
+
+    def list_requests(self, conn, fields, receiver_id, after_id, limit):
+        where, params = [], {"limit": limit}
+        if receiver_id is not None:
+            where.append("r.receiver_user_id = %(receiver_id)s")
+            params["receiver_id"] = receiver_id
+        if after_id is not None:
+            where.append("r.id < %(after_id)s")
+            params["after_id"] = after_id
+        where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+        columns = self.columns_sql(fields)
+        # Merge Append over both id-ordered index scans
+        return conn.execute(f"""
+            SELECT * FROM (
+                (SELECT {columns} FROM requests r JOIN users u ON u.id = r.receiver_user_id
+                 {where_sql} ORDER BY r.id DESC LIMIT %(limit)s)
+                UNION ALL
+                (SELECT {columns} FROM requests_archive r JOIN users u ON u.id = r.receiver_user_id
+                 {where_sql} ORDER BY r.id DESC LIMIT %(limit)s)
+            ) t
+            ORDER BY id DESC
+            LIMIT %(limit)s
+        """, params).fetchall()
+
+    def param(self, name):
+        return f"%({name})s"
+
+    def provider_feed(self, conn, lat, lng, radius_km, include_history=False, filters=None, sort="newest", limit=None):
+        filters = filters or {}
+        if filters.get("max_km") is not None:
+            radius_km = min(float(radius_km), filters["max_km"])
+        where, params = self.filter_sql(filters)
+        params.update({"lat": float(lat), "lng": float(lng), "km": float(radius_km), "m": float(radius_km) * 1000 * _PG_SLACK})
+        select = f"""
+            SELECT {self.ALL_REQUEST_COLUMNS}, haversine_km(%(lat)s, %(lng)s, r.lat, r.lng) AS feed_distance_km
+            FROM {{table}} r
+            JOIN users u ON u.id = r.receiver_user_id
+            WHERE ST_DWithin(r.geog, {_PG_POINT}, %(m)s, false)
+              AND haversine_km(%(lat)s, %(lng)s, r.lat, r.lng) <= %(km)s
+              {"".join(f" AND {w}" for w in where)}
+        """
+        if include_history:
+            # archived requests are all Serviced, so only history needs them
+            sql = f"""
+                {select.format(table="requests")}
+                UNION ALL
+                {select.format(table="requests_archive")}
+            """
+        else:
+            sql = f"{select.format(table='requests')} AND r.status='Open'"
+        # a LIMIT lets the planner keep only the top rows while sorting
+        order = "feed_distance_km, id" if sort == "distance" else FEED_ORDER[sort].format(p="")
+        if limit:
+            params["limit"] = limit
+
+        with conn.cursor() as cur:
+            for row in cur.stream(f"{sql} ORDER BY {order} {'LIMIT %(limit)s' if limit else ''}", params):
+                yield row, row.pop("feed_distance_km")
+
+    def matched_feed(self, conn, provider_id, filters=None, sort="newest", limit=None):
+        filters = filters or {}
+        where, params = self.filter_sql(filters)
+        params["provider_id"] = provider_id
+        if filters.get("max_km") is not None:
+            where.append("m.distance_km <= %(max_km)s")
+            params["max_km"] = filters["max_km"]
+        if sort == "distance":
+            order = "m.distance_km, m.request_id"
+        elif sort == "newest":
+            order = "m.request_id DESC"
+        else:
+            order = FEED_ORDER[sort].format(p="r.")
+        if limit:
+            params["limit"] = limit
+
+        with conn.cursor() as cur:
+            for row in cur.stream(f"""
+                SELECT {self.ALL_REQUEST_COLUMNS}, m.distance_km AS match_distance_km
+                FROM request_matches m
+                JOIN requests r ON r.id = m.request_id
+                JOIN users u ON u.id = r.receiver_user_id
+                WHERE m.provider_id = %(provider_id)s
+                  AND r.status='Open'
+                  {"".join(f" AND {w}" for w in where)}
+                ORDER BY {order}
+                {"LIMIT %(limit)s" if limit else ""}
+            """, params):
+                yield row, row.pop("match_distance_km")
+
+    def search_feed(self, conn, lat, lng, radius_km, terms, filters=None, limit=None):
+        filters = filters or {}
+        if filters.get("max_km") is not None:
+            radius_km = min(float(radius_km), filters["max_km"])
+        where, params = self.filter_sql(filters)
+        params.update({
+            "lat": float(lat), "lng": float(lng), "km": float(radius_km), "m": float(radius_km) * 1000 * _PG_SLACK,
+            # terms are plain words, so this is always a valid tsquery
+            "query": " & ".join(terms) + ":*",
+        })
+        if limit:
+            params["limit"] = limit
+
+        with conn.cursor() as cur:
+            for row in cur.stream(f"""
+                SELECT {self.ALL_REQUEST_COLUMNS}, haversine_km(%(lat)s, %(lng)s, r.lat, r.lng) AS feed_distance_km
+                FROM requests r
+                JOIN users u ON u.id = r.receiver_user_id
+                CROSS JOIN to_tsquery('english', %(query)s) q
+                WHERE r.search @@ q
+                  AND r.status='Open'
+                  AND ST_DWithin(r.geog, {_PG_POINT}, %(m)s, false)
+                  AND haversine_km(%(lat)s, %(lng)s, r.lat, r.lng) <= %(km)s
+                  {"".join(f" AND {w}" for w in where)}
+                ORDER BY ts_rank('{{0.1, 0, 0.5, 1.0}}', r.search, q) DESC, r.id DESC
+                {"LIMIT %(limit)s" if limit else ""}
+            """, params):
+                yield row, row.pop("feed_distance_km")
+
+    def requests_by_ids(self, conn, ids):
+        return conn.execute(f"""
+            SELECT {self.ALL_REQUEST_COLUMNS}
+            FROM requests r
+            JOIN users u ON u.id = r.receiver_user_id
+            WHERE r.id = ANY(%s)
+        """, (list(ids),)).fetchall()
+
+    # ---- change log ----
+    def log_request_event(self, conn, request_id, kind):
+        # Runs inside the caller's transaction. Identity values are handed out before commit, so without this lock a
+        # reader could see seq 11 committed before seq 10 and step past 10.
+        # Event writers are serialized instead; they are short transactions.
+        conn.execute("SELECT pg_advisory_xact_lock(%s)", (_PG_EVENTS_LOCK,))
+        conn.execute(
+            "INSERT INTO request_events (request_id, kind, created_at) VALUES (%s, %s, %s)",
+            (request_id, kind, datetime.utcnow().isoformat()),
+        )
+
+    def latest_event_seq(self, conn):
+        return conn.execute("SELECT COALESCE(MAX(seq), 0) AS s FROM request_events").fetchone()["s"]
+
+    def events_after(self, conn, seq):
+        return conn.execute(
+            "SELECT seq, request_id, kind FROM request_events WHERE seq > %s ORDER BY seq",
+            (seq,),
+        ).fetchall()
+
+    # ---- maintenance ----
+    def stored_matches(self, conn, provider_id):
+        rows = conn.execute(
+            "SELECT request_id, distance_km FROM request_matches WHERE provider_id=%s",
+            (provider_id,),
+        ).fetchall()
+        return {r["request_id"]: r["distance_km"] for r in rows}
+
+    def rebuild_matches(self, conn, provider_id, lat, lng, radius_km):
+        # lat/lng/radius are already stored on the users row
+        with conn.transaction():
+            self.sync_provider_matches(conn, provider_id)
+
+    def archive_serviced(self, conn, cutoff, batch_size):
+        columns = ", ".join(REQUEST_COLUMNS)
+        moved = 0
+        while True:
+            with conn.transaction():
+                n = conn.execute(f"""
+                    WITH moved AS (
+                        DELETE FROM requests
+                        WHERE id IN (
+                            SELECT id FROM requests
+                            WHERE status='Serviced' AND serviced_at < %s
+                            LIMIT %s
+                            FOR UPDATE SKIP LOCKED
+                        )
+                        RETURNING {columns}
+                    )
+                    INSERT INTO requests_archive ({columns})
+                    SELECT {columns} FROM moved
+                """, (cutoff, batch_size)).rowcount
+            moved += n
+            if n < batch_size:
+                return moved
+
+    # ---- bulk import/export ----
+    def import_users(self, conn, rows):
+        columns = ", ".join(USER_IMPORT_COLUMNS)
+        with conn.transaction(), conn.cursor() as cur:
+            cur.executemany(
+                f"INSERT INTO users ({columns}) VALUES ({', '.join(['%s'] * len(USER_IMPORT_COLUMNS))}) "
+                "ON CONFLICT (email) DO NOTHING RETURNING id, role, lat",
+                [tuple(r[c] for c in USER_IMPORT_COLUMNS) for r in rows],
+                returning=True,
+            )
+            inserted = []
+            while True:
+                inserted.extend(cur.fetchall())
+                if not cur.nextset():
+                    break
+            providers = [u["id"] for u in inserted if u["role"] == "provider"]
+            for uid in (u["id"] for u in inserted if u["role"] == "provider" and u["lat"] is not None):
+                self.sync_provider_matches(conn, uid)
+            version = self.bump_counter(conn, "providers") if providers else None
+        return len(inserted), version
+
+    def import_requests(self, conn, rows):
+        columns = ", ".join(REQUEST_IMPORT_COLUMNS)
+        with conn.transaction(), conn.cursor() as cur:
+            cur.executemany(
+                f"INSERT INTO requests ({columns}) VALUES ({', '.join(['%s'] * len(REQUEST_IMPORT_COLUMNS))}) "
+                "RETURNING id, status",
+                [tuple(r[c] for c in REQUEST_IMPORT_COLUMNS) for r in rows],
+                returning=True,
+            )
+            imported = []
+            while True:
+                imported.extend(cur.fetchall())
+                if not cur.nextset():
+                    break
+            opened = [r["id"] for r in imported if r["status"] == "Open"]
+            if opened:
+                self.match_new_requests(conn, opened)
+            if imported:
+                conn.execute("SELECT pg_advisory_xact_lock(%s)", (_PG_EVENTS_LOCK,))
+                now = datetime.utcnow().isoformat()
+                cur.executemany(
+                    "INSERT INTO request_events (request_id, kind, created_at) VALUES (%s, %s, %s)",
+                    [(r["id"], _import_event(r["status"]), now) for r in imported],
+                )
+        return len(rows)
+
+    def user_ids_by_email(self, conn, emails):
+        rows = conn.execute("SELECT id, email FROM users WHERE email = ANY(%s)", (list(set(emails)),)).fetchall()
+        return {r["email"]: r["id"] for r in rows}
+
+    def export_users(self, conn):
+        with conn.cursor() as cur:
+            yield from cur.stream(f"SELECT {', '.join(USER_EXPORT_COLUMNS)} FROM users ORDER BY id")
+
+    def export_requests(self, conn):
+        columns = ", ".join(f"r.{c}" for c in REQUEST_COLUMNS)
+        select = f"""
+            SELECT {columns}, ru.email AS receiver_email, su.email AS serviced_by_email,
+                   cu.email AS claimed_by_email
+            FROM {{table}} r
+            LEFT JOIN users ru ON ru.id = r.receiver_user_id
+            LEFT JOIN users su ON su.id = r.serviced_by_user_id
+            LEFT JOIN users cu ON cu.id = r.claimed_by_user_id
+        """
+        with conn.cursor() as cur:
+            yield from cur.stream(f"""
+                {select.format(table="requests")}
+                UNION ALL
+                {select.format(table="requests_archive")}
+                ORDER BY id
+            """)
@@ -0,0 +1,139 @@
+from datetime import datetime
+import os
+import uuid
+
+import pytest
+
+from storage import PostgresStorage, SQLiteStorage
+
+MAX_RADIUS_KM = 200
+
+
+@pytest.fixture(scope="session")
+def web(tmp_path_factory):
+    """app.py, imported once against a scratch database (its settings are read at import)."""
+    os.environ["DB_NAME"] = str(tmp_path_factory.mktemp("app") / "app.db")
+    os.environ.pop("DATABASE_URL", None)
+    import app
+
+    app.app.config["TESTING"] = True
+    return app
+
+
+@pytest.fixture(scope="session")
+def postgres_url():
+    """A PostGIS server: TEST_DATABASE_URL, else a throwaway container (needs Docker + testcontainers)."""
+    pytest.importorskip("psycopg")
+    pytest.importorskip("psycopg_pool")
+    url = os.environ.get("TEST_DATABASE_URL")
+    if url:
+        yield url
+        return
+
+    containers = pytest.importorskip("testcontainers.postgres")
+    try:
+        container = containers.PostgresContainer("postgis/postgis:16-3.4", driver=None).start()
+    except Exception as exc:
+        pytest.skip(f"no PostgreSQL container: {exc}")
+    try:
+        yield container.get_connection_url()
+    finally:
+        container.stop()
+
+
+@pytest.fixture(params=["sqlite", "postgres"])
+def storage(request, tmp_path):
+    """Every test using this runs against both backends, each on a fresh database."""
+    if request.param == "sqlite":
+        s = SQLiteStorage(str(tmp_path / "test.db"), 5000, 2000, 0, max_radius_km=MAX_RADIUS_KM)
+        s.migrate()
+        yield s
+        return
+
+    url = request.getfixturevalue("postgres_url")
+    import psycopg
+    from psycopg.conninfo import make_conninfo
+
+    name = f"test_{uuid.uuid4().hex}"
+    with psycopg.connect(url, autocommit=True) as admin:
+        admin.execute(f'CREATE DATABASE "{name}"')
+    s = PostgresStorage(make_conninfo(url, dbname=name), 4, max_radius_km=MAX_RADIUS_KM)
+    try:
+        s.migrate()
+        yield s
+    finally:
+        s.pool.close()
+        with psycopg.connect(url, autocommit=True) as admin:
+            admin.execute(f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)')
+
+
+@pytest.fixture
+def conn(storage):
+    conn = storage.connect()
+    yield conn
+    storage.release(conn)
+
+
+@pytest.fixture
+def make_user(storage, conn):
+    """make_user(role, lat=None, lng=None, radius_km=None) -> id"""
+    count = [0]
+
+    def make(role, lat=None, lng=None, radius_km=None):
+        count[0] += 1
+        name = f"{role}{count[0]}"
+        uid, _ = storage.create_user(conn, role, name, f"{name}@example.com", "x", datetime.utcnow().isoformat())
+        if lat is not None:
+            fields = {"location_text": None, "lat": lat, "lng": lng}
+            if role == "provider":
+                fields = {"lat": lat, "lng": lng, "service_radius_km": radius_km}
+            storage.save_locations(conn, {uid: (role, name, fields)})
+        return uid
+
+    return make
+
+
+@pytest.fixture
+def make_request(storage, conn):
+    """make_request(receiver_id, lat, lng, **columns) -> id"""
+
+    def make(receiver_id, lat, lng, **columns):
+        return storage.create_request(conn, {
+            "receiver_user_id": receiver_id,
+            "title": "Help needed",
+            "category": "Cleaning",
+            "details": None,
+            "status": "Open",
+            "created_at": datetime.utcnow().isoformat(),
+            "location_text": None,
+            "lat": lat,
+            "lng": lng,
+            "scheduled_date": "2026-01-01",
+            "scheduled_time": "10:00",
+            "duration_min": 60,
+            "hourly_wage": 20.0,
+            **columns,
+        })
+
+    return make
+
+
+@pytest.fixture
+def signup(web):
+    """signup(role, **fields) -> logged-in test client; fields are saved with the user's pin."""
+    def make(role, **fields):
+        client = web.app.test_client()
+        # unique across the session's database (ids of collected clients get reused)
+        name = f"{role}-{uuid.uuid4().hex}"
+        resp = client.post(f"/{role}/signup", data={
+            "name": name, "email": f"{name}@example.com", "password": "pw",
+            "gender_declared": "woman", "confirm_woman": "yes",
+        })
+        assert resp.status_code in (302, 303), resp.data[:300]
+        if role == "provider" and fields:
+            assert client.post("/provider/service", data=fields).status_code == 302
+        elif fields:
+            assert client.post("/api/receiver/location", json=fields).status_code == 200
+        return client
+
+    return make
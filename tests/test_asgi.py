@@ -0,0 +1,101 @@
+import asyncio
+import json
+
+import pytest
+
+
+@pytest.fixture
+def asgi(web):
+    import asgi
+
+    return asgi
+
+
+def call(asgi, path, headers):
+    scope = {
+        "type": "http", "method": "GET", "path": path, "query_string": b"", "http_version": "2",
+        "headers": headers, "server": ("testserver", 80), "client": ("127.0.0.1", 1234), "scheme": "http",
+    }
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(asgi.app(scope, receive, send))
+    return sent[0]["status"], b"".join(m.get("body", b"") for m in sent[1:])
+
+
+def test_repeated_headers_join(asgi):
+    environ = asgi.wsgi_environ({
+        "method": "GET", "path": "/", "query_string": b"", "http_version": "2",
+        "headers": [(b"cookie", b"a=1"), (b"cookie", b"b=2"), (b"accept", b"text/html"), (b"accept", b"*/*")],
+    }, b"")
+    assert environ["HTTP_COOKIE"] == "a=1; b=2"
+    assert environ["HTTP_ACCEPT"] == "text/html,*/*"
+
+
+def test_session_cookie_in_its_own_header(asgi, signup):
+    client = signup("receiver")
+    session = client.get_cookie("session").value.encode()
+
+    status, body = call(asgi, "/api/requests", [(b"cookie", b"theme=dark"), (b"cookie", b"session=" + session)])
+    assert status == 200, body
+    status, _ = call(asgi, "/api/requests", [(b"cookie", b"theme=dark")])
+    assert status == 401
+
+
+def test_streamed_feed_through_the_thread_pool(asgi, signup):
+    # the body is pulled chunk by chunk, possibly each on another pool thread
+    client = signup("provider", lat=-31.95, lng=115.86, service_radius_km=10)
+    session = client.get_cookie("session").value.encode()
+    for _ in range(20):
+        status, body = call(asgi, "/api/provider/requests", [(b"cookie", b"session=" + session)])
+        assert status == 200, body
+        assert isinstance(json.loads(body), list)
+
+
+def stream(asgi, headers):
+    scope = {
+        "type": "http", "method": "GET", "path": asgi.STREAM_PATH, "query_string": b"", "http_version": "1.1",
+        "headers": headers, "server": ("testserver", 80), "client": ("127.0.0.1", 1234), "scheme": "http",
+    }
+    sent = []
+
+    async def receive():
+        # the client stays connected
+        await asyncio.Event().wait()
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(asgi.app(scope, receive, send))
+    return sent[0]["status"], b"".join(m.get("body", b"") for m in sent[1:]).decode()
+
+
+def test_stream_sees_a_pin_still_in_the_write_buffer(asgi, web, signup, monkeypatch):
+    monkeypatch.setattr(web, "location_buffer", web.LocationBuffer(True, 3600, 1000))
+    monkeypatch.setattr(web, "SSE_MAX_SECONDS", 0)
+    # away from the other tests, which expect an empty feed at -31.95, 115.86
+    receiver = signup("receiver", lat=-37.81, lng=144.96)
+    resp = receiver.post("/api/requests", json={
+        "title": "Buffered pin", "category": "Cleaning", "scheduled_date": "2026-01-01",
+        "scheduled_time": "10:00", "duration_min": 60, "hourly_wage": 20,
+    })
+    assert resp.status_code == 201
+    provider = signup("provider", lat=-37.81, lng=144.96, service_radius_km=10)
+    headers = [(b"cookie", b"session=" + provider.get_cookie("session").value.encode())]
+
+    uid = asgi.session_user_id({"headers": headers})
+    assert web.location_buffer.has_pending(uid)
+    conn = web.storage.connect()
+    try:
+        assert web.storage.get_user(conn, uid)["lat"] is None
+    finally:
+        web.storage.release(conn)
+
+    status, body = stream(asgi, headers)
+    assert status == 200, body
+    assert "event: snapshot" in body and "Buffered pin" in body
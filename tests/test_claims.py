@@ -0,0 +1,70 @@
+"""Claims race on the conditional UPDATE; exactly one provider may win each request."""
+from pathlib import Path
+import shutil
+import threading
+
+from storage import SQLiteStorage
+
+PIN = {"lat": -31.95, "lng": 115.86}
+WORKERS = 8
+REQUESTS = 20
+
+
+def test_each_request_has_one_winner(web, signup):
+    receiver = signup("receiver", location_text="Perth", **PIN)
+    providers = [signup("provider", service_radius_km=10, **PIN) for _ in range(WORKERS)]
+    ids = []
+    for _ in range(REQUESTS):
+        resp = receiver.post("/api/requests", json={
+            "title": "Help needed", "category": "Cleaning", "scheduled_date": "2026-01-01",
+            "scheduled_time": "10:00", "duration_min": 60, "hourly_wage": 20,
+        })
+        assert resp.status_code == 201, resp.get_json()
+        ids.append(resp.get_json()["id"])
+
+    barrier = threading.Barrier(WORKERS)
+    outcomes = []
+
+    def claim_all(slot):
+        for req_id in ids:
+            barrier.wait()
+            resp = providers[slot].post(f"/api/requests/{req_id}/claim")
+            outcomes.append((req_id, slot, resp.status_code, (resp.get_json() or {}).get("already")))
+
+    threads = [threading.Thread(target=claim_all, args=(slot,)) for slot in range(WORKERS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(outcomes) == REQUESTS * WORKERS
+    assert {status for _, _, status, _ in outcomes} <= {200, 409}
+    winners = {}
+    for req_id, slot, status, already in outcomes:
+        if status == 200:
+            assert not already
+            winners.setdefault(req_id, []).append(slot)
+    assert sorted(winners) == sorted(ids)
+    assert all(len(slots) == 1 for slots in winners.values())
+
+    claimed = {req_id: slots[0] for req_id, slots in winners.items()}
+    for slot, client in enumerate(providers):
+        listed = {r["id"] for r in client.get("/api/provider/claims").get_json()}
+        assert listed == {req_id for req_id, s in claimed.items() if s == slot}
+
+
+def test_legacy_resolved_requests_become_serviced(tmp_path):
+    # the committed database.db predates the Serviced status and migrations
+    path = tmp_path / "legacy.db"
+    shutil.copy(Path(__file__).parent.parent / "database.db", path)
+    storage = SQLiteStorage(str(path), 5000, 2000, 0, max_radius_km=200)
+    storage.migrate()
+
+    conn = storage.connect()
+    try:
+        statuses = {r["status"] for r in conn.execute("SELECT status FROM requests")}
+        assert "Resolved" not in statuses
+        missing = conn.execute("SELECT COUNT(*) FROM requests WHERE status='Serviced' AND serviced_at IS NULL").fetchone()[0]
+        assert missing == 0
+    finally:
+        storage.release(conn)
@@ -0,0 +1,46 @@
+"""Feed ETags move with request_events, so every change to a feed must log one."""
+from datetime import datetime
+
+from storage import REQUEST_COLUMNS
+
+FEED = "/api/provider/requests?history=1"
+
+
+def test_imported_history_invalidates_the_feed_etag(web, signup):
+    provider = signup("provider", lat=-31.95, lng=115.86, service_radius_km=10)
+    with provider.get(FEED) as resp:
+        etag = resp.headers["ETag"]
+    with provider.get(FEED, headers={"If-None-Match": etag}) as resp:
+        assert resp.status_code == 304
+
+    conn = web.storage.connect()
+    try:
+        receiver, _ = web.storage.create_user(
+            conn, "receiver", "imported", f"imported-{id(provider)}@example.com", "x", datetime.utcnow().isoformat()
+        )
+        row = {c: None for c in REQUEST_COLUMNS[1:]}
+        row.update({
+            "receiver_user_id": receiver, "title": "Old job", "category": "Errands", "status": "Serviced",
+            "created_at": "2024-01-02", "lat": -31.95, "lng": 115.86, "version": 1, "serviced_at": "2024-01-03",
+        })
+        web.storage.import_requests(conn, [row])
+    finally:
+        web.storage.release(conn)
+
+    with provider.get(FEED, headers={"If-None-Match": etag}) as resp:
+        assert resp.status_code == 200
+        assert "Old job" in [item["title"] for item in resp.get_json()]
+
+
+def test_weakened_etag_still_matches(web, signup):
+    provider = signup("provider", lat=-31.95, lng=115.86, service_radius_km=10)
+    with provider.get(FEED) as resp:
+        etag = resp.headers["ETag"]
+    assert not etag.startswith("W/")
+    # a proxy that recompresses or rewrites the body weakens the tag
+    with provider.get(FEED, headers={"If-None-Match": f"W/{etag}"}) as resp:
+        assert resp.status_code == 304
+    with provider.get(FEED, headers={"If-None-Match": f'"other", W/{etag}'}) as resp:
+        assert resp.status_code == 304
+    with provider.get(FEED, headers={"If-None-Match": 'W/"other"'}) as resp:
+        assert resp.status_code == 200
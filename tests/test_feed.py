@@ -0,0 +1,118 @@
+"""
+The provider feed only reads the rows inside the radius' bounding box (and
+request_matches only stores those); either way the result must be what a
+haversine_km() scan over every request gives.
+"""
+import random
+
+import pytest
+
+from geo import haversine_km
+
+# pins this close to the radius may land on either side of it, depending on
+# which formula rounded last
+EDGE_KM = 1e-6
+
+CENTRES = [
+    (-31.95, 115.86),
+    # the bounding box crosses the antimeridian
+    (10.0, 179.9),
+    (-5.0, -179.95),
+    # the bounding box reaches a pole
+    (89.95, 20.0),
+    (-89.9, -60.0),
+]
+RADII_KM = (0.5, 5, 50, 200)
+REQUESTS_PER_CENTRE = 150
+
+
+def wrap_lng(lng):
+    return (lng + 180) % 360 - 180
+
+
+@pytest.fixture
+def world(storage, conn, make_user, make_request):
+    rng = random.Random(2)
+    providers = []
+    for lat, lng in CENTRES:
+        receiver = make_user("receiver")
+        for _ in range(REQUESTS_PER_CENTRE):
+            r_lat = max(-90.0, min(90.0, lat + rng.gauss(0, 0.5)))
+            make_request(receiver, r_lat, wrap_lng(lng + rng.gauss(0, 1.5)), hourly_wage=rng.choice([None, 10.0, 30.0]))
+        for radius in RADII_KM:
+            p_lat, p_lng = max(-90.0, min(90.0, lat + rng.gauss(0, 0.05))), wrap_lng(lng + rng.gauss(0, 0.05))
+            providers.append((make_user("provider", p_lat, p_lng, radius), p_lat, p_lng, radius))
+
+    # some history: Serviced, and older Serviced moved to the archive
+    provider_id = providers[0][0]
+    ids = [row["id"] for row in conn.execute("SELECT id FROM requests ORDER BY id").fetchall()]
+    for i, req_id in enumerate(rng.sample(ids, len(ids) // 4)):
+        serviced_at = "2020-01-01T00:00:00" if i % 2 else "2030-01-01T00:00:00"
+        assert storage.transition_request(
+            conn, req_id, "Open", 0, "Serviced",
+            {"serviced_at": serviced_at, "serviced_by_user_id": provider_id}, "serviced",
+        )
+    assert storage.archive_serviced(conn, "2025-01-01", 50) > 0
+    return providers
+
+
+def all_requests(conn):
+    return conn.execute("""
+        SELECT id, lat, lng, status FROM requests
+        UNION ALL
+        SELECT id, lat, lng, status FROM requests_archive
+    """).fetchall()
+
+
+def brute_force(rows, lat, lng, radius_km):
+    return {r["id"]: haversine_km(lat, lng, r["lat"], r["lng"]) for r in rows
+            if haversine_km(lat, lng, r["lat"], r["lng"]) <= radius_km}
+
+
+def assert_same_hits(hits, rows, lat, lng, radius_km):
+    got = {row["id"]: d for row, d in hits}
+    assert len(got) == len(hits), "a request came back twice"
+    expected = brute_force(rows, lat, lng, radius_km)
+    edge = {r["id"] for r in rows if abs(haversine_km(lat, lng, r["lat"], r["lng"]) - radius_km) < EDGE_KM}
+    assert set(got) - edge == set(expected) - edge
+    for req_id in set(got) & set(expected):
+        assert got[req_id] == pytest.approx(expected[req_id], abs=1e-9)
+
+
+def test_open_feed_matches_full_scan(storage, conn, world):
+    rows = [r for r in all_requests(conn) if r["status"] == "Open"]
+    for _, lat, lng, radius in world:
+        hits = list(storage.provider_feed(conn, lat, lng, radius))
+        assert_same_hits(hits, rows, lat, lng, radius)
+        assert [row["id"] for row, _ in hits] == sorted((row["id"] for row, _ in hits), reverse=True)
+
+
+def test_history_feed_matches_full_scan(storage, conn, world):
+    rows = all_requests(conn)
+    assert any(r["status"] == "Serviced" for r in rows)
+    for _, lat, lng, radius in world:
+        hits = list(storage.provider_feed(conn, lat, lng, radius, include_history=True))
+        assert_same_hits(hits, rows, lat, lng, radius)
+        assert [row["id"] for row, _ in hits] == sorted((row["id"] for row, _ in hits), reverse=True)
+
+
+def test_matched_feed_matches_full_scan(storage, conn, world):
+    rows = [r for r in all_requests(conn) if r["status"] == "Open"]
+    for provider_id, lat, lng, radius in world:
+        hits = list(storage.matched_feed(conn, provider_id))
+        assert_same_hits(hits, rows, lat, lng, radius)
+
+
+def test_filters_and_distance_sort_match_full_scan(storage, conn, world):
+    wages = {r["id"]: r["hourly_wage"] for r in conn.execute("SELECT id, hourly_wage FROM requests").fetchall()}
+    rows = [r for r in all_requests(conn) if r["status"] == "Open"]
+    for provider_id, lat, lng, radius in world:
+        max_km = radius / 2
+        filters = {"min_wage": 20, "max_km": max_km}
+        expected = [r for r in rows if (wages[r["id"]] or 0) >= 20]
+        for hits in (
+            list(storage.provider_feed(conn, lat, lng, radius, filters=filters, sort="distance")),
+            list(storage.matched_feed(conn, provider_id, filters=filters, sort="distance")),
+        ):
+            assert_same_hits(hits, expected, lat, lng, max_km)
+            assert [d for _, d in hits] == sorted(d for _, d in hits)
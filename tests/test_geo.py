@@ -0,0 +1,150 @@
+"""geo.py batch distances against haversine_km(), on the NumPy and the array('d') code paths."""
+import math
+import random
+
+import pytest
+
+import geo
+from geo import CoverageSet, PointSet, cell_bounds, grid_cell, haversine_km
+
+TOLERANCE_KM = 1e-7
+
+
+@pytest.fixture(params=["numpy", "array"])
+def backend(request, monkeypatch):
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(geo, "np", None)
+    return request.param
+
+
+def random_points(rng, n):
+    lats = [rng.uniform(-90, 90) for _ in range(n)]
+    lngs = [rng.uniform(-180, 180) for _ in range(n)]
+    return lats, lngs
+
+
+def test_distances_match_scalar(backend):
+    rng = random.Random(1)
+    lats, lngs = random_points(rng, 2000)
+    points = PointSet(lats, lngs)
+    # nearby, antipodal, on the pole, across the antimeridian
+    for lat, lng in [(-31.95, 115.86), (31.95, -64.14), (90.0, 0.0), (0.0, 179.999), *zip(lats[:20], lngs[:20])]:
+        distances = points.distances_km(lat, lng)
+        assert len(distances) == len(lats)
+        for d, p_lat, p_lng in zip(distances, lats, lngs):
+            assert d == pytest.approx(haversine_km(lat, lng, p_lat, p_lng), abs=TOLERANCE_KM)
+
+
+def test_set_append_remove_keep_parity(backend):
+    rng = random.Random(2)
+    lats, lngs = random_points(rng, 50)
+    points = PointSet(lats, lngs)
+    points.set(3, 10.0, 20.0)
+    lats[3], lngs[3] = 10.0, 20.0
+    points.append(-45.0, 170.0)
+    lats.append(-45.0)
+    lngs.append(170.0)
+    points.remove(7)
+    lats[7], lngs[7] = lats.pop(), lngs.pop()
+
+    distances = points.distances_km(1.0, 2.0)
+    assert len(points) == len(lats)
+    for d, p_lat, p_lng in zip(distances, lats, lngs):
+        assert d == pytest.approx(haversine_km(1.0, 2.0, p_lat, p_lng), abs=TOLERANCE_KM)
+
+
+def test_covering_matches_scalar(backend):
+    rng = random.Random(3)
+    lats = [-31.95 + rng.gauss(0, 0.5) for _ in range(500)]
+    lngs = [115.86 + rng.gauss(0, 0.5) for _ in range(500)]
+    radii = [rng.choice([1.0, 5.0, 20.0]) for _ in range(500)]
+    areas = CoverageSet(lats, lngs, radii)
+    for _ in range(50):
+        lat, lng = -31.95 + rng.gauss(0, 0.5), 115.86 + rng.gauss(0, 0.5)
+        hits, nearest = areas.covering(lat, lng)
+        exact = [haversine_km(lat, lng, a, b) for a, b in zip(lats, lngs)]
+        assert {i for i, _ in hits} == {i for i, (d, r) in enumerate(zip(exact, radii)) if d <= r}
+        for i, d in hits:
+            assert d == pytest.approx(exact[i], abs=TOLERANCE_KM)
+        assert nearest == pytest.approx(min(exact), abs=TOLERANCE_KM)
+
+    assert CoverageSet([], [], []).covering(0.0, 0.0) == ([], None)
+
+
+@pytest.mark.parametrize("grid_deg", [0, 0.1, 0.5], ids=["no-grid", "grid-0.1", "grid-0.5"])
+@pytest.mark.parametrize("cell_deg", [0.005, 0.05, 1.0])
+def test_cell_candidates_give_the_full_answer(backend, cell_deg, grid_deg):
+    rng = random.Random(4)
+    n = 1500
+    lats = [-31.95 + rng.gauss(0, 0.3) for _ in range(n)]
+    lngs = [115.86 + rng.gauss(0, 0.3) for _ in range(n)]
+    radii = [rng.choice([0.5, 2.0, 10.0, 25.0]) for _ in range(n)]
+    areas = CoverageSet(lats, lngs, radii, grid_deg)
+
+    for k in range(300):
+        if k % 2:
+            # on some provider's radius
+            j = rng.randrange(n)
+            bearing, angle = rng.uniform(0, 2 * math.pi), radii[j] / geo.EARTH_RADIUS_KM
+            lat = lats[j] + math.degrees(angle * math.cos(bearing))
+            lng = lngs[j] + math.degrees(angle * math.sin(bearing)) / math.cos(math.radians(lats[j]))
+        else:
+            # anywhere, including far from every provider
+            lat, lng = -31.95 + rng.uniform(-3, 3), 115.86 + rng.uniform(-3, 3)
+
+        candidates = list(areas.candidates(*cell_bounds(grid_cell(lat, lng, cell_deg), cell_deg)))
+        sub = areas.subset(candidates)
+        assert len(sub) == len(candidates)
+
+        full_hits, full_nearest = areas.covering(lat, lng)
+        sub_hits, sub_nearest = sub.covering(lat, lng)
+        full = dict(full_hits)
+        from_sub = {candidates[i]: d for i, d in sub_hits}
+        assert set(from_sub) == set(full)
+        for i, d in from_sub.items():
+            assert d == pytest.approx(full[i], abs=TOLERANCE_KM)
+        assert sub_nearest == pytest.approx(full_nearest, abs=TOLERANCE_KM)
+
+
+def assert_candidates_cover(areas, lat, lng):
+    candidates = list(areas.candidates(lat, lat, lng, lng))
+    full_hits, full_nearest = areas.covering(lat, lng)
+    sub_hits, sub_nearest = areas.subset(candidates).covering(lat, lng)
+    assert {candidates[i] for i, _ in sub_hits} == {i for i, _ in full_hits}
+    assert sub_nearest == pytest.approx(full_nearest, abs=TOLERANCE_KM)
+    return candidates
+
+
+def test_grid_follows_set_append_remove(backend):
+    rng = random.Random(5)
+    # a few cities, one on the antimeridian and one near a pole
+    cities = [(-31.95, 115.86), (51.5, -0.12), (-17.7, 179.9), (85.0, 30.0)]
+    lats, lngs, radii = [], [], []
+    for _ in range(400):
+        lat, lng = rng.choice(cities)
+        lats.append(max(-90.0, min(90.0, lat + rng.gauss(0, 0.3))))
+        lngs.append((lng + rng.gauss(0, 0.3) + 180) % 360 - 180)
+        radii.append(rng.choice([1.0, 10.0, 50.0, 200.0]))
+    areas = CoverageSet(lats, lngs, radii, 0.5)
+    published = areas.copy()
+
+    for _ in range(300):
+        lat, lng = rng.choice(cities)
+        lat, lng = max(-90.0, min(90.0, lat + rng.gauss(0, 0.5))), (lng + rng.gauss(0, 0.5) + 180) % 360 - 180
+        change = rng.random()
+        if change < 0.4:
+            areas.set(rng.randrange(len(areas)), lat, lng, rng.choice([1.0, 10.0, 200.0]))
+        elif change < 0.7:
+            areas.append(lat, lng, rng.choice([1.0, 10.0, 200.0]))
+        else:
+            areas.remove(rng.randrange(len(areas)))
+        assert_candidates_cover(areas, lat, lng)
+        # somewhere no provider is near: the nearest one still counts
+        assert_candidates_cover(areas, rng.uniform(-60, 60), rng.uniform(-180, 180))
+
+    # the copy taken before the changes still answers for its own points
+    for lat, lng in cities:
+        assert_candidates_cover(published, lat, lng)
+    assert len(assert_candidates_cover(published, *cities[0])) < len(published) // 2
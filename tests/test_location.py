@@ -0,0 +1,212 @@
+"""
+/api/receiver/location admission (rate limits, the in-flight cap, the
+unchanged-pin shortcut), and pins held in the write buffer until flushed.
+"""
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from ratelimit import MemoryBuckets
+
+LOCATION = "/api/receiver/location"
+# away from the other tests, so the providers in range are only this file's
+HOBART = (-42.88, 147.33)
+
+
+def pin(i=0):
+    return {"location_text": "Hobart", "lat": HOBART[0] + i * 0.001, "lng": HOBART[1]}
+
+
+@pytest.fixture
+def limits(web, monkeypatch):
+    """limits(user_rate, user_burst, ip_rate=0, ip_burst=0) on fresh buckets."""
+    monkeypatch.setattr(web, "rate_buckets", MemoryBuckets())
+
+    def set_limits(user_rate, user_burst, ip_rate=0, ip_burst=0):
+        monkeypatch.setattr(web, "LOCATION_USER_RATE", user_rate)
+        monkeypatch.setattr(web, "LOCATION_USER_BURST", user_burst)
+        monkeypatch.setattr(web, "LOCATION_IP_RATE", ip_rate)
+        monkeypatch.setattr(web, "LOCATION_IP_BURST", ip_burst)
+
+    set_limits(0, 0)
+    return set_limits
+
+
+def test_429_with_retry_after_past_the_burst(signup, limits):
+    limits(0.5, 2)
+    receiver = signup("receiver")
+    assert [receiver.post(LOCATION, json=pin(i)).status_code for i in range(2)] == [200, 200]
+
+    resp = receiver.post(LOCATION, json=pin(2))
+    assert resp.status_code == 429
+    assert resp.headers["Retry-After"] == "2"  # one token at 0.5 a second
+    assert resp.get_json() == {"error": "Too many location updates, please slow down."}
+    # another user is not held up by this one's bucket
+    assert signup("receiver").post(LOCATION, json=pin(2)).status_code == 200
+
+
+def test_429_per_client_ip(signup, limits):
+    limits(0, 0, ip_rate=0.5, ip_burst=2)
+    receivers = [signup("receiver") for _ in range(3)]
+    assert [r.post(LOCATION, json=pin(i)).status_code for i, r in enumerate(receivers)] == [200, 200, 429]
+    other_ip = receivers[2].post(LOCATION, json=pin(2), environ_base={"REMOTE_ADDR": "10.0.0.2"})
+    assert other_ip.status_code == 200
+
+
+def test_503_at_max_inflight(web, signup, limits, monkeypatch):
+    slots = threading.BoundedSemaphore(2)
+    monkeypatch.setattr(web, "_location_slots", slots)
+    receiver = signup("receiver")
+    with receiver.session_transaction() as session:
+        uid = session["user_id"]
+    assert slots.acquire(blocking=False) and slots.acquire(blocking=False)
+
+    resp = receiver.post(LOCATION, json=pin())
+    assert resp.status_code == 503 and resp.headers["Retry-After"] == "1"
+    conn = web.storage.connect()
+    try:
+        # turned away before anything was saved
+        assert web.storage.get_user(conn, uid)["lat"] is None
+    finally:
+        web.storage.release(conn)
+
+    slots.release()
+    assert receiver.post(LOCATION, json=pin()).status_code == 200
+    # the slot is given back after the check
+    assert slots.acquire(blocking=False)
+
+
+def test_unchanged_pin_gets_the_last_answer(web, signup, limits, monkeypatch):
+    limits(0.001, 1)
+    receiver = signup("receiver")
+    first = receiver.post(LOCATION, json=pin())
+    assert first.status_code == 200 and first.get_json()["can_serve"] is False
+
+    saves = []
+    monkeypatch.setattr(web, "save_location", lambda user, **fields: saves.append(fields))
+    # the bucket is empty, but the same pin costs neither a token nor a write
+    for _ in range(3):
+        again = receiver.post(LOCATION, json=pin())
+        assert again.status_code == 200 and again.get_json() == first.get_json()
+    assert saves == []
+    # a new pin is a new check
+    assert receiver.post(LOCATION, json=pin(1)).status_code == 429
+
+
+def test_unchanged_pin_is_checked_again_once_providers_change(web, signup, limits):
+    receiver = signup("receiver")
+    first = receiver.post(LOCATION, json=pin(5)).get_json()
+
+    signup("provider", lat=HOBART[0] + 0.005, lng=HOBART[1], service_radius_km=5)
+    again = receiver.post(LOCATION, json=pin(5)).get_json()
+    assert again["providers_in_range"] == first["providers_in_range"] + 1
+    assert again["can_serve"] is True
+
+
+# =========================
+# Buffered pins (LOCATION_WRITE_MODE=buffered)
+# =========================
+# away from the other tests, so the requests made here stay out of their feeds
+DARWIN = (-12.46, 130.84)
+REQUEST = {
+    "title": "Buffered help", "category": "Cleaning", "scheduled_date": "2026-01-01",
+    "scheduled_time": "10:00", "duration_min": 60, "hourly_wage": 20,
+}
+
+
+@pytest.fixture
+def buffer(web, monkeypatch):
+    """A write buffer that only flushes when the test says so."""
+    buffer = web.LocationBuffer(True, 3600, 1000)
+    monkeypatch.setattr(web, "location_buffer", buffer)
+    return buffer
+
+
+def user_id(client):
+    with client.session_transaction() as session:
+        return session["user_id"]
+
+
+def stored(web, uid):
+    conn = web.storage.connect()
+    try:
+        return dict(web.storage.get_user(conn, uid))
+    finally:
+        web.storage.release(conn)
+
+
+def test_pending_pin_is_served_before_the_flush(web, signup, buffer):
+    lat, lng = DARWIN
+    receiver = signup("receiver", location_text="Darwin", lat=lat, lng=lng)
+    provider = signup("provider", lat=lat + 0.01, lng=lng, service_radius_km=5)
+    uids = user_id(receiver), user_id(provider)
+    assert all(buffer.has_pending(uid) and stored(web, uid)["lat"] is None for uid in uids)
+
+    # the request is made at the pin nobody has written yet
+    resp = receiver.post("/api/requests", json=REQUEST)
+    assert resp.status_code == 201
+    conn = web.storage.connect()
+    try:
+        req = web.storage.get_request(conn, resp.get_json()["id"])
+        assert (req["lat"], req["lng"]) == (lat, lng)
+    finally:
+        web.storage.release(conn)
+    # and the provider's pending pin already finds it
+    feed = provider.get("/api/provider/requests")
+    assert feed.status_code == 200
+    assert [item["title"] for item in feed.get_json()] == ["Buffered help"]
+
+    buffer.flush()
+    assert not any(buffer.has_pending(uid) for uid in uids)
+    assert stored(web, uids[0])["lat"] == lat and stored(web, uids[1])["service_radius_km"] == 5
+    assert [item["title"] for item in provider.get("/api/provider/requests").get_json()] == ["Buffered help"]
+
+
+def test_failed_flush_keeps_the_pin_until_a_retry_writes_it(web, signup, buffer, monkeypatch):
+    lat, lng = DARWIN
+    receiver = signup("receiver", location_text="Darwin", lat=lat - 0.5, lng=lng)
+    uid = user_id(receiver)
+    write = web.write_locations
+
+    def locked(conn, updates):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(web, "write_locations", locked)
+    with pytest.raises(sqlite3.OperationalError):
+        buffer.flush()
+    assert buffer.has_pending(uid) and stored(web, uid)["lat"] is None
+    # still read through the buffer meanwhile
+    assert buffer.overlay(stored(web, uid))["lat"] == lat - 0.5
+
+    # dragged again before the retry: only the latest pin is written
+    assert receiver.post(LOCATION, json={"location_text": "Darwin", "lat": lat - 0.6, "lng": lng}).status_code == 200
+    monkeypatch.setattr(web, "write_locations", write)
+    buffer.flush()
+    assert not buffer.has_pending(uid) and stored(web, uid)["lat"] == lat - 0.6
+
+
+def test_flush_thread_retries_after_a_failure(web, signup, monkeypatch, caplog):
+    buffer = web.LocationBuffer(True, 0.01, 1000)
+    monkeypatch.setattr(web, "location_buffer", buffer)
+    failures = [sqlite3.OperationalError("database is locked")]
+    write = web.write_locations
+
+    def locked_once(conn, updates):
+        if failures:
+            raise failures.pop()
+        return write(conn, updates)
+
+    monkeypatch.setattr(web, "write_locations", locked_once)
+    lat, lng = DARWIN
+    uid = user_id(signup("receiver", location_text="Darwin", lat=lat - 1, lng=lng))
+    try:
+        deadline = time.monotonic() + 5
+        while buffer.has_pending(uid) and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        buffer.interval_s = 3600  # the thread outlives the test
+    assert not failures and not buffer.has_pending(uid)
+    assert stored(web, uid)["lat"] == lat - 1
+    assert "location flush failed, will retry" in caplog.text
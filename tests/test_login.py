@@ -0,0 +1,93 @@
+"""Logins verify through the bounded hash pool and upgrade old hashes as they go."""
+import threading
+
+from werkzeug.security import generate_password_hash
+
+OLD_METHOD = "pbkdf2:sha256:1000"
+
+
+def make_receiver(web, name):
+    client = web.app.test_client()
+    resp = client.post("/receiver/signup", data={
+        "name": name, "email": f"{name}@example.com", "password": "pw",
+        "gender_declared": "woman", "confirm_woman": "yes",
+    })
+    assert resp.status_code == 302
+    return f"{name}@example.com"
+
+
+def stored_hash(web, email):
+    conn = web.storage.connect()
+    try:
+        return web.storage.find_user_by_email(conn, email)["password_hash"]
+    finally:
+        web.storage.release(conn)
+
+
+def set_hash(web, email, pw_hash):
+    conn = web.storage.connect()
+    try:
+        web.storage.set_password_hash(conn, web.storage.find_user_by_email(conn, email)["id"], pw_hash)
+    finally:
+        web.storage.release(conn)
+
+
+def log_in(web, email, password="pw"):
+    return web.app.test_client().post("/receiver/login", data={"email": email, "password": password})
+
+
+def test_login_rehashes_an_old_hash(web):
+    email = make_receiver(web, "rehash-old")
+    set_hash(web, email, generate_password_hash("pw", OLD_METHOD))
+    assert web.needs_rehash(stored_hash(web, email))
+
+    assert log_in(web, email).status_code == 302
+    upgraded = stored_hash(web, email)
+    assert not upgraded.startswith(OLD_METHOD) and not web.needs_rehash(upgraded)
+    # the new hash still checks out, and is left alone from now on
+    assert log_in(web, email).status_code == 302
+    assert stored_hash(web, email) == upgraded
+
+
+def test_failed_login_keeps_the_old_hash(web):
+    email = make_receiver(web, "rehash-wrong")
+    old = generate_password_hash("pw", OLD_METHOD)
+    set_hash(web, email, old)
+
+    resp = log_in(web, email, "not-pw")
+    assert resp.status_code == 200 and b"Incorrect password." in resp.data
+    assert stored_hash(web, email) == old
+
+
+def test_login_when_the_rehash_finds_the_pool_busy(web, monkeypatch):
+    email = make_receiver(web, "rehash-busy")
+    old = generate_password_hash("pw", OLD_METHOD)
+    set_hash(web, email, old)
+
+    def busy(password):
+        raise web.HashingBusy()
+
+    # verifying got a slot; by the time of the rehash the pool is full
+    monkeypatch.setattr(web, "hash_password", busy)
+    assert log_in(web, email).status_code == 302
+    assert stored_hash(web, email) == old
+
+
+def test_503_when_the_hash_pool_is_saturated(web, monkeypatch):
+    email = make_receiver(web, "saturated")
+    monkeypatch.setattr(web, "_hash_slots", threading.BoundedSemaphore(web.HASH_WORKERS + web.HASH_QUEUE_LIMIT))
+    for _ in range(web.HASH_WORKERS + web.HASH_QUEUE_LIMIT):
+        assert web._hash_slots.acquire(blocking=False)
+
+    resp = log_in(web, email)
+    assert resp.status_code == 503 and resp.headers["Retry-After"] == "1"
+    assert b"Server is busy" in resp.data
+    resp = web.app.test_client().post("/receiver/signup", data={
+        "name": "saturated-new", "email": "saturated-new@example.com", "password": "pw",
+        "gender_declared": "woman", "confirm_woman": "yes",
+    })
+    assert resp.status_code == 503 and b"Server is busy" in resp.data
+
+    # a slot frees up: the same login goes through
+    web._hash_slots.release()
+    assert log_in(web, email).status_code == 302
@@ -0,0 +1,116 @@
+"""Token buckets: refill and burst, eviction, and the file the workers share."""
+import sqlite3
+import threading
+import types
+
+import pytest
+
+import ratelimit
+from ratelimit import MemoryBuckets, SQLiteBuckets, _take
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """now[0] is what ratelimit sees as time.time()."""
+    now = [1000.0]
+    monkeypatch.setattr(ratelimit, "time", types.SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def buckets(request, tmp_path):
+    if request.param == "memory":
+        return MemoryBuckets()
+    return SQLiteBuckets(str(tmp_path / "buckets.db"))
+
+
+def test_take_refills_at_rate_up_to_burst():
+    limits = [("k", 2.0, 3)]
+    state = {}
+    for _ in range(3):
+        state, wait = _take(state, limits, 0.0)
+        assert wait == 0
+    state, wait = _take(state, limits, 0.0)
+    assert wait == 0.5 and state["k"] == (0.0, 0.0)
+
+    # half a token back after 0.25 s, so a quarter second more to wait
+    state, wait = _take(state, limits, 0.25)
+    assert wait == 0.25
+    state, wait = _take(state, limits, 0.5)
+    assert wait == 0 and state["k"] == (0.0, 0.5)
+    # a long idle spell only fills the bucket to its burst
+    state, _ = _take(state, limits, 100.0)
+    assert state["k"] == (2.0, 100.0)
+
+
+def test_buckets_burst_then_rate(buckets, clock):
+    limits = [("user:1", 1.0, 3)]
+    assert [buckets.take(limits) for _ in range(4)] == [0, 0, 0, 1.0]
+    clock[0] += 0.25
+    assert buckets.take(limits) == 0.75
+    clock[0] += 0.75
+    assert buckets.take(limits) == 0
+    assert buckets.take(limits) == 1.0
+
+
+def test_buckets_take_from_all_or_none(buckets, clock):
+    assert buckets.take([("ip:a", 1.0, 1)]) == 0
+    # the IP is empty, so the user's bucket is not charged either
+    assert buckets.take([("user:1", 1.0, 1), ("ip:a", 1.0, 1)]) == 1.0
+    assert buckets.take([("user:1", 1.0, 1)]) == 0
+
+
+def test_memory_buckets_evict_the_least_recently_used(clock):
+    buckets = MemoryBuckets(max_keys=2)
+    assert buckets.take([("a", 1.0, 1)]) == 0
+    assert buckets.take([("b", 1.0, 1)]) == 0
+    assert buckets.take([("a", 1.0, 1)]) == 1.0  # touches a
+
+    assert buckets.take([("c", 1.0, 1)]) == 0
+    assert list(buckets._buckets) == ["a", "c"]
+    # b was forgotten, so it starts full; a is still empty
+    assert buckets.take([("b", 1.0, 1)]) == 0
+    assert buckets.take([("c", 1.0, 1)]) == 1.0
+
+
+def test_sqlite_buckets_are_shared_between_workers(tmp_path, clock):
+    path = str(tmp_path / "buckets.db")
+    workers = [SQLiteBuckets(path), SQLiteBuckets(path)]
+    limits = [("ip:a", 1.0, 10)]
+    assert [workers[i % 2].take(limits) for i in range(10)] == [0] * 10
+    assert workers[0].take(limits) == workers[1].take(limits) == 1.0
+
+
+def test_sqlite_buckets_never_spend_a_token_twice(tmp_path):
+    path = str(tmp_path / "buckets.db")
+    workers = [SQLiteBuckets(path, timeout=10) for _ in range(4)]
+    limits = [("ip:a", 1e-6, 50)]
+    taken = []
+
+    def spend(buckets):
+        for _ in range(25):
+            if buckets.take(limits) == 0:
+                taken.append(1)
+
+    threads = [threading.Thread(target=spend, args=(w,)) for w in workers]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(taken) == 50
+
+
+def test_sqlite_buckets_let_the_call_through_when_the_store_is_locked(tmp_path, clock):
+    path = str(tmp_path / "buckets.db")
+    buckets = SQLiteBuckets(path, timeout=0.05)
+    limits = [("ip:a", 1.0, 1)]
+    assert buckets.take(limits) == 0
+
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+    try:
+        assert buckets.take(limits) == 0
+    finally:
+        other.execute("ROLLBACK")
+        other.close()
+    assert buckets.take(limits) == 1.0
@@ -0,0 +1,64 @@
+"""The provider snapshot is read without a lock while this worker patches it."""
+import random
+import sys
+import threading
+import time
+
+import pytest
+
+
+@pytest.fixture
+def fast_switching():
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
+
+
+# cells off (with and without the snapshot's grid), and cells small enough
+# that most checks miss and build one
+@pytest.mark.parametrize("cells, grid", [((0, 0), 0), ((0, 0), 0.05), ((0.01, 2000), 0.05)],
+                         ids=["no-cells", "grid", "cells"])
+def test_coverage_while_providers_change(web, monkeypatch, fast_switching, cells, grid):
+    monkeypatch.setattr(web, "PROVIDER_GRID_DEG", grid)
+    rng = random.Random(5)
+    rows = [
+        {"id": i, "name": f"P{i}", "lat": -31.95 + rng.gauss(0, 0.05), "lng": 115.86 + rng.gauss(0, 0.05),
+         "service_radius_km": 10.0}
+        for i in range(1, 301)
+    ]
+    monkeypatch.setattr(web, "_provider_snapshot", web.ProviderSnapshot(1, len(rows), rows))
+    monkeypatch.setattr(web, "coverage_cells", web.CoverageCells(*cells))
+    errors, stop = [], threading.Event()
+
+    def read():
+        try:
+            while not stop.is_set():
+                snap = web._provider_snapshot
+                lat, lng = -31.95 + rng.gauss(0, 0.05), 115.86 + rng.gauss(0, 0.05)
+                in_range, _ = snap.coverage(lat, lng)
+                # whatever the cache held, the answer is this snapshot's
+                hits, _ = snap.areas.covering(lat, lng)
+                assert {p["id"] for p in in_range} == {snap.ids[i] for i, _ in hits}
+        except Exception as e:  # noqa: BLE001 - any failure in a reader fails the test
+            errors.append(e)
+            stop.set()
+
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for t in readers:
+        t.start()
+    deadline = time.monotonic() + 2
+    while time.monotonic() < deadline and not stop.is_set():
+        version = web._provider_snapshot.version + 1
+        pid = rng.randint(1, 400)
+        # move, add, or clear (swap-removing it from the arrays) a provider
+        if rng.random() < 0.5:
+            change = (pid, f"P{pid}", -31.95 + rng.gauss(0, 0.05), 115.86 + rng.gauss(0, 0.05), 10.0)
+        else:
+            change = (pid, f"P{pid}", None, None, None)
+        web.provider_changed(version, lambda snap: snap.update_provider(*change))
+        assert web._provider_snapshot.version == version
+    stop.set()
+    for t in readers:
+        t.join()
+    assert not errors, errors[0]
@@ -0,0 +1,191 @@
+"""
+The Storage contract, run against SQLiteStorage and PostgresStorage alike
+(see the storage fixture): app.py must not be able to tell them apart.
+"""
+from datetime import datetime
+import math
+
+import pytest
+
+from geo import EARTH_RADIUS_KM, haversine_km
+from storage import REQUEST_COLUMNS, REQUEST_EXPORT_COLUMNS, USER_EXPORT_COLUMNS
+
+PERTH = (-31.95, 115.86)
+
+
+def test_users(storage, conn, make_user):
+    before = storage.read_counter(conn, "providers")
+    receiver = make_user("receiver", *PERTH)
+    provider = make_user("provider", *PERTH, 10.0)
+
+    assert storage.get_user(conn, receiver)["role"] == "receiver"
+    assert storage.find_user_by_email(conn, "provider2@example.com")["id"] == provider
+    assert storage.find_user_by_email(conn, "nobody@example.com") is None
+    assert storage.get_user(conn, 10_000) is None
+
+    storage.set_password_hash(conn, receiver, "y")
+    assert storage.find_user_by_email(conn, "receiver1@example.com")["password_hash"] == "y"
+
+    version, total, rows = storage.load_providers(conn)
+    assert version > before
+    assert total == 1
+    assert [(r["id"], r["lat"], r["lng"], r["service_radius_km"]) for r in rows] == [(provider, *PERTH, 10.0)]
+    assert [r["id"] for r in storage.provider_pins(conn)] == [provider]
+    assert storage.user_ids_by_email(conn, ["receiver1@example.com", "x@example.com"]) == {"receiver1@example.com": receiver}
+
+
+def test_create_user_bumps_providers_version_only_for_providers(storage, conn):
+    now = datetime.utcnow().isoformat()
+    _, version = storage.create_user(conn, "receiver", "r", "r@example.com", "x", now)
+    assert version is None
+    _, version = storage.create_user(conn, "provider", "p", "p@example.com", "x", now)
+    assert version == storage.read_counter(conn, "providers")
+
+
+def test_request_round_trip(storage, conn, make_user, make_request):
+    receiver = make_user("receiver", *PERTH)
+    seq = storage.latest_event_seq(conn)
+    req_id = make_request(receiver, *PERTH, title="Garden tidy", hourly_wage=25.0)
+
+    row = storage.get_request(conn, req_id)
+    assert set(REQUEST_COLUMNS) <= set(row.keys())
+    assert (row["title"], row["status"], row["version"], row["hourly_wage"]) == ("Garden tidy", "Open", 0, 25.0)
+    assert storage.get_request(conn, req_id + 1000) is None
+    assert [(e["request_id"], e["kind"]) for e in storage.events_after(conn, seq)] == [(req_id, "open")]
+    assert [r["id"] for r in storage.requests_by_ids(conn, [req_id])] == [req_id]
+
+
+def test_transitions_check_status_and_version(storage, conn, make_user, make_request):
+    receiver = make_user("receiver", *PERTH)
+    provider = make_user("provider", *PERTH, 10.0)
+    req_id = make_request(receiver, *PERTH)
+    assert req_id in storage.stored_matches(conn, provider)
+
+    now = datetime.utcnow().isoformat()
+    claim = {"claimed_by_user_id": provider, "claimed_at": now}
+    assert storage.transition_request(conn, req_id, "Open", 0, "Claimed", claim, "claimed")
+    # a second claim with the version it read loses
+    assert not storage.transition_request(conn, req_id, "Open", 0, "Claimed", claim, "claimed")
+    assert not storage.transition_request(conn, req_id, "Claimed", 0, "Serviced", {}, "serviced")
+
+    row = storage.get_request(conn, req_id)
+    assert (row["status"], row["version"], row["claimed_by_user_id"]) == ("Claimed", 1, provider)
+    assert req_id not in storage.stored_matches(conn, provider)
+    assert [r["id"] for r in storage.claimed_requests(conn, provider)] == [req_id]
+
+    done = {"serviced_at": now, "serviced_by_user_id": provider}
+    assert storage.transition_request(conn, req_id, "Claimed", 1, "Serviced", done, "serviced")
+    assert storage.get_request(conn, req_id)["status"] == "Serviced"
+    assert storage.claimed_requests(conn, provider) == []
+
+
+def test_list_requests_reads_the_archive(storage, conn, make_user, make_request):
+    receiver = make_user("receiver", *PERTH)
+    other = make_user("receiver", *PERTH)
+    ids = [make_request(receiver, *PERTH) for _ in range(5)]
+    make_request(other, *PERTH)
+    for req_id in ids[:2]:
+        assert storage.transition_request(conn, req_id, "Open", 0, "Serviced", {"serviced_at": "2020-01-01"}, "serviced")
+    assert storage.archive_serviced(conn, "2025-01-01", 1) == 2
+    assert storage.archive_serviced(conn, "2025-01-01", 1) == 0
+
+    rows = storage.list_requests(conn, None, receiver, None, 10)
+    assert [r["id"] for r in rows] == ids[::-1]
+    assert rows[0]["receiver_name"] == "receiver1"
+    page = storage.list_requests(conn, ["id", "status"], receiver, ids[3], 2)
+    assert [(r["id"], r["status"]) for r in page] == [(ids[2], "Open"), (ids[1], "Serviced")]
+    assert storage.get_request(conn, ids[0])["status"] == "Serviced"
+
+
+def test_matches_use_haversine_distances(storage, conn, make_user, make_request):
+    receiver = make_user("receiver", *PERTH)
+    # 1 cm either side of a 10 km radius; on PostGIS' 6371.0088 km sphere
+    # both are outside
+    inside_lat = PERTH[0] + math.degrees(9.99999 / EARTH_RADIUS_KM)
+    outside_lat = PERTH[0] + math.degrees(10.00001 / EARTH_RADIUS_KM)
+    inside = make_request(receiver, inside_lat, PERTH[1])
+    outside = make_request(receiver, outside_lat, PERTH[1])
+    provider = make_user("provider", *PERTH, 10.0)
+
+    matches = storage.stored_matches(conn, provider)
+    assert set(matches) == {inside}
+    assert matches[inside] == pytest.approx(haversine_km(*PERTH, inside_lat, PERTH[1]), abs=1e-9)
+
+    hits = list(storage.provider_feed(conn, *PERTH, 10.0))
+    assert [(row["id"], d) for row, d in hits] == [(inside, pytest.approx(matches[inside], abs=1e-9))]
+
+    # a new request is matched against the providers already there
+    late = make_request(receiver, PERTH[0] - 0.05, PERTH[1])
+    assert set(storage.stored_matches(conn, provider)) == {inside, late}
+
+    # `flask check-matches --fix` rebuilds from the stored pin
+    expected = storage.stored_matches(conn, provider)
+    conn.execute("DELETE FROM request_matches")
+    conn.commit()
+    storage.rebuild_matches(conn, provider, *PERTH, 10.0)
+    assert storage.stored_matches(conn, provider) == pytest.approx(expected, abs=1e-9)
+    assert outside not in expected
+
+
+def test_import_and_export(storage, conn):
+    users = [
+        {"role": "receiver", "name": "r", "email": "r@example.com", "password_hash": "x",
+         "created_at": "2024-01-01", "location_text": "Perth", "lat": PERTH[0], "lng": PERTH[1],
+         "service_radius_km": None},
+        {"role": "provider", "name": "p", "email": "p@example.com", "password_hash": "x",
+         "created_at": "2024-01-01", "location_text": None, "lat": PERTH[0], "lng": PERTH[1],
+         "service_radius_km": 5.0},
+    ]
+    inserted, version = storage.import_users(conn, users)
+    assert inserted == 2 and version == storage.read_counter(conn, "providers")
+    assert storage.import_users(conn, users) == (0, None)
+    ids = storage.user_ids_by_email(conn, ["r@example.com", "p@example.com"])
+
+    request = {c: None for c in REQUEST_COLUMNS[1:]}
+    request.update({
+        "receiver_user_id": ids["r@example.com"], "title": "Shopping", "category": "Errands",
+        "status": "Open", "created_at": "2024-01-02", "lat": PERTH[0], "lng": PERTH[1], "version": 0,
+    })
+    assert storage.import_requests(conn, [request]) == 1
+
+    exported_users = list(storage.export_users(conn))
+    assert [u["email"] for u in exported_users] == ["r@example.com", "p@example.com"]
+    assert set(USER_EXPORT_COLUMNS) <= set(exported_users[0].keys())
+    (exported,) = storage.export_requests(conn)
+    assert set(REQUEST_EXPORT_COLUMNS) <= set(exported.keys())
+    assert (exported["title"], exported["receiver_email"]) == ("Shopping", "r@example.com")
+    assert exported["id"] in storage.stored_matches(conn, ids["p@example.com"])
+
+
+def test_every_imported_request_is_logged(storage, conn, make_user):
+    receiver = make_user("receiver")
+    seq = storage.latest_event_seq(conn)
+    rows = []
+    for status in ("Open", "Claimed", "Serviced"):
+        row = {c: None for c in REQUEST_COLUMNS[1:]}
+        row.update({
+            "receiver_user_id": receiver, "title": status, "category": "Errands", "status": status,
+            "created_at": "2024-01-02", "lat": PERTH[0], "lng": PERTH[1], "version": 0,
+        })
+        rows.append(row)
+    assert storage.import_requests(conn, rows) == 3
+
+    titles = {r["id"]: r["title"] for r in storage.list_requests(conn, ["id", "title"], receiver, None, 10)}
+    logged = {titles[e["request_id"]]: e["kind"] for e in storage.events_after(conn, seq)}
+    assert logged == {"Open": "open", "Claimed": "imported", "Serviced": "imported"}
+
+
+def test_search_ranks_title_over_details(storage, conn, make_user, make_request):
+    receiver = make_user("receiver")
+    in_details = make_request(receiver, *PERTH, title="Help needed", details="the lawn mower is in the shed")
+    in_title = make_request(receiver, *PERTH, title="Lawn mowing")
+    make_request(receiver, *PERTH, title="Window cleaning")
+    far = make_request(receiver, PERTH[0] + 1, PERTH[1], title="Lawn edges")
+    claimed = make_request(receiver, *PERTH, title="Lawn clippings")
+    assert storage.transition_request(conn, claimed, "Open", 0, "Claimed", {}, "claimed")
+
+    hits = list(storage.search_feed(conn, *PERTH, 10.0, ["lawn", "mow"]))
+    assert [row["id"] for row, _ in hits] == [in_title, in_details]
+    assert all(d == pytest.approx(0.0, abs=1e-9) for _, d in hits)
+    assert {row["id"] for row, _ in storage.search_feed(conn, *PERTH, 200.0, ["lawn"])} == {in_title, in_details, far}
+    assert len(list(storage.search_feed(conn, *PERTH, 200.0, ["lawn"], limit=2))) == 2
@@ -0,0 +1,29 @@
+"""The push feed holds a worker thread per stream, so a worker only serves SSE_MAX_STREAMS."""
+
+STREAM = "/api/provider/requests/stream"
+
+
+def test_streams_over_the_cap_get_503(web, signup):
+    provider = signup("provider", lat=-31.95, lng=115.86, service_radius_km=10)
+
+    open_streams = [provider.get(STREAM, buffered=False) for _ in range(web.SSE_MAX_STREAMS)]
+    assert [r.status_code for r in open_streams] == [200] * web.SSE_MAX_STREAMS
+
+    refused = provider.get(STREAM)
+    assert refused.status_code == 503
+    assert refused.headers["Retry-After"]
+
+    # closing a stream frees its slot, whether or not its body was ever read
+    open_streams.pop().close()
+    with provider.head(STREAM) as head:
+        assert head.status_code == 200
+    again = provider.get(STREAM, buffered=False)
+    assert again.status_code == 200
+    assert next(again.response).startswith(b"retry:")
+
+    again.close()
+    for r in reversed(open_streams):  # one thread here, so contexts unwind in order
+        r.close()
+    for _ in range(web.SSE_MAX_STREAMS + 1):
+        with provider.head(STREAM) as head:
+            assert head.status_code == 200
@@ -0,0 +1,67 @@
+"""Streamed feeds take over the request's connection; it must come back however the response ends."""
+import pytest
+
+FEED = "/api/provider/requests"
+
+
+@pytest.fixture
+def connections(web, monkeypatch):
+    counts = {"connect": 0, "release": 0}
+    connect, release = web.storage.connect, web.storage.release
+
+    def counted_connect():
+        counts["connect"] += 1
+        return connect()
+
+    def counted_release(conn):
+        counts["release"] += 1
+        release(conn)
+
+    monkeypatch.setattr(web.storage, "connect", counted_connect)
+    monkeypatch.setattr(web.storage, "release", counted_release)
+    return counts
+
+
+def test_connection_released_however_the_response_ends(web, signup, connections):
+    provider = signup("provider", lat=-31.95, lng=115.86, service_radius_km=10)
+    connections.update(connect=0, release=0)
+
+    for _ in range(5):
+        with provider.head(FEED) as resp:
+            assert resp.status_code == 200
+    # the client went away before reading anything
+    for _ in range(5):
+        provider.get(FEED, buffered=False).close()
+    with provider.get(FEED) as resp:
+        assert resp.status_code == 200 and resp.get_json() == []
+    # the ETag path never streams
+    with provider.get(FEED, headers={"If-None-Match": resp.headers["ETag"]}) as cached:
+        assert cached.status_code == 304
+
+    assert connections["connect"] == connections["release"] > 0
+
+
+def test_stages_are_recorded_once_the_body_is_sent(web, signup, monkeypatch):
+    monkeypatch.setattr(web, "METRICS_ENABLED", True)
+    receiver = signup("receiver", lat=-31.95, lng=115.86)
+    provider = signup("provider", lat=-31.95, lng=115.86, service_radius_km=10)
+    resp = receiver.post("/api/requests", json={
+        "title": "Help needed", "category": "Cleaning", "scheduled_date": "2026-01-01",
+        "scheduled_time": "10:00", "duration_min": 60, "hourly_wage": 20,
+    })
+    assert resp.status_code == 201
+
+    stages, requests = [], []
+    monkeypatch.setattr(web.stage_seconds, "observe", lambda seconds, *labels: stages.append(labels))
+    monkeypatch.setattr(web.request_seconds, "observe", lambda seconds, *labels: requests.append(labels))
+
+    # history is scanned, so the distances are worked out while the body is sent
+    with provider.get(FEED + "?history=1", headers={"Accept-Encoding": "gzip"}, buffered=False) as resp:
+        # the header goes out first, so it can only say how long that took
+        sent = [part.split(";")[0].strip() for part in resp.headers["Server-Timing"].split(",")]
+        assert sent[-1] == "headers" and "serialize" not in sent
+        assert requests == []
+        body = resp.get_data()
+    assert requests == [("provider_requests", "GET", "200")]
+    assert {"distance", "serialize", "compress"} <= {stage for endpoint, stage in stages if endpoint == "provider_requests"}
+    assert body